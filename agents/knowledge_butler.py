@@ -1,52 +1,90 @@
 from langchain.agents import Tool
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from memory.vector_store import VectorMemory
-from typing import Dict, List
+from memory.vector_store import VectorMemory, chunk_id
+from typing import Any, Dict, List, Optional
 from config import Config
+from utils.clients import chat_model
+from utils.context_builder import build_context
+from utils.metrics import timed
+
+NO_RESULTS = "I couldn't find any relevant information in my knowledge base."
+
+ANSWER_PROMPT = PromptTemplate(
+    input_variables=["context", "query"],
+    template="""You are AURORA's Knowledge Butler. Based on the following context from my knowledge base, answer the query.
+
+Context:
+{context}
+
+Query: {query}
+
+Provide a clear, concise answer. If the context doesn't fully answer the query, say so and provide what information you can."""
+)
 
 class KnowledgeButler:
     """The Knowledge Butler manages AURORA's long-term memory."""
     
     def __init__(self, vector_memory: VectorMemory):
         self.memory = vector_memory
-        self.llm = ChatOpenAI(
-            model=Config.MODEL_NAME,
-            temperature=Config.REASONING_TEMPERATURE,
-            openai_api_key=Config.OPENAI_API_KEY
-        )
     
-    def search_knowledge(self, query: str) -> str:
-        """Search the knowledge base and synthesize an answer."""
-        # Retrieve relevant documents
-        results = self.memory.search(query, k=Config.TOP_K_RESULTS)
+    @property
+    def llm(self):
+        return chat_model(Config.REASONING_TEMPERATURE)
+
+    @timed("knowledge.answer")
+    def search_knowledge(self, query: str, filter_dict: Optional[Dict] = None,
+                         callbacks: Optional[List[Any]] = None) -> str:
+        """Search the knowledge base and synthesize an answer.
+
+        ``filter_dict`` restricts retrieval by metadata, e.g.
+        ``{"type": "pdf"}`` or ``{"category": {"$in": ["Research"]}}``.
+        With ``callbacks`` the answer is generated by a streaming model and
+        each token is reported to them.
+        """
+        # Retrieve relevant, non-redundant documents and pack them into the
+        # context budget
+        candidates = self.memory.search_mmr(query, k=Config.CONTEXT_CANDIDATES,
+                                            filter_dict=filter_dict)
+        context, results = build_context(query, candidates, Config.CONTEXT_TOKEN_BUDGET)
         
         if not results:
-            return "I couldn't find any relevant information in my knowledge base."
+            return NO_RESULTS
         
-        # Prepare context from results
-        context = "\n\n".join([
-            f"Source: {doc.metadata.get('filename', 'Unknown')}\n{doc.page_content}"
-            for doc in results
-        ])
+        # A similar question answered from the same chunks needs no LLM call;
+        # the query embedding is already cached by the search
+        vector = self.memory.embeddings.embed_query(query)
+        chunk_ids = [chunk_id(doc.page_content, doc.metadata) for doc in results]
+        cached = self.memory.docstore.answer_cache.get(vector, chunk_ids)
+        if cached is not None:
+            return cached
         
-        # Generate answer using LLM
-        prompt = PromptTemplate(
-            input_variables=["context", "query"],
-            template="""You are AURORA's Knowledge Butler. Based on the following context from my knowledge base, answer the query.
-
-Context:
-{context}
-
-Query: {query}
+        prompt = ANSWER_PROMPT.format(context=context, query=query)
+        if callbacks:
+            llm = chat_model(Config.REASONING_TEMPERATURE, streaming=True)
+            response = llm.invoke(prompt, config={"callbacks": callbacks})
+        else:
+            response = self.llm.invoke(prompt)
+        self.memory.docstore.answer_cache.put(query, vector, chunk_ids, response.content)
+        return response.content
 
-Provide a clear, concise answer. If the context doesn't fully answer the query, say so and provide what information you can."""
-        )
+    @timed("knowledge.answer")
+    async def asearch_knowledge(self, query: str, filter_dict: Optional[Dict] = None) -> str:
+        """``search_knowledge`` with async embedding and LLM calls."""
+        candidates = await self.memory.asearch_mmr(query, k=Config.CONTEXT_CANDIDATES,
+                                                   filter_dict=filter_dict)
+        context, results = build_context(query, candidates, Config.CONTEXT_TOKEN_BUDGET)
+        
+        if not results:
+            return NO_RESULTS
         
-        response = self.llm.invoke(
-            prompt.format(context=context, query=query)
-        )
+        vector = await self.memory.embeddings.aembed_query(query)
+        chunk_ids = [chunk_id(doc.page_content, doc.metadata) for doc in results]
+        cached = self.memory.docstore.answer_cache.get(vector, chunk_ids)
+        if cached is not None:
+            return cached
         
+        response = await self.llm.ainvoke(ANSWER_PROMPT.format(context=context, query=query))
+        self.memory.docstore.answer_cache.put(query, vector, chunk_ids, response.content)
         return response.content
     
     def add_knowledge(self, text: str, metadata: Dict) -> str:
@@ -57,14 +95,20 @@ Provide a clear, concise answer. If the context doesn't fully answer the query,
     def get_stats(self) -> str:
         """Get knowledge base statistics."""
         stats = self.memory.get_collection_stats()
-        return f"Knowledge base contains {stats['count']} chunks of information."
+        answers = stats["answer_cache"]
+        return (f"Knowledge base contains {stats['count']} chunks of information. "
+                f"Answer cache: {answers['entries']} entries, "
+                f"{answers['hit_rate']:.0%} hit rate.")
     
     def get_tools(self) -> List[Tool]:
         """Return LangChain tools for this agent."""
         return [
             Tool(
                 name="SearchKnowledge",
-                func=self.search_knowledge,
+                # Not the method itself: the tool would hand it the agent's
+                # callbacks, streaming the tool's answer as if it were the reply
+                func=lambda query: self.search_knowledge(query),
+                coroutine=self.asearch_knowledge,
                 description="Search AURORA's knowledge base for information. Input should be a natural language query."
             ),
             Tool(
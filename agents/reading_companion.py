@@ -1,11 +1,25 @@
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from langchain.chains.summarize import load_summarize_chain
-from utils.document_processor import DocumentProcessor
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from utils.document_processor import DocumentProcessor, ParsedDocument, parse_file
+from memory.summary_cache import SummaryCache
 from memory.vector_store import VectorMemory
-from typing import List
+from agents.summarizer import SUMMARY_PROMPT, MapReduceSummarizer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
 from langchain.schema import Document
 from config import Config
+from utils.clients import chat_model, model_id
+from utils.metrics import timed
 
 class ReadingCompanion:
     """Reads and processes documents, extracting insights."""
@@ -13,61 +27,216 @@ class ReadingCompanion:
     def __init__(self, vector_memory: VectorMemory):
         self.memory = vector_memory
         self.processor = DocumentProcessor()
-        self.llm = ChatOpenAI(
-            model=Config.MODEL_NAME,
-            temperature=Config.SUMMARIZATION_TEMPERATURE,
-            openai_api_key=Config.OPENAI_API_KEY
-        )
+        self.summarizer = MapReduceSummarizer(vector_memory.docstore.summaries)
+        # (file_path, content hash) -> ParsedDocument, least recently used first
+        self._parsed: "OrderedDict[Tuple[str, str], ParsedDocument]" = OrderedDict()
     
-    def ingest_document(self, file_path: str) -> str:
-        """Ingest a document and add it to memory."""
-        # Determine file type and load
-        if file_path.endswith('.pdf'):
-            chunks = self.processor.load_pdf(file_path)
-        elif file_path.endswith('.txt'):
-            chunks = self.processor.load_text(file_path)
-        else:
+    @property
+    def llm(self):
+        return chat_model(Config.SUMMARIZATION_TEMPERATURE)
+
+    def parse(self, file_path: str, data: Optional[bytes] = None) -> ParsedDocument:
+        """Parse and chunk a file once; the same content is parsed again only
+        after ``Config.PARSED_DOCUMENT_CACHE`` other documents.
+
+        ``data`` is the file's content for uploads that were never written
+        to disk; ``file_path`` then only names it.
+        """
+        if data is None:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        return self._parse(file_path, data, hashlib.sha256(data).hexdigest())
+
+    @timed("ingest")
+    def ingest_document(self, file_path: str, data: Optional[bytes] = None) -> str:
+        """Ingest a document and add it to memory.
+
+        A file on disk that was not parsed already is streamed: parsing runs
+        on a producer thread at most ``Config.INGEST_QUEUE_CHUNKS`` chunks
+        ahead, and every ``Config.INGEST_STREAM_BATCH`` chunks are embedded
+        and committed to the store's log. Memory stays flat for any document
+        size, and after a crash re-ingesting the file only embeds the chunks
+        that never made it in. In-memory uploads (``data``) go through
+        ``parse`` and share their chunks with summarization.
+        """
+        try:
+            chunks = self._chunks(file_path, data)
+        except ValueError:
             return f"Unsupported file type: {file_path}"
         
-        # Add to vector store
-        self.memory.add_documents(chunks)
+        # Add to vector store, batch by batch
+        ids, stored = [], 0
+        for batch in _batches(_prefetch(chunks, Config.INGEST_QUEUE_CHUNKS),
+                              Config.INGEST_STREAM_BATCH):
+            batch_ids, new = self.memory.store_documents(batch)
+            ids.extend(batch_ids)
+            stored += len(new)
         
-        return f"Successfully ingested {len(chunks)} chunks from {file_path}"
-    
-    def summarize_document(self, file_path: str) -> str:
-        """Summarize a document."""
-        # Load document
-        if file_path.endswith('.pdf'):
-            chunks = self.processor.load_pdf(file_path)
-        elif file_path.endswith('.txt'):
-            chunks = self.processor.load_text(file_path)
-        else:
+        return _ingested(file_path, len(ids), stored)
+
+    @timed("ingest")
+    async def aingest_document(self, file_path: str, data: Optional[bytes] = None) -> str:
+        """``ingest_document`` with async embedding calls; parsing and index
+        writes run on worker threads so the event loop stays free."""
+        try:
+            chunks = await asyncio.to_thread(self._chunks, file_path, data)
+        except ValueError:
             return f"Unsupported file type: {file_path}"
         
-        # Use summarization chain
-        chain = load_summarize_chain(
-            self.llm,
-            chain_type="map_reduce"
-        )
+        ids, stored = [], 0
+        batches = _batches(_prefetch(chunks, Config.INGEST_QUEUE_CHUNKS),
+                           Config.INGEST_STREAM_BATCH)
+        end = object()
+        while (batch := await asyncio.to_thread(next, batches, end)) is not end:
+            batch_ids, new = await self.memory.astore_documents(batch)
+            ids.extend(batch_ids)
+            stored += len(new)
         
-        summary = chain.run(chunks)
+        return _ingested(file_path, len(ids), stored)
+
+    def _chunks(self, file_path: str, data: Optional[bytes]) -> Iterator[Document]:
+        """The document's chunks: from a parse when there is one, else streamed."""
+        parsed = None
+        if data is not None:
+            parsed = self.parse(file_path, data)
+        elif any(path == file_path for path, _ in self._parsed):
+            parsed = self._parsed.get((file_path, _file_hash(file_path)))
+        return iter(parsed.chunks) if parsed else self.processor.iter_chunks(file_path)
+    
+    def ingest_directory(self, path: str, pattern: str = "**/*",
+                         workers: Optional[int] = None,
+                         on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Ingest every supported file under ``path`` that matches ``pattern``.
+
+        Files are parsed and chunked in a process pool while finished chunks
+        are embedded and stored in batches of ``Config.INGEST_BATCH_CHUNKS``.
+        A file that fails to parse or store is recorded under ``failures``
+        and the run carries on. ``on_progress`` gets the report after every
+        parsed file.
+        """
+        files = _find_files(path, pattern)
+        report = {"files": len(files), "done": 0, "chunks": 0, "failures": {},
+                  "seconds": 0.0, "files_per_second": 0.0, "chunks_per_second": 0.0}
+        started = time.monotonic()
+        batch = _StoreBatch(self.memory, report["failures"])
+
+        for file_path, chunks in _parse_files(files, workers, report["failures"]):
+            report["done"] += 1
+            if chunks is not None and batch.add(file_path, chunks):
+                report["chunks"] += sum(len(ids) for ids in batch.store().values())
+            _update_rates(report, started)
+            if on_progress:
+                on_progress(report)
+        report["chunks"] += sum(len(ids) for ids in batch.store().values())
+        self.memory.compact()
+        _update_rates(report, started)
+        return report
+    
+    def sync_directory(self, path: str, pattern: str = "**/*",
+                       workers: Optional[int] = None) -> Dict:
+        """Bring the knowledge base in line with the files under ``path``.
+
+        Files are compared with the sync manifest by size and mtime, then by
+        content hash. Only added or modified files are re-chunked, and only
+        their chunks not already stored are embedded. Chunks a modified file
+        no longer has, and all chunks of files that are gone (or no longer
+        match ``pattern``), are deleted.
+        """
+        started = time.monotonic()
+        manifest = self.memory.docstore.manifest
+        root = os.path.abspath(path)
+        known = manifest.under(root)
+        report = {"added": 0, "modified": 0, "unchanged": 0, "deleted": 0,
+                  "chunks_added": 0, "chunks_deleted": 0, "failures": {}, "seconds": 0.0}
+
+        changed, touched = {}, []
+        for file_path in _find_files(root, pattern):
+            stat = os.stat(file_path)
+            entry = known.pop(file_path, None)
+            if entry and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                report["unchanged"] += 1
+                continue
+            digest = _file_hash(file_path)
+            if entry and entry["hash"] == digest:
+                # Touched but identical: just refresh the stat fields
+                touched.append((file_path, stat.st_size, stat.st_mtime_ns, digest,
+                                entry["chunk_ids"]))
+                report["unchanged"] += 1
+                continue
+            changed[file_path] = (stat, digest, entry)
+        manifest.put(touched)
+
+        for entry in known.values():
+            report["chunks_deleted"] += self.memory.delete(entry["chunk_ids"])
+        manifest.remove(list(known))
+        report["deleted"] = len(known)
+
+        def record(stored: Dict[str, List[str]]):
+            rows = []
+            for file_path, ids in stored.items():
+                stat, digest, entry = changed[file_path]
+                old_ids = set(entry["chunk_ids"]) if entry else set()
+                report["modified" if entry else "added"] += 1
+                report["chunks_added"] += len(set(ids) - old_ids)
+                report["chunks_deleted"] += self.memory.delete(list(old_ids - set(ids)))
+                rows.append((file_path, stat.st_size, stat.st_mtime_ns, digest, ids))
+            # After the store changes: a crash in between only redoes this file
+            manifest.put(rows)
+
+        batch = _StoreBatch(self.memory, report["failures"])
+        for file_path, chunks in _parse_files(list(changed), workers, report["failures"]):
+            if chunks is not None and batch.add(file_path, chunks):
+                record(batch.store())
+        record(batch.store())
+        self.memory.compact()
+        report["seconds"] = time.monotonic() - started
+        return report
+    
+    @timed("summarize")
+    def summarize_document(self, file_path: str, data: Optional[bytes] = None) -> str:
+        """Summarize a document; ``data`` as for ``parse``.
+
+        The summary is cached under the file's content hash, so summarizing
+        an unchanged file again, or extracting its insights, neither parses
+        it nor calls the LLM, and stores no second summary.
+        """
+        if os.path.splitext(file_path)[1].lower() not in DocumentProcessor.LOADERS:
+            return f"Unsupported file type: {file_path}"
+        
+        if data is None:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        cache = self.memory.docstore.summaries
+        key = SummaryCache.key("document", model_id(),
+                               str(Config.SUMMARIZATION_TEMPERATURE), SUMMARY_PROMPT.template,
+                               str(Config.SUMMARY_MAP_TOKENS), digest)
+        cached = cache.get_many([key])
+        if key in cached:
+            entry = json.loads(cached[key])
+        else:
+            parsed = self._parse(file_path, data, digest)
+            entry = {"summary": self.summarizer.summarize(parsed.chunks),
+                     "chunks": len(parsed.chunks)}
+            cache.put_many({key: json.dumps(entry)})
         
-        # Store summary in memory
+        # Store summary in memory; the same summary of the same file is stored once
         self.memory.add_text(
-            summary,
+            entry["summary"],
             metadata={
                 "type": "summary",
                 "source": file_path,
-                "original_chunks": len(chunks)
+                "original_chunks": entry["chunks"]
             }
         )
         
-        return summary
+        return entry["summary"]
     
-    def extract_insights(self, file_path: str) -> str:
+    @timed("insights")
+    def extract_insights(self, file_path: str, data: Optional[bytes] = None) -> str:
         """Extract key insights from a document."""
-        # First get summary
-        summary = self.summarize_document(file_path)
+        # First get summary; cached after summarize_document
+        summary = self.summarize_document(file_path, data)
         
         # Extract insights using LLM
         prompt = PromptTemplate(
@@ -83,3 +252,168 @@ Provide insights as a numbered list."""
         response = self.llm.invoke(prompt.format(summary=summary))
         
         return response.content
+
+    def _parse(self, file_path: str, data: bytes, digest: str) -> ParsedDocument:
+        key = (file_path, digest)
+        parsed = self._parsed.get(key)
+        if parsed is None:
+            parsed = ParsedDocument(file_path, digest, self.processor.load_bytes(file_path, data))
+            self._parsed[key] = parsed
+            while len(self._parsed) > Config.PARSED_DOCUMENT_CACHE:
+                self._parsed.popitem(last=False)
+        else:
+            self._parsed.move_to_end(key)
+        return parsed
+
+
+
+class _StoreBatch:
+    """Chunks of several files, embedded and stored together."""
+
+    def __init__(self, memory: VectorMemory, failures: Dict[str, str]):
+        self.memory = memory
+        self.failures = failures
+        self.files: Dict[str, List[Document]] = {}
+        self.size = 0
+
+    def add(self, file_path: str, chunks: List[Document]) -> bool:
+        """Queue a file's chunks; True once the batch is full."""
+        self.files[file_path] = chunks
+        self.size += len(chunks)
+        return self.size >= Config.INGEST_BATCH_CHUNKS
+
+    def store(self) -> Dict[str, List[str]]:
+        """Store the queued chunks; returns each stored file's chunk IDs."""
+        files, self.files, self.size = self.files, {}, 0
+        if not files:
+            return {}
+        try:
+            ids = self.memory.add_documents([c for chunks in files.values() for c in chunks])
+        except Exception as e:
+            for file_path in files:
+                self.failures[file_path] = f"{type(e).__name__}: {e}"
+            return {}
+        stored, offset = {}, 0
+        for file_path, chunks in files.items():
+            stored[file_path] = ids[offset:offset + len(chunks)]
+            offset += len(chunks)
+        return stored
+
+
+def _find_files(path: str, pattern: str) -> List[str]:
+    return sorted(str(p) for p in Path(path).glob(pattern)
+                  if p.is_file() and p.suffix.lower() in DocumentProcessor.LOADERS)
+
+
+def _file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _parse_files(files: List[str], workers: Optional[int],
+                 failures: Dict[str, str]) -> Iterator[Tuple[str, Optional[List[Document]]]]:
+    """Yield ``(file_path, chunks)`` as files finish parsing, in any order.
+
+    Chunks are None for files that failed; their error goes to ``failures``.
+    """
+    workers = min(workers or Config.INGEST_WORKERS, len(files))
+    if workers <= 1:
+        # Not worth starting a pool
+        for file_path in files:
+            try:
+                yield file_path, parse_file(file_path)
+            except Exception as e:
+                failures[file_path] = f"{type(e).__name__}: {e}"
+                yield file_path, None
+        return
+    # Spawned workers: forking would copy the embedding loop's threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        todo = iter(files)
+        running = {}
+        while True:
+            # Keep a bounded window queued so parsing runs ahead of storing
+            for file_path in itertools.islice(todo, 2 * workers - len(running)):
+                running[pool.submit(parse_file, file_path)] = file_path
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = running.pop(future)
+                try:
+                    yield file_path, future.result()
+                except Exception as e:
+                    failures[file_path] = f"{type(e).__name__}: {e}"
+                    yield file_path, None
+
+
+def _prefetch(items: Iterator, maxsize: int) -> Iterator:
+    """Iterate ``items`` on a producer thread, at most ``maxsize`` items ahead."""
+    buffer = queue.Queue(maxsize)
+    stop = threading.Event()
+    end = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+        else:
+            put(end)
+
+    threading.Thread(target=produce, name="ingest-producer", daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is end:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        # Consumer finished or failed: release a producer blocked on a full queue
+        stop.set()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _batches(items: Iterator, size: int) -> Iterator[List]:
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _update_rates(report: Dict, started: float):
+    report["seconds"] = time.monotonic() - started
+    seconds = max(report["seconds"], 1e-9)
+    report["files_per_second"] = report["done"] / seconds
+    report["chunks_per_second"] = report["chunks"] / seconds
+
+
+def _ingested(file_path: str, chunks: int, stored: int) -> str:
+    """Ingest result: chunks stored now, and duplicates (of each other or of
+    chunks stored before) that were skipped."""
+    message = f"Successfully ingested {stored} new chunks from {file_path}"
+    if chunks > stored:
+        message += f" (duplicate chunks skipped: {chunks - stored})"
+    return message
@@ -0,0 +1,198 @@
+from langchain_core.embeddings import Embeddings
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import os
+import re
+import threading
+import time
+import numpy as np
+from agents.knowledge_butler import NO_RESULTS, KnowledgeButler
+from agents.reading_companion import ReadingCompanion
+from config import Config
+from utils.llm_calls import count_llm_calls
+from utils.metrics import METRICS, timed
+
+ROUTES = ("stats", "search", "ingest", "agent")
+
+# Rules match whole messages, so a question that merely mentions counts or
+# files still goes through the classifier
+STATS_RULE = re.compile(
+    r"^\s*(?:(?:show|give)\s+(?:me\s+)?)?(?:the\s+|my\s+)?(?:knowledge base|memory)\s+"
+    r"(?:stats|statistics|size)\s*[?.!]?\s*$"
+    r"|^\s*how many\s+(?:chunks|documents|items|entries)\s+(?:are|do you have|have you stored)"
+    r"(?:\s+(?:in|stored in)\s+(?:my|your|the)\s+(?:knowledge base|memory))?"
+    r"(?:\s+(?:stored|saved))?\s*[?.!]?\s*$", re.IGNORECASE
+)
+INGEST_RULE = re.compile(
+    r"^\s*(?:please\s+)?(?:ingest|add|read|import|load)\s+(?:the\s+)?(?:file|document)?\s*"
+    r"[\"']?(?P<path>[^\"']+?\.(?:pdf|txt))[\"']?\s*[.!]?\s*$", re.IGNORECASE
+)
+
+# Messages typical of each intent; "agent" ones keep chit-chat and
+# multi-step requests away from the direct routes
+EXEMPLARS = {
+    "stats": [
+        "How many documents are in my knowledge base?",
+        "Show me the knowledge base statistics.",
+        "How much have you stored so far?",
+        "How big is my memory?",
+    ],
+    "search": [
+        "What do my notes say about transformers?",
+        "Search my knowledge base for the project deadlines.",
+        "Find information about the quarterly report.",
+        "What did the paper I uploaded conclude?",
+        "Look up what I saved about machine learning.",
+        "According to my documents, who is responsible for the budget?",
+    ],
+    "agent": [
+        "Hello, how are you?",
+        "Thanks, that was helpful!",
+        "Write me a short poem about spring.",
+        "What can you do?",
+        "Compare what my notes say about two topics and then draft an email about it.",
+        "Explain how photosynthesis works.",
+    ],
+}
+
+
+class IntentRouter:
+    """Answers simple messages without the agent's planning calls.
+
+    Rules catch statistics questions and, for files below
+    ``Config.CHAT_INGEST_DIR``, "ingest <file>" commands; other
+    messages are matched by embedding similarity against cached exemplar
+    vectors. Stats, search and ingest intents go straight to the Knowledge
+    Butler or the Reading Companion; anything unclear, and any search that
+    finds nothing, goes to the agent. Latency and LLM calls are recorded
+    per route.
+    """
+
+    def __init__(self, knowledge_butler: KnowledgeButler, reading_companion: ReadingCompanion,
+                 embeddings: Embeddings):
+        self.knowledge_butler = knowledge_butler
+        self.reading_companion = reading_companion
+        self.embeddings = embeddings
+        self._exemplars: Optional[Tuple[np.ndarray, List[str]]] = None
+        self._lock = threading.Lock()
+        self._stats = {route: {"count": 0, "seconds": 0.0, "llm_calls": 0} for route in ROUTES}
+
+    @timed("router.classify")
+    def classify(self, message: str) -> Tuple[str, Optional[str]]:
+        """The route for ``message`` and its argument (the path to ingest)."""
+        rule = _rule(message)
+        if rule:
+            return rule
+        return self._nearest(self.embeddings.embed_query(message)), None
+
+    @timed("router.classify")
+    async def aclassify(self, message: str) -> Tuple[str, Optional[str]]:
+        rule = _rule(message)
+        if rule:
+            return rule
+        if self._exemplars is None:
+            await asyncio.to_thread(self._exemplar_vectors)
+        return self._nearest(await self.embeddings.aembed_query(message)), None
+
+    def handle(self, message: str, agent: Callable[[], str],
+               callbacks: Optional[List[Any]] = None) -> str:
+        """Answer ``message`` on its fast path, or by calling ``agent()``.
+
+        ``callbacks`` get the tokens of a search answer as it is generated.
+        """
+        started = time.monotonic()
+        with count_llm_calls() as calls:
+            route, argument = self.classify(message)
+            answer = None
+            if route == "stats":
+                answer = self.knowledge_butler.get_stats()
+            elif route == "search":
+                answer = self.knowledge_butler.search_knowledge(message, callbacks=callbacks)
+            elif route == "ingest":
+                answer = self.reading_companion.ingest_document(argument)
+            if answer is None or answer == NO_RESULTS:
+                route, answer = "agent", agent()
+        self._record(route, time.monotonic() - started, calls.calls)
+        return answer
+
+    async def ahandle(self, message: str, agent: Callable[[], Awaitable[str]]) -> str:
+        started = time.monotonic()
+        with count_llm_calls() as calls:
+            route, argument = await self.aclassify(message)
+            answer = None
+            if route == "stats":
+                answer = self.knowledge_butler.get_stats()
+            elif route == "search":
+                answer = await self.knowledge_butler.asearch_knowledge(message)
+            elif route == "ingest":
+                answer = await self.reading_companion.aingest_document(argument)
+            if answer is None or answer == NO_RESULTS:
+                route, answer = "agent", await agent()
+        self._record(route, time.monotonic() - started, calls.calls)
+        return answer
+
+    def stats(self) -> Dict[str, Dict]:
+        """Messages, mean latency and mean LLM calls of each route."""
+        with self._lock:
+            stats = {route: dict(values) for route, values in self._stats.items()}
+        for values in stats.values():
+            count = max(values["count"], 1)
+            values["mean_seconds"] = values["seconds"] / count
+            values["mean_llm_calls"] = values["llm_calls"] / count
+        return stats
+
+    def _nearest(self, vector: List[float]) -> str:
+        """The intent of the most similar exemplar, if it is close enough and
+        clearly ahead of every other intent."""
+        matrix, intents = self._exemplar_vectors()
+        query = np.asarray(vector, dtype=np.float32)
+        similarity = matrix @ (query / (np.linalg.norm(query) or 1.0))
+        best = {}
+        for intent, score in zip(intents, similarity.tolist()):
+            best[intent] = max(score, best.get(intent, -1.0))
+        ranked = sorted(best.items(), key=lambda item: -item[1])
+        intent, score = ranked[0]
+        if score < Config.ROUTER_SIMILARITY or score - ranked[1][1] < Config.ROUTER_MARGIN:
+            return "agent"
+        return intent
+
+    def _exemplar_vectors(self) -> Tuple[np.ndarray, List[str]]:
+        """Unit exemplar vectors and their intents, embedded once (and kept in
+        the embedding cache across restarts)."""
+        if self._exemplars is None:
+            intents = [intent for intent, texts in EXEMPLARS.items() for _ in texts]
+            texts = [text for examples in EXEMPLARS.values() for text in examples]
+            matrix = np.array(self.embeddings.embed_documents(texts), dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            self._exemplars = matrix, intents
+        return self._exemplars
+
+    def _record(self, route: str, seconds: float, llm_calls: int):
+        METRICS.observe("route", seconds, route=route)
+        with self._lock:
+            stats = self._stats[route]
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["llm_calls"] += llm_calls
+
+
+def _rule(message: str) -> Optional[Tuple[str, Optional[str]]]:
+    if STATS_RULE.search(message):
+        return "stats", None
+    match = INGEST_RULE.match(message)
+    if match and Config.CHAT_INGEST_DIR:
+        path = _ingestible(match.group("path").strip())
+        if path:
+            return "ingest", path
+    return None
+
+
+def _ingestible(path: str) -> Optional[str]:
+    """``path`` resolved against ``Config.CHAT_INGEST_DIR``, if it names a file
+    inside it; chat users must not read anything else on the server."""
+    root = os.path.realpath(Config.CHAT_INGEST_DIR)
+    # Symlinks and ".." resolve before the check, absolute paths stay absolute
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root or not os.path.isfile(resolved):
+        return None
+    return resolved
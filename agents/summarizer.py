@@ -0,0 +1,110 @@
+from langchain.prompts import PromptTemplate
+from langchain.schema import Document
+from typing import List
+from config import Config
+from memory.summary_cache import SummaryCache
+from utils import tokens
+from utils.clients import chat_model, model_id
+from utils.metrics import timed
+
+# The prompt of LangChain's stock map_reduce summarize chain, used for both steps
+SUMMARY_PROMPT = PromptTemplate.from_template(
+    'Write a concise summary of the following:\n\n\n"{text}"\n\n\nCONCISE SUMMARY:'
+)
+
+
+class MapReduceSummarizer:
+    """Map-reduce summarization with concurrent LLM calls and a persistent cache.
+
+    Consecutive chunks are joined (minus their overlap) into windows of up
+    to ``Config.SUMMARY_MAP_TOKENS`` and all windows are summarized at once,
+    ``Config.SUMMARY_CONCURRENCY`` calls at a time. Partial summaries are
+    then combined in groups that fit ``Config.SUMMARY_REDUCE_TOKENS``, level
+    by level, until one remains. Every call's output is cached under a hash
+    of the model, prompt and input, so summarizing the same content again
+    costs no LLM calls.
+    """
+
+    def __init__(self, cache: SummaryCache):
+        self.cache = cache
+
+    @property
+    def llm(self):
+        return chat_model(Config.SUMMARIZATION_TEMPERATURE)
+
+    def summarize(self, chunks: List[Document]) -> str:
+        summaries = self._summarize_all(_windows(chunks, Config.SUMMARY_MAP_TOKENS))
+        while len(summaries) > 1:
+            groups = _groups(summaries, Config.SUMMARY_REDUCE_TOKENS)
+            summaries = self._summarize_all(["\n\n".join(group) for group in groups])
+        return summaries[0] if summaries else ""
+
+    @timed("summarize.level")
+    def _summarize_all(self, texts: List[str]) -> List[str]:
+        """Summarize each text; uncached ones in one concurrent batch."""
+        namespace = [model_id(), str(Config.SUMMARIZATION_TEMPERATURE),
+                     SUMMARY_PROMPT.template]
+        keys = [SummaryCache.key(*namespace, text) for text in texts]
+        done = self.cache.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in done:
+                missing.setdefault(key, text)
+        if missing:
+            responses = self.llm.batch(
+                [SUMMARY_PROMPT.format(text=text) for text in missing.values()],
+                config={"max_concurrency": Config.SUMMARY_CONCURRENCY}
+            )
+            fresh = {key: response.content for key, response in zip(missing, responses)}
+            self.cache.put_many(fresh)
+            done.update(fresh)
+        return [done[key] for key in keys]
+
+
+def _windows(chunks: List[Document], max_tokens: int) -> List[str]:
+    """Consecutive chunks joined into texts of up to ``max_tokens``.
+
+    Text a chunk repeats from the previous one on the same page (the
+    chunking overlap) is left out.
+    """
+    windows, current, used = [], [], 0
+    previous = None
+    for chunk in chunks:
+        text = chunk.page_content
+        start = chunk.metadata.get("start_index")
+        page = (chunk.metadata.get("source"), chunk.metadata.get("page"))
+        if previous and start is not None and previous[0] == page and start < previous[1]:
+            text = text[previous[1] - start:].lstrip()
+        if start is not None:
+            previous = (page, chunk.metadata.get("end_index", start + len(chunk.page_content)))
+        if not text:
+            continue
+        n = tokens.count_tokens(text)
+        if current and used + n > max_tokens:
+            windows.append("\n".join(current))
+            current, used = [], 0
+        current.append(text)
+        used += n
+    if current:
+        windows.append("\n".join(current))
+    return windows
+
+
+def _groups(summaries: List[str], max_tokens: int) -> List[List[str]]:
+    """Split summaries into groups to combine, each within ``max_tokens``.
+
+    Every group takes at least two summaries, so each level shrinks.
+    """
+    groups, current, used = [], [], 0
+    for summary in summaries:
+        n = tokens.count_tokens(summary)
+        if len(current) >= 2 and used + n > max_tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append(summary)
+        used += n
+    if len(current) == 1 and groups:
+        groups[-1].append(current[0])
+    elif current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,86 @@
+"""Chunking throughput: TokenChunker vs. the character-based recursive splitter.
+
+    python -m benchmarks.chunking                    # synthetic ~20 MB corpus
+    python -m benchmarks.chunking --corpus ~/notes   # every .txt file under a directory
+
+Reports MB/s for each splitter and the token-size spread of their chunks.
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from langchain.schema import Document
+from config import Config
+from utils import tokens
+from utils.chunker import TokenChunker
+
+
+def synthetic_corpus(megabytes: float, seed: int = 0) -> List[str]:
+    """Prose-like documents of sentences and paragraphs."""
+    rng = random.Random(seed)
+    words = [w for w in (
+        "the of and to in is was for on that with as by at from it an be this "
+        "vector index memory query search chunk token embedding document page "
+        "retrieval latency throughput compression cluster centroid recall model"
+    ).split()]
+    docs, size = [], 0
+    while size < megabytes * 1e6:
+        paragraphs = []
+        for _ in range(rng.randint(5, 40)):
+            sentences = [" ".join(rng.choices(words, k=rng.randint(6, 30))).capitalize() + "."
+                         for _ in range(rng.randint(2, 8))]
+            paragraphs.append(" ".join(sentences))
+        docs.append("\n\n".join(paragraphs))
+        size += len(docs[-1])
+    return docs
+
+
+def load_corpus(path: str) -> List[str]:
+    return [p.read_text(errors="ignore") for p in sorted(Path(path).rglob("*.txt"))]
+
+
+def run(docs: List[str]) -> Dict:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    documents = [Document(page_content=doc) for doc in docs]
+    megabytes = sum(len(d.encode("utf-8")) for d in docs) / 1e6
+    splitters = {
+        # The previous DocumentProcessor settings
+        "recursive_character": RecursiveCharacterTextSplitter(
+            chunk_size=1000, chunk_overlap=200, length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        ),
+        "token_chunker": TokenChunker(Config.CHUNK_TOKENS, Config.CHUNK_OVERLAP_TOKENS),
+    }
+    tokens.encoding()  # load the BPE ranks outside the timed region
+    results = {"corpus_mb": round(megabytes, 2), "documents": len(docs)}
+    for name, splitter in splitters.items():
+        started = time.perf_counter()
+        chunks = [chunk.page_content for chunk in splitter.split_documents(documents)]
+        seconds = time.perf_counter() - started
+        sizes = np.array([tokens.count_tokens(chunk) for chunk in chunks])
+        results[name] = {
+            "seconds": round(seconds, 3),
+            "mb_per_second": round(megabytes / seconds, 2),
+            "chunks": len(chunks),
+            "tokens_mean": round(float(sizes.mean()), 1),
+            "tokens_p95": int(np.percentile(sizes, 95)),
+            "tokens_max": int(sizes.max()),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of .txt files (default: synthetic)")
+    parser.add_argument("--mb", type=float, default=20, help="synthetic corpus size")
+    args = parser.parse_args()
+    docs = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.mb)
+    print(json.dumps(run(docs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
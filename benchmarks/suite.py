@@ -0,0 +1,300 @@
+"""End-to-end performance suite on synthetic corpora, with no API calls.
+
+    python -m benchmarks.suite                                   # 1k and 10k chunks
+    python -m benchmarks.suite --sizes 1000 100000 1000000 --output bench.json
+    python -m benchmarks.suite --baseline bench-main.json        # flag regressions
+
+Embeddings come from the hashing embedder and chat replies from the canned
+model (utils/fake_providers.py), so results depend only on the code and
+the machine. Each size gets a fresh store in a temporary directory and
+reports ingest throughput, snapshot save and load time, search latency per
+mode, recall@k and RSS; chat latency is measured on the smallest store.
+``--shard-key category`` runs the same on a sharded memory (eight shards).
+Without tiktoken's BPE file (never downloaded, no network) a local
+tokenizer stands in; results record which one ran, and numbers from
+different tokenizers are not comparable.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+from config import Config
+from utils import tokens
+
+MODES = ("dense", "lexical", "hybrid")
+
+# Numbers where a rise is a regression, and where a fall is
+LOWER_IS_BETTER = ("seconds", "_ms", "rss_mb")
+HIGHER_IS_BETTER = ("per_second", "recall", "hit_rate")
+
+CHAT_MESSAGES = [
+    "How many documents are in my knowledge base?",
+    "What do my notes say about {topic}?",
+    "Hello, how are you?",
+    "Find information about {topic}.",
+    "Write me a short poem about spring.",
+]
+
+
+def synthetic_chunks(n: int, words: int, seed: int = 0,
+                     vocabulary: int = 20000) -> Iterator[List[Document]]:
+    """``n`` chunks of ``words`` Zipf-distributed pseudo-words, in batches.
+
+    Fifty chunks share a source file, so filters and file stats look real;
+    files cycle through eight categories.
+    """
+    rng = np.random.default_rng(seed)
+    syllables = np.array(["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "qu", "ar", "en"])
+    vocab = np.array(["".join(rng.choice(syllables, size=rng.integers(2, 5)))
+                      for _ in range(vocabulary)])
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    weights /= weights.sum()
+    batch_size = Config.INGEST_STREAM_BATCH * 16
+    for start in range(0, n, batch_size):
+        count = min(batch_size, n - start)
+        picks = vocab[rng.choice(vocabulary, size=(count, words), p=weights)]
+        yield [Document(page_content=" ".join(row),
+                        metadata={"source": f"doc{i // 50}.txt", "filename": f"doc{i // 50}.txt",
+                                  "type": "text", "category": f"cat{i // 50 % 8}",
+                                  "page": 0})
+               for i, row in zip(range(start, start + count), picks)]
+
+
+def rss_mb() -> float:
+    """Current resident set size; falls back to the peak off Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if platform.system() == "Darwin" else peak / 2 ** 10
+
+
+def latency(calls: List, run) -> Dict:
+    """p50/p95/mean milliseconds of ``run(call)`` over ``calls``."""
+    times = []
+    for call in calls:
+        started = time.perf_counter()
+        run(call)
+        times.append((time.perf_counter() - started) * 1000)
+    times = np.array(times)
+    return {"p50_ms": round(float(np.percentile(times, 50)), 3),
+            "p95_ms": round(float(np.percentile(times, 95)), 3),
+            "mean_ms": round(float(times.mean()), 3)}
+
+
+def bench_store(n: int, args) -> Dict:
+    """Ingest, persist, reload and search a fresh store of ``n`` chunks."""
+    from memory.storage_report import storage_report
+
+    tokens.encoding()  # load (or fail to download) the BPE ranks outside the timed region
+    # Queries are a few words of stored chunks; the chunk itself should come back
+    rng = np.random.default_rng(args.seed + 1)
+    probe = set(rng.choice(n, size=min(args.queries, n), replace=False).tolist())
+    queries: List[Tuple[str, str]] = []
+
+    memory = open_memory()
+    started = time.perf_counter()
+    position = 0
+    for batch in synthetic_chunks(n, args.words, args.seed):
+        for offset in range(0, len(batch), Config.INGEST_STREAM_BATCH):
+            memory.add_documents(batch[offset:offset + Config.INGEST_STREAM_BATCH])
+        for doc in batch:
+            if position in probe:
+                words = doc.page_content.split()
+                picked = rng.choice(len(words), size=min(args.query_words, len(words)),
+                                    replace=False)
+                queries.append((" ".join(words[i] for i in sorted(picked)), doc.page_content))
+            position += 1
+    ingest_seconds = time.perf_counter() - started
+    result = {
+        "chunks": n,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "ingest_chunks_per_second": round(n / ingest_seconds, 1),
+        "rss_mb_after_ingest": round(rss_mb(), 1),
+    }
+
+    started = time.perf_counter()
+    memory.compact()
+    result["save_seconds"] = round(time.perf_counter() - started, 3)
+    memory.close()
+    del memory
+    gc.collect()
+
+    started = time.perf_counter()
+    memory = open_memory()
+    result["load_seconds"] = round(time.perf_counter() - started, 3)
+    result["rss_mb_after_load"] = round(rss_mb(), 1)
+
+    for mode in MODES:
+        run = lambda query: memory.search(query[0], k=args.k, mode=mode)
+        run(queries[0])  # first search pays for lazy loading; keep it out
+        stats = latency(queries, run)
+        hits = sum(any(doc.page_content == text for doc in run((query, text)))
+                   for query, text in queries)
+        stats["hit_rate"] = round(hits / len(queries), 4)
+        result[f"search_{mode}"] = stats
+    run = lambda query: memory.search(query[0], k=args.k, filter_dict={"category": "cat0"})
+    result["search_filtered"] = latency(queries, run)
+
+    if args.shard_key:
+        # Recall is measured per index; shards are indexes of their own
+        result["shards"] = len(memory.get_collection_stats()["shards"])
+        return result
+    report = storage_report(memory, k=args.k, n_queries=min(args.queries, n), seed=args.seed)
+    result["index_type"] = report["index_type"]
+    result[f"recall_at_{args.k}"] = round(report[f"recall@{args.k}"], 4)
+    result[f"recall_at_{args.k}_rescored"] = round(report[f"recall@{args.k}_rescored"], 4)
+    return result
+
+
+def bench_chat(args) -> Dict:
+    """End-to-end ``AURORA.chat`` latency on the current store, routed and not."""
+    from main import AURORA
+
+    topics = [doc.page_content.split()[0] for doc in next(synthetic_chunks(20, 5, args.seed))]
+    messages = [template.format(topic=topic)
+                for topic in topics for template in CHAT_MESSAGES][:args.chat_messages]
+    aurora = AURORA()
+    result = {}
+    router_enabled = Config.ROUTER_ENABLED
+    try:
+        for routed in (True, False):
+            Config.ROUTER_ENABLED = routed
+            run = lambda message: aurora.chat(message, session_id=f"bench-{routed}")
+            result["chat_routed" if routed else "chat_agent_only"] = latency(messages, run)
+    finally:
+        Config.ROUTER_ENABLED = router_enabled
+    result["routes"] = {route: {"count": stats["count"],
+                                "mean_ms": round(stats["mean_seconds"] * 1000, 3),
+                                "mean_llm_calls": round(stats["mean_llm_calls"], 2)}
+                        for route, stats in aurora.route_stats().items()}
+    aurora.conversations.wait("bench-True")
+    aurora.conversations.wait("bench-False")
+    return result
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Lines for every number that moved more than ``threshold`` the wrong way."""
+    regressions = []
+
+    def walk(new, old, path):
+        if isinstance(new, dict) and isinstance(old, dict):
+            for key in new.keys() & old.keys():
+                walk(new[key], old[key], f"{path}.{key}" if path else key)
+        elif (isinstance(new, (int, float)) and isinstance(old, (int, float))
+              and not isinstance(new, bool) and old):
+            change = (new - old) / abs(old)
+            if ((any(s in path for s in LOWER_IS_BETTER) and change > threshold)
+                    or (any(s in path for s in HIGHER_IS_BETTER) and change < -threshold)):
+                regressions.append(f"{path}: {old} -> {new} ({change:+.0%})")
+
+    walk(results["sizes"], baseline.get("sizes", {}), "sizes")
+    walk(results.get("chat", {}), baseline.get("chat", {}), "chat")
+    return regressions
+
+
+def open_memory():
+    from memory.sharded_store import ShardedMemory
+    from memory.vector_store import VectorMemory
+    return ShardedMemory() if Config.SHARD_KEY else VectorMemory()
+
+
+def configure(path: str, args):
+    """Point every store at ``path`` and swap in the offline providers."""
+    Config.LLM_PROVIDER = "fake"
+    Config.EMBEDDING_PROVIDER = "fake"
+    Config.EMBEDDING_DIMENSIONS = args.dim
+    Config.SHARD_KEY = args.shard_key
+    Config.FAKE_EMBEDDING_LATENCY = args.embedding_latency
+    Config.FAKE_LLM_FIRST_TOKEN_LATENCY = args.llm_first_token_latency
+    Config.FAKE_LLM_TOKEN_LATENCY = args.llm_token_latency
+    Config.CHROMA_DB_PATH = os.path.join(path, "store")
+    Config.EMBEDDING_CACHE_PATH = os.path.join(path, "embedding_cache")
+    Config.CONVERSATION_DB_PATH = os.path.join(path, "conversations")
+    Config.EMBEDDING_CACHE_MAX_ENTRIES = max(Config.EMBEDDING_CACHE_MAX_ENTRIES,
+                                             max(args.sizes) + 10 * args.queries)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="corpus sizes in chunks, e.g. 1000 10000 100000 1000000")
+    parser.add_argument("--words", type=int, default=120, help="words per chunk")
+    parser.add_argument("--dim", type=int, default=256, help="embedding dimension")
+    parser.add_argument("--shard-key", help="shard memory by this metadata key, e.g. category")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=8)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--chat-messages", type=int, default=30)
+    parser.add_argument("--embedding-latency", type=float, default=0.0,
+                        help="simulated seconds per embedding request")
+    parser.add_argument("--llm-first-token-latency", type=float, default=0.0)
+    parser.add_argument("--llm-token-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change counted as a regression")
+    args = parser.parse_args()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {"commit": git_commit(), "timestamp": time.time(),
+               "python": platform.python_version(), "machine": platform.machine(),
+               "settings": {k: v for k, v in vars(args).items()
+                            if k not in ("output", "baseline", "threshold")},
+               "sizes": {}}
+    for n in sorted(args.sizes):
+        path = tempfile.mkdtemp(prefix="aurora-bench-")
+        try:
+            configure(path, args)
+            results["sizes"][str(n)] = bench_store(n, args)
+            if n == min(args.sizes):
+                results["chat"] = bench_chat(args)
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+        print(json.dumps({str(n): results["sizes"][str(n)]}, indent=2), flush=True)
+    results["tokenizer"] = tokens.encoding().name
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results.get("chat", {}), indent=2))
+    print(f"Wrote {args.output}")
+
+    if baseline is not None:
+        if baseline.get("tokenizer", results["tokenizer"]) != results["tokenizer"]:
+            print(f"Note: the baseline used the {baseline['tokenizer']} tokenizer, "
+                  f"this run {results['tokenizer']}")
+        regressions = compare(results, baseline, args.threshold)
+        print("\n".join(["Regressions:", *regressions]) if regressions else "No regressions")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,17 +8,119 @@ class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     MODEL_NAME = "gpt-4-turbo-preview"  # or "gpt-3.5-turbo" for cheaper option
     EMBEDDING_MODEL = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 0)) or None  # e.g. 512; None keeps the model default
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache")
+    EMBEDDING_CACHE_MAX_ENTRIES = 100000  # LRU-evicted beyond this many vectors
+    EMBEDDING_MODEL_DIMENSIONS = {  # native sizes, so an empty store needs no API call
+        "text-embedding-3-small": 1536,
+        "text-embedding-3-large": 3072,
+        "text-embedding-ada-002": 1536,
+    }
+    EMBEDDING_BATCH_TOKENS = 100000  # tokens per embedding request
+    EMBEDDING_BATCH_INPUTS = 2048  # texts per embedding request (API limit)
+    EMBEDDING_MAX_INPUT_TOKENS = 8191  # longer texts are truncated
+    EMBEDDING_CONCURRENCY = 4  # embedding requests in flight
+    EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", 3000))  # requests-per-minute budget
+    EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", 1000000))  # tokens-per-minute budget
+    EMBEDDING_MAX_RETRIES = 6
+    EMBEDDING_BACKOFF_BASE = 1.0  # seconds, doubled per retry
+    EMBEDDING_BACKOFF_MAX = 60.0
+    TOKEN_ENCODING = "cl100k_base"  # tiktoken encoding of the OpenAI models
+    TOKENIZER_THREADS = 8  # tiktoken threads for batch encoding
+    HTTP_MAX_CONNECTIONS = 20  # per pool: sync, async chat and embedding scheduler
+    HTTP_TIMEOUT = 60.0
+    # "fake" swaps in the deterministic offline stand-ins of utils/fake_providers.py
+    LLM_PROVIDER = os.getenv("AURORA_LLM_PROVIDER", "openai")
+    EMBEDDING_PROVIDER = os.getenv("AURORA_EMBEDDING_PROVIDER", "openai")
+    FAKE_EMBEDDING_LATENCY = float(os.getenv("AURORA_FAKE_EMBEDDING_LATENCY", 0))  # seconds per request
+    FAKE_LLM_FIRST_TOKEN_LATENCY = float(os.getenv("AURORA_FAKE_LLM_FIRST_TOKEN_LATENCY", 0))  # seconds
+    FAKE_LLM_TOKEN_LATENCY = float(os.getenv("AURORA_FAKE_LLM_TOKEN_LATENCY", 0))  # seconds per token
     
     # Vector DB
     CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./chroma_db")
     COLLECTION_NAME = "aurora_memory"
+    WAL_COMPACT_THRESHOLD = 5000  # logged vectors before folding into a new snapshot
+    TOMBSTONE_COMPACT_RATIO = 0.2  # deleted share of the index that forces a compaction
+    INDEXED_METADATA_KEYS = ["source", "filename", "type", "category", "page", "session"]
+
+    # Sharding
+    SHARD_KEY = os.getenv("AURORA_SHARD_KEY") or None  # metadata key partitioning memory into sub-stores, e.g. "type"; unset = one store
+    SHARD_TIME_FORMAT = os.getenv("AURORA_SHARD_TIME_FORMAT") or None  # strftime bucket given to chunks without SHARD_KEY, e.g. "%Y-%m"
+    SHARD_MAX_LOADED = 8  # open shards kept regardless of use (0 = no limit)
+    SHARD_IDLE_SECONDS = 60  # ...beyond which shards unused this long are unloaded in the background
+    SHARD_SEARCH_THREADS = min(8, os.cpu_count() or 1)  # shards searched in parallel; 1 searches them in turn
+
+    # ANN index
+    INDEX_TYPE = os.getenv("AURORA_INDEX_TYPE", "auto")  # auto, Flat, IVF{nlist}, HNSW{M}, IVFPQ or a faiss factory string
+    INDEX_TRAIN_THRESHOLD = 50000  # chunks before a trained index replaces Flat
+    INDEX_TRAIN_SAMPLE = 100000  # vectors sampled to train IVF/PQ
+    IVF_NPROBE = 16
+    HNSW_EF_SEARCH = 64
+    VECTOR_ENCODING = os.getenv("AURORA_VECTOR_ENCODING", "float32")  # float32, float16 or int8
+    RESCORE_FACTOR = 4  # candidates per result re-ranked at full precision for lossy encodings
     
     # Chunking
-    CHUNK_SIZE = 1000
-    CHUNK_OVERLAP = 200
+    CHUNK_TOKENS = 256  # about 1000 characters of English
+    CHUNK_OVERLAP_TOKENS = 48
+    
+    # Bulk ingestion
+    INGEST_WORKERS = os.cpu_count() or 1  # parser processes
+    INGEST_BATCH_CHUNKS = 512  # chunks embedded and stored per batch
+    INGEST_STREAM_BATCH = 64  # chunks per commit when streaming a single document
+    INGEST_QUEUE_CHUNKS = 256  # parsed chunks buffered ahead of embedding
+    PDF_PAGES_PER_READER = 200  # pages parsed before the PDF reader is re-opened
+    PARSED_DOCUMENT_CACHE = 8  # parsed documents kept for ingest/summarize/insights
     
     # Search
     TOP_K_RESULTS = 5
+    FILTER_EXACT_SCAN_LIMIT = 20000  # filtered subsets up to this size are scored directly
+    SEARCH_MODE = os.getenv("AURORA_SEARCH_MODE", "hybrid")  # hybrid, dense or lexical
+    HYBRID_CANDIDATES = 50  # depth of each ranking fused in hybrid search
+    RRF_K = 60  # reciprocal-rank fusion damping constant
+    MMR_FETCH_K = 40  # candidates re-ranked for diversity
+    MMR_LAMBDA = 0.7  # 1 ranks by relevance only, 0 by diversity only
+    MMR_DUPLICATE_SIMILARITY = 0.97  # cosine similarity at which a candidate is a duplicate
+    LEXICAL_METADATA_KEYS = ["filename"]  # metadata searchable by keyword along with the text
+    LEXICAL_MAX_ROWS = 16  # postings rows per term before a compaction merges them
+    ANSWER_CACHE_SIMILARITY = 0.95  # question cosine similarity that reuses a cached answer
+    ANSWER_CACHE_TTL = 24 * 3600  # seconds a cached answer stays valid
+    ANSWER_CACHE_MAX_ENTRIES = 1000  # LRU-evicted beyond this many answers
+    
+    # Answer context
+    CONTEXT_TOKEN_BUDGET = 1500  # prompt tokens of retrieved context per answer
+    CONTEXT_CANDIDATES = 12  # diverse chunks considered for the context
+    
+    # Summarization
+    SUMMARY_MAP_TOKENS = 3000  # document tokens per map call
+    SUMMARY_REDUCE_TOKENS = 3000  # partial-summary tokens per combine call
+    SUMMARY_CONCURRENCY = 8  # summarization calls in flight
+    
+    # Agent
+    AGENT_VERBOSE = os.getenv("AURORA_AGENT_VERBOSE", "") == "1"  # log agent steps to the console
+    ROUTER_ENABLED = os.getenv("AURORA_ROUTER", "1") == "1"  # answer simple intents without the agent
+    ROUTER_SIMILARITY = 0.55  # min cosine between a message and its intent's nearest exemplar
+    ROUTER_MARGIN = 0.05  # ...and its lead over the nearest exemplar of any other intent
+    CHAT_INGEST_DIR = os.getenv("AURORA_CHAT_INGEST_DIR") or None  # "ingest <file>" in chat only reads files below this directory; unset = off
+    
+    # Conversation memory
+    CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "./conversation_db")  # archived turns
+    CONVERSATION_TOKEN_BUDGET = 2000  # history tokens per prompt: summary, recalled and recent turns
+    CONVERSATION_RECENT_TURNS = 6  # turns kept verbatim before they are summarized
+    CONVERSATION_RECENT_TOKENS = 1200  # ...or fewer, when they add up to more tokens than this
+    CONVERSATION_SUMMARY_TOKENS = 400  # rolling summary cap
+    CONVERSATION_RECALL_K = 3  # archived turns recalled per message, budget permitting
+    
+    # Metrics
+    METRICS_ENABLED = os.getenv("AURORA_METRICS", "1") == "1"  # stage timings, tokens and cost
+    METRICS_SAMPLES = 1024  # recent timings kept per stage for p50/p95
+    MODEL_COST_PER_1K = {  # USD per 1K (prompt, completion) tokens
+        "gpt-4-turbo-preview": (0.01, 0.03),
+        "gpt-4-turbo": (0.01, 0.03),
+        "gpt-3.5-turbo": (0.0005, 0.0015),
+        "text-embedding-3-small": (0.00002, 0.0),
+        "text-embedding-3-large": (0.00013, 0.0),
+        "text-embedding-ada-002": (0.0001, 0.0),
+    }
     
     # Temperature settings
     REASONING_TEMPERATURE = 0.7
@@ -0,0 +1,54 @@
+"""Bulk-ingest a directory into AURORA's knowledge base.
+
+    python ingest.py ~/papers --pattern "**/*.pdf" --workers 8
+    python ingest.py ~/notes --sync --watch 60
+"""
+import argparse
+import json
+import sys
+import time
+from config import Config
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="directory to ingest")
+    parser.add_argument("--pattern", default="**/*",
+                        help="glob relative to PATH (default: every file, recursively)")
+    parser.add_argument("--workers", type=int, default=Config.INGEST_WORKERS,
+                        help="parser processes")
+    parser.add_argument("--sync", action="store_true",
+                        help="only re-ingest added/changed files and drop deleted ones")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="with --sync, keep syncing at this interval")
+    args = parser.parse_args()
+
+    from main import AURORA
+
+    if args.sync:
+        aurora = AURORA()
+        while True:
+            report = aurora.sync_directory(args.path, args.pattern, args.workers)
+            print(json.dumps(report), flush=True)
+            if not args.watch:
+                return 1 if report["failures"] else 0
+            time.sleep(args.watch)
+
+    def progress(report):
+        print(f"\r{report['done']}/{report['files']} files  "
+              f"{report['files_per_second']:.1f} files/s  "
+              f"{report['chunks_per_second']:.1f} chunks/s  "
+              f"{len(report['failures'])} failed",
+              end="", file=sys.stderr, flush=True)
+
+    report = AURORA().ingest_directory(args.path, args.pattern, args.workers,
+                                       on_progress=progress)
+    print(file=sys.stderr)
+    for file_path, error in report["failures"].items():
+        print(f"FAILED {file_path}: {error}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    return 1 if report["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,34 +1,62 @@
-from memory.vector_store import VectorMemory
-from agents.knowledge_butler import KnowledgeButler
-from agents.reading_companion import ReadingCompanion
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+import asyncio
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional
 from config import Config
+from utils.clients import chat_model, lazy_property
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
 
 class AURORA:
-    """Main orchestrator for the AURORA system."""
+    """Main orchestrator for the AURORA system.
+
+    Memory, agents and LLM clients are built on first use, so creating
+    AURORA is instant and makes no API calls.
+    """
     
-    def __init__(self):
-        # Initialize memory
-        self.memory = VectorMemory()
-        
-        # Initialize agents
-        self.knowledge_butler = KnowledgeButler(self.memory)
-        self.reading_companion = ReadingCompanion(self.memory)
-        
-        # Initialize LLM for orchestration
-        self.llm = ChatOpenAI(
-            model=Config.MODEL_NAME,
-            temperature=Config.REASONING_TEMPERATURE,
-            openai_api_key=Config.OPENAI_API_KEY
-        )
-        
-        # Set up agent executor
-        self._setup_agent()
+    @lazy_property
+    def memory(self):
+        """Long-term memory: one store, or one per ``Config.SHARD_KEY`` value."""
+        if Config.SHARD_KEY:
+            from memory.sharded_store import ShardedMemory
+            return ShardedMemory()
+        from memory.vector_store import VectorMemory
+        return VectorMemory()
+    
+    @lazy_property
+    def knowledge_butler(self):
+        from agents.knowledge_butler import KnowledgeButler
+        return KnowledgeButler(self.memory)
+    
+    @lazy_property
+    def reading_companion(self):
+        from agents.reading_companion import ReadingCompanion
+        return ReadingCompanion(self.memory)
     
-    def _setup_agent(self):
+    @lazy_property
+    def conversations(self):
+        """Per-session chat history; archived turns get their own store."""
+        from memory.conversation import ConversationMemory
+        from memory.vector_store import VectorMemory
+        return ConversationMemory(VectorMemory(Config.CONVERSATION_DB_PATH,
+                                               embeddings=self.memory.embeddings))
+    
+    @lazy_property
+    def router(self):
+        from agents.router import IntentRouter
+        return IntentRouter(self.knowledge_butler, self.reading_companion,
+                            self.memory.embeddings)
+    
+    @property
+    def llm(self):
+        """LLM for orchestration."""
+        return chat_model(Config.REASONING_TEMPERATURE)
+    
+    @lazy_property
+    def agent_executor(self):
         """Set up the main agent with all tools."""
+        from langchain.agents import AgentExecutor, create_openai_tools_agent
+        from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+
         # Collect tools from all agents
         tools = self.knowledge_butler.get_tools()
         
@@ -42,30 +70,134 @@ When users ask questions, search the knowledge base first. When they want to add
 use the reading tools.
 
 Be helpful, concise, and intelligent in your responses."""),
+            MessagesPlaceholder(variable_name="chat_history", optional=True),
             ("human", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
         
-        # Create agent
-        agent = create_openai_tools_agent(self.llm, tools, prompt)
-        self.agent_executor = AgentExecutor(
+        # Create agent; a streaming model so stream_chat sees each token
+        llm = chat_model(Config.REASONING_TEMPERATURE, streaming=True)
+        agent = create_openai_tools_agent(llm, tools, prompt)
+        return AgentExecutor(
             agent=agent,
             tools=tools,
-            verbose=True
+            verbose=Config.AGENT_VERBOSE
         )
     
-    def chat(self, message: str) -> str:
-        """Main chat interface."""
-        response = self.agent_executor.invoke({"input": message})
-        return response["output"]
+    def chat(self, message: str, session_id: str = "default") -> str:
+        """Main chat interface.
+
+        Simple intents (stats, knowledge questions, "ingest <file>" below
+        ``Config.CHAT_INGEST_DIR``) are answered directly when
+        ``Config.ROUTER_ENABLED``; the rest go to the agent, with the
+        session's history within ``Config.CONVERSATION_TOKEN_BUDGET``.
+        """
+        from utils.metrics import span
+
+        agent = lambda: self.agent_executor.invoke(self._agent_input(message, session_id))["output"]
+        with span("chat"):
+            answer = self.router.handle(message, agent) if Config.ROUTER_ENABLED else agent()
+        self.conversations.add_turn(session_id, message, answer)
+        return answer
+    
+    def stream_chat(self, message: str, session_id: str = "default") -> Iterator[Dict]:
+        """Chat, yielding events as they happen.
+
+        ``{"type": "token", "text": ...}`` for each token of the agent's
+        replies and of routed search answers, ``{"type": "tool_start",
+        "tool": ..., "input": ...}`` and ``{"type": "tool_end", "tool": ...,
+        "output": ...}`` around each tool call, and finally ``{"type":
+        "final", "text": ..., "first_token_seconds": ..., "seconds": ...}``.
+        Routed stats and ingest replies only come with the final event.
+        """
+        from utils.metrics import span
+        from utils.streaming import stream_events
+
+        def run(callbacks):
+            agent = lambda: self.agent_executor.invoke(
+                self._agent_input(message, session_id), config={"callbacks": callbacks})["output"]
+            with span("chat"):
+                answer = (self.router.handle(message, agent, callbacks) if Config.ROUTER_ENABLED
+                          else agent())
+            self.conversations.add_turn(session_id, message, answer)
+            return answer
+
+        return stream_events(run)
+    
+    async def achat(self, message: str, session_id: str = "default") -> str:
+        """``chat`` as a coroutine: LLM, embedding and tool calls are awaited,
+        so one event loop can serve many sessions at once."""
+        from utils.metrics import span
+
+        async def agent():
+            agent_input = await asyncio.to_thread(self._agent_input, message, session_id)
+            return (await self.agent_executor.ainvoke(agent_input))["output"]
+
+        with span("chat"):
+            answer = (await self.router.ahandle(message, agent) if Config.ROUTER_ENABLED
+                      else await agent())
+        self.conversations.add_turn(session_id, message, answer)
+        return answer
+    
+    def clear_conversation(self, session_id: str = "default"):
+        """Forget a session's chat history."""
+        self.conversations.clear(session_id)
+    
+    def conversation_stats(self, session_id: str = "default") -> Dict:
+        """Turns and history tokens of a session."""
+        return self.conversations.stats(session_id)
+    
+    def _agent_input(self, message: str, session_id: str) -> Dict:
+        return {"input": message,
+                "chat_history": self.conversations.history(session_id, message)}
+    
+    def route_stats(self) -> Dict[str, Dict]:
+        """Messages, latency and LLM calls per chat route."""
+        return self.router.stats()
+    
+    def metrics(self, format: str = "json") -> str:
+        """Stage timings, token and cost counters as ``"json"`` lines or
+        ``"prometheus"`` text."""
+        from utils.metrics import METRICS
+
+        if format == "prometheus":
+            return METRICS.prometheus()
+        if format == "json":
+            return METRICS.json_lines()
+        raise ValueError(f"Unknown metrics format {format!r}; use 'json' or 'prometheus'")
+    
+    async def asearch(self, query: str, k: int = Config.TOP_K_RESULTS,
+                      filter_dict: Optional[Dict] = None,
+                      mode: Optional[str] = None) -> List["Document"]:
+        """Search memory without blocking the event loop."""
+        return await self.memory.asearch(query, k, filter_dict, mode)
+    
+    def ingest_document(self, file_path: str, data: Optional[bytes] = None) -> str:
+        """Directly ingest a document, from disk or from ``data`` in memory."""
+        return self.reading_companion.ingest_document(file_path, data)
+    
+    async def aingest(self, file_path: str, data: Optional[bytes] = None) -> str:
+        """``ingest_document`` as a coroutine."""
+        return await self.reading_companion.aingest_document(file_path, data)
+    
+    def ingest_directory(self, path: str, pattern: str = "**/*",
+                         workers: Optional[int] = None,
+                         on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Ingest all supported files under a directory in parallel."""
+        return self.reading_companion.ingest_directory(path, pattern, workers, on_progress)
+    
+    def sync_directory(self, path: str, pattern: str = "**/*",
+                       workers: Optional[int] = None) -> Dict:
+        """Re-ingest only what changed in a folder since the last sync."""
+        return self.reading_companion.sync_directory(path, pattern, workers)
     
-    def ingest_document(self, file_path: str) -> str:
-        """Directly ingest a document."""
-        return self.reading_companion.ingest_document(file_path)
+    def summarize_document(self, file_path: str, data: Optional[bytes] = None) -> str:
+        """Directly summarize a document, from disk or from ``data`` in memory."""
+        return self.reading_companion.summarize_document(file_path, data)
     
-    def summarize_document(self, file_path: str) -> str:
-        """Directly summarize a document."""
-        return self.reading_companion.summarize_document(file_path)
+    def extract_insights(self, file_path: str, data: Optional[bytes] = None) -> str:
+        """Directly extract a document's key insights."""
+        return self.reading_companion.extract_insights(file_path, data)
 
 
 if __name__ == "__main__":
@@ -81,5 +213,15 @@ if __name__ == "__main__":
         if user_input.lower() == 'exit':
             break
         
-        response = aurora.chat(user_input)
-        print(f"\nAURORA: {response}\n")
+        print("\nAURORA: ", end="", flush=True)
+        streamed = False
+        for event in aurora.stream_chat(user_input):
+            if event["type"] == "token":
+                streamed = True
+                print(event["text"], end="", flush=True)
+            elif event["type"] == "tool_start":
+                print(f"[{event['tool']}...] ", end="", flush=True)
+            elif event["type"] == "final" and not streamed:
+                # Stats, ingest and cached answers arrive whole
+                print(event["text"], end="", flush=True)
+        print("\n")
@@ -0,0 +1,118 @@
+import hashlib
+import sqlite3
+import time
+from typing import Callable, ContextManager, Dict, List, Optional
+import numpy as np
+from config import Config
+from memory.metadata_index import MAX_PARAMS
+from utils.clients import model_id
+
+
+class AnswerCache:
+    """Synthesized answers, reused for similar questions over the same chunks.
+
+    An entry is keyed by the set of chunk IDs its answer was generated
+    from, plus the question's embedding: a lookup hits when retrieval
+    returned exactly that set and the new question's cosine similarity is
+    at least ``Config.ANSWER_CACHE_SIMILARITY``. Chunk IDs are content
+    hashes, so an edited chunk never matches an old entry, and deleting a
+    chunk drops every entry built on it in the same transaction.
+
+    Entries live in the ``answers`` and ``answer_chunks`` tables of the
+    docstore's SQLite database. They expire after ``Config.ANSWER_CACHE_TTL``
+    seconds, and beyond ``Config.ANSWER_CACHE_MAX_ENTRIES`` the least
+    recently used are evicted.
+    """
+
+    def __init__(self, conn: sqlite3.Connection,
+                 transaction: Callable[[], ContextManager]):
+        self.conn = conn
+        self.transaction = transaction
+        self.hits = 0
+        self.misses = 0
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY, chunk_key TEXT, "
+            "query TEXT, vector BLOB, answer TEXT, created REAL, used REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS answers_chunk_key ON answers (chunk_key)")
+        conn.execute("CREATE TABLE IF NOT EXISTS answer_chunks (chunk_id TEXT, answer INTEGER)")
+        conn.execute("CREATE INDEX IF NOT EXISTS answer_chunks_id ON answer_chunks (chunk_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS answer_chunks_answer ON answer_chunks (answer)")
+
+    def get(self, vector: List[float], chunk_ids: List[str]) -> Optional[str]:
+        """The cached answer for a question embedded as ``vector`` whose
+        retrieval returned ``chunk_ids``, if any."""
+        query = _normalize(vector)
+        best, best_similarity = None, Config.ANSWER_CACHE_SIMILARITY
+        for entry, blob, answer in self.conn.execute(
+                "SELECT id, vector, answer FROM answers WHERE chunk_key = ? AND created >= ?",
+                (_chunk_key(chunk_ids), time.time() - Config.ANSWER_CACHE_TTL)):
+            cached = np.frombuffer(blob, dtype=np.float32)
+            if len(cached) != len(query):
+                continue
+            similarity = float(query @ cached)
+            if similarity >= best_similarity:
+                best, best_similarity = (entry, answer), similarity
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.transaction():
+            self.conn.execute("UPDATE answers SET used = ? WHERE id = ?", (time.time(), best[0]))
+        return best[1]
+
+    def put(self, query: str, vector: List[float], chunk_ids: List[str], answer: str):
+        """Cache ``answer``, expiring and evicting old entries."""
+        now = time.time()
+        with self.transaction():
+            entry = self.conn.execute(
+                "INSERT INTO answers (chunk_key, query, vector, answer, created, used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (_chunk_key(chunk_ids), query, _normalize(vector).tobytes(), answer, now, now)
+            ).lastrowid
+            self.conn.executemany("INSERT INTO answer_chunks (chunk_id, answer) VALUES (?, ?)",
+                                  [(doc_id, entry) for doc_id in set(chunk_ids)])
+            stale = [entry for (entry,) in self.conn.execute(
+                "SELECT id FROM answers WHERE created < ? UNION "
+                "SELECT id FROM (SELECT id FROM answers ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (now - Config.ANSWER_CACHE_TTL, Config.ANSWER_CACHE_MAX_ENTRIES))]
+            self._remove(stale)
+
+    def invalidate(self, chunk_ids: List[str]):
+        """Drop entries built on any of ``chunk_ids``; call inside a transaction."""
+        entries = set()
+        for start in range(0, len(chunk_ids), MAX_PARAMS):
+            batch = chunk_ids[start:start + MAX_PARAMS]
+            entries.update(entry for (entry,) in self.conn.execute(
+                f"SELECT answer FROM answer_chunks WHERE chunk_id IN "
+                f"({','.join('?' * len(batch))})", batch))
+        self._remove(list(entries))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0],
+            "max_entries": Config.ANSWER_CACHE_MAX_ENTRIES,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _remove(self, entries: List[int]):
+        for start in range(0, len(entries), MAX_PARAMS):
+            batch = entries[start:start + MAX_PARAMS]
+            marks = ",".join("?" * len(batch))
+            self.conn.execute(f"DELETE FROM answers WHERE id IN ({marks})", batch)
+            self.conn.execute(f"DELETE FROM answer_chunks WHERE answer IN ({marks})", batch)
+
+
+def _chunk_key(chunk_ids: List[str]) -> str:
+    """Key of the retrieved chunk set and the model that answered from it."""
+    return hashlib.sha256(
+        "\0".join([model_id(), *sorted(set(chunk_ids))]).encode("utf-8")
+    ).hexdigest()
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
@@ -0,0 +1,213 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from langchain.prompts import PromptTemplate
+from langchain.schema import AIMessage, BaseMessage, Document, HumanMessage, SystemMessage
+from typing import Dict, List, Optional
+import threading
+from config import Config
+from memory.vector_store import VectorMemory
+from utils import tokens
+from utils.clients import chat_model
+from utils.metrics import timed
+
+# LangChain's progressive-summary prompt (ConversationSummaryMemory), with a length cap
+SUMMARY_PROMPT = PromptTemplate.from_template(
+    "Progressively summarize the lines of conversation provided, adding onto the previous "
+    "summary and returning a new summary of at most {words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew lines of conversation:\n{new_lines}\n\nNew summary:"
+)
+
+# Tokens the chat format adds around each message
+MESSAGE_TOKENS = 4
+
+
+class Turn:
+    """One user message and AURORA's reply."""
+
+    def __init__(self, index: int, human: str, ai: str):
+        self.index = index
+        self.human = human
+        self.ai = ai
+        self.text = f"User: {human}\nAURORA: {ai}"
+        self.tokens = tokens.count_tokens(human) + tokens.count_tokens(ai) + 2 * MESSAGE_TOKENS
+
+
+class Conversation:
+    """A session's turns: the recent ones verbatim, older ones in a summary."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.turns = 0
+        self.recent: List[Turn] = []
+        # Out of the recent window but not yet folded into the summary
+        self.pending: List[Turn] = []
+        self.summary = ""
+        self.archived = 0
+        self.history_tokens = 0
+        self.summarizing: Optional[Future] = None
+        self.lock = threading.Lock()
+
+
+class ConversationMemory:
+    """Bounded chat history for each session.
+
+    The last ``Config.CONVERSATION_RECENT_TURNS`` turns are kept verbatim.
+    Older ones are archived to a ``VectorMemory`` and folded into a rolling
+    summary on a background thread, one incremental LLM call per batch of
+    evicted turns. ``history`` returns the summary, the archived turns most
+    relevant to the new message and as many recent turns as fit, within
+    ``Config.CONVERSATION_TOKEN_BUDGET`` however long the conversation.
+    """
+
+    def __init__(self, store: VectorMemory):
+        self.store = store
+        self._conversations: Dict[str, Conversation] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix="conversation-summary")
+
+    @property
+    def llm(self):
+        return chat_model(Config.SUMMARIZATION_TEMPERATURE)
+
+    @timed("conversation.history")
+    def history(self, session_id: str, message: str) -> List[BaseMessage]:
+        """Messages to put before ``message`` in the prompt."""
+        conversation = self._conversation(session_id)
+        with conversation.lock:
+            summary = conversation.summary
+            turns = conversation.pending + conversation.recent
+            archived = conversation.archived
+        budget = Config.CONVERSATION_TOKEN_BUDGET
+        messages: List[BaseMessage] = []
+        if summary:
+            summary = f"Summary of the earlier conversation:\n{summary}"
+            budget -= tokens.count_tokens(summary) + MESSAGE_TOKENS
+            messages.append(SystemMessage(content=summary))
+
+        # Newest turns first, while they fit
+        kept = []
+        for turn in reversed(turns):
+            if turn.tokens > budget:
+                break
+            kept.append(turn)
+            budget -= turn.tokens
+        kept.reverse()
+
+        shown = {turn.index for turn in kept}
+        recalled = []
+        if archived and budget > MESSAGE_TOKENS:
+            budget -= MESSAGE_TOKENS
+            for doc in self.store.search(message, k=Config.CONVERSATION_RECALL_K,
+                                         filter_dict={"session": session_id}):
+                cost = tokens.count_tokens(doc.page_content) + 1
+                if doc.metadata["turn"] not in shown and cost <= budget:
+                    recalled.append(doc)
+                    shown.add(doc.metadata["turn"])
+                    budget -= cost
+            if not recalled:
+                budget += MESSAGE_TOKENS
+        if recalled:
+            recalled.sort(key=lambda doc: doc.metadata["turn"])
+            messages.append(SystemMessage(
+                content="Earlier turns relevant to this message:\n"
+                        + "\n".join(doc.page_content for doc in recalled)))
+
+        for turn in kept:
+            messages.extend([HumanMessage(content=turn.human), AIMessage(content=turn.ai)])
+        conversation.history_tokens = Config.CONVERSATION_TOKEN_BUDGET - budget
+        return messages
+
+    def add_turn(self, session_id: str, human: str, ai: str):
+        """Record a turn; turns leaving the recent window are summarized in the background."""
+        conversation = self._conversation(session_id)
+        with conversation.lock:
+            conversation.recent.append(Turn(conversation.turns, human, ai))
+            conversation.turns += 1
+            evicted = []
+            while len(conversation.recent) > 1 and (
+                    len(conversation.recent) > Config.CONVERSATION_RECENT_TURNS
+                    or sum(t.tokens for t in conversation.recent) > Config.CONVERSATION_RECENT_TOKENS):
+                evicted.append(conversation.recent.pop(0))
+            conversation.pending.extend(evicted)
+            if evicted and conversation.summarizing is None:
+                conversation.summarizing = self._executor.submit(self._summarize, conversation)
+
+    def clear(self, session_id: str):
+        """Forget a session, including its archived turns."""
+        with self._lock:
+            conversation = self._conversations.pop(session_id, None)
+        if conversation is not None:
+            # Let a summary in flight finish, so it archives nothing afterwards
+            with conversation.lock:
+                conversation.pending.clear()
+            future = conversation.summarizing
+            if future is not None:
+                future.result()
+        self.store.delete_by_metadata({"session": session_id})
+
+    def stats(self, session_id: str) -> Dict:
+        """Turn counts and token use of a session's history."""
+        conversation = self._conversation(session_id)
+        with conversation.lock:
+            return {
+                "turns": conversation.turns,
+                "recent_turns": len(conversation.recent),
+                "pending_turns": len(conversation.pending),
+                "archived_turns": conversation.archived,
+                "summary_tokens": tokens.count_tokens(conversation.summary),
+                "history_tokens": conversation.history_tokens,
+                "budget_tokens": Config.CONVERSATION_TOKEN_BUDGET,
+            }
+
+    def wait(self, session_id: str):
+        """Block until the session's background summarization is done."""
+        conversation = self._conversation(session_id)
+        while (future := conversation.summarizing) is not None:
+            future.result()
+
+    def _conversation(self, session_id: str) -> Conversation:
+        with self._lock:
+            if session_id not in self._conversations:
+                self._conversations[session_id] = Conversation(session_id)
+            return self._conversations[session_id]
+
+    @timed("conversation.summarize")
+    def _summarize(self, conversation: Conversation):
+        """Archive pending turns and fold them into the summary until none are left.
+
+        On failure the turns stay pending (still in the verbatim history,
+        within budget) and are retried after the next eviction.
+        """
+        while True:
+            with conversation.lock:
+                batch, summary = list(conversation.pending), conversation.summary
+                if not batch:
+                    conversation.summarizing = None
+                    return
+            try:
+                # The source goes into the chunk ID: the same exchange in two
+                # sessions is two chunks, not one deduplicated away
+                self.store.add_documents([
+                    Document(page_content=turn.text,
+                             metadata={"source": f"conversation:{conversation.session_id}",
+                                       "type": "conversation",
+                                       "session": conversation.session_id,
+                                       "turn": turn.index})
+                    for turn in batch
+                ])
+                summary = self.llm.invoke(SUMMARY_PROMPT.format(
+                    words=Config.CONVERSATION_SUMMARY_TOKENS * 3 // 4,
+                    summary=summary or "(none)",
+                    new_lines="\n".join(turn.text for turn in batch)
+                )).content.strip()
+            except Exception:
+                with conversation.lock:
+                    conversation.summarizing = None
+                return
+            ids = tokens.encode(summary)
+            if len(ids) > Config.CONVERSATION_SUMMARY_TOKENS:
+                summary = tokens.encoding().decode(ids[:Config.CONVERSATION_SUMMARY_TOKENS])
+            with conversation.lock:
+                conversation.summary = summary
+                del conversation.pending[:len(batch)]
+                conversation.archived += len(batch)
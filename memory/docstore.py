@@ -0,0 +1,247 @@
+from langchain.schema import Document
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import sqlite3
+import threading
+from memory.answer_cache import AnswerCache
+from memory.lexical_index import LexicalIndex
+from memory.manifest import FileManifest
+from memory.metadata_index import MAX_PARAMS, MetadataIndex, matches
+from memory.shard_catalog import ShardCatalog
+from memory.summary_cache import SummaryCache
+
+
+class SQLiteDocstore:
+    """Chunk texts, metadata and the chunk ID <-> index position map.
+
+    Everything lives in one SQLite file and is read on demand: a search only
+    fetches the rows it returns, so opening the store costs the same at any
+    corpus size. The ``state`` table records the current snapshot, making a
+    snapshot switch and the position renumbering of a compaction one atomic
+    commit. The BM25 postings are written in the same transactions as the
+    chunks they index.
+    """
+
+    def __init__(self, path: str, indexed_keys: Iterable[str],
+                 lexical_keys: Iterable[str] = ()):
+        # One writer connection shared by every thread: all writes go
+        # through transaction(), or they would join (and roll back with)
+        # another thread's open transaction
+        self.conn = _Connections(path)
+        self._lock = threading.RLock()
+        with self.conn.writing():
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks "
+                "(id TEXT PRIMARY KEY, position INTEGER, text TEXT, metadata TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_position ON chunks (position)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS tombstones (position INTEGER PRIMARY KEY)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+            self.metadata_index = MetadataIndex(self.conn, indexed_keys)
+            self.manifest = FileManifest(self.conn, self.transaction)
+            self.summaries = SummaryCache(self.conn, self.transaction)
+            self.shards = ShardCatalog(self.conn)
+            self.lexical_index = LexicalIndex(self.conn, lexical_keys)
+            self.answer_cache = AnswerCache(self.conn, self.transaction)
+        if self.lexical_index.created:
+            self._backfill_lexical()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock, self.conn.writing():
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def insert(self, rows: List[Tuple[str, int, str, Dict]]):
+        """Store ``(id, position, text, metadata)`` rows."""
+        with self.transaction():
+            self._insert(rows)
+
+    def insert_missing(self, rows: List[Tuple[str, int, str, Dict]]):
+        """Store rows whose position is neither stored nor tombstoned.
+
+        Used when replaying the append log after a crash that may have hit
+        between the log write and the docstore commit.
+        """
+        if not rows:
+            return
+        positions = [row[1] for row in rows]
+        with self.transaction():
+            seen = set()
+            for table in ("chunks", "tombstones"):
+                seen.update(p for (p,) in self._select_in(
+                    f"SELECT position FROM {table} WHERE position IN ({{}})", positions))
+            self._insert([row for row in rows if row[1] not in seen])
+
+    def delete(self, ids: List[str]) -> List[int]:
+        """Delete chunks by ID and tombstone their positions."""
+        with self.transaction():
+            positions = [p for (p,) in self._select_in(
+                "SELECT position FROM chunks WHERE id IN ({})", ids)]
+            for start in range(0, len(ids), MAX_PARAMS):
+                batch = ids[start:start + MAX_PARAMS]
+                self.conn.execute(
+                    f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                )
+            self.metadata_index.remove(ids)
+            self.lexical_index.remove(positions)
+            self.answer_cache.invalidate(ids)
+            self.conn.executemany("INSERT OR IGNORE INTO tombstones (position) VALUES (?)",
+                                  [(p,) for p in positions])
+        return positions
+
+    def add_tombstones(self, positions: List[int]):
+        with self.transaction():
+            self.conn.executemany("INSERT OR IGNORE INTO tombstones (position) VALUES (?)",
+                                  [(p,) for p in positions])
+
+    def existing(self, ids: List[str]) -> set:
+        """Which of ``ids`` are stored."""
+        return {doc_id for (doc_id,) in self._select_in(
+            "SELECT id FROM chunks WHERE id IN ({})", ids)}
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        row = self.conn.execute(
+            "SELECT text, metadata FROM chunks WHERE id = ?", (doc_id,)
+        ).fetchone()
+        return _document(*row) if row else None
+
+    def by_positions(self, positions: List[int]) -> Dict[int, Document]:
+        return {position: _document(text, metadata)
+                for position, text, metadata in self._select_in(
+                    "SELECT position, text, metadata FROM chunks WHERE position IN ({})",
+                    [int(p) for p in positions])}
+
+    def match(self, filter_dict: Dict) -> Dict[str, int]:
+        """``{id: position}`` of chunks whose metadata satisfies the filter."""
+        candidates = self.metadata_index.lookup(filter_dict)
+        residual = {k: v for k, v in filter_dict.items()
+                    if k not in self.metadata_index.keys}
+        if candidates is None:
+            rows = self.conn.execute("SELECT id, position, metadata FROM chunks")
+        else:
+            rows = self._select_in(
+                "SELECT id, position, metadata FROM chunks WHERE id IN ({})", list(candidates))
+        return {doc_id: position for doc_id, position, metadata in rows
+                if not residual or matches(json.loads(metadata), residual)}
+
+    def live_positions(self) -> List[int]:
+        return [p for (p,) in self.conn.execute("SELECT position FROM chunks ORDER BY position")]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def tombstones(self) -> set:
+        return {p for (p,) in self.conn.execute("SELECT position FROM tombstones")}
+
+    def purge_tombstones(self):
+        """Shift positions down past the tombstones; call inside a transaction."""
+        self.lexical_index.purge(list(self.tombstones()))
+        self.conn.execute(
+            "UPDATE chunks SET position = position - "
+            "(SELECT COUNT(*) FROM tombstones t WHERE t.position < chunks.position)"
+        )
+        self.conn.execute("DELETE FROM tombstones")
+
+    def state(self) -> Dict:
+        return {key: json.loads(value)
+                for key, value in self.conn.execute("SELECT key, value FROM state")}
+
+    def set_state(self, state: Dict):
+        """Record snapshot state; call inside a transaction."""
+        self.conn.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                              [(key, json.dumps(value)) for key, value in state.items()])
+
+    def close(self):
+        self.conn.close()
+
+    def _insert(self, rows: List[Tuple[str, int, str, Dict]]):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO chunks (id, position, text, metadata) VALUES (?, ?, ?, ?)",
+            [(doc_id, position, text, json.dumps(metadata, default=str))
+             for doc_id, position, text, metadata in rows]
+        )
+        self.metadata_index.remove([row[0] for row in rows])
+        self.metadata_index.add((row[0], row[3]) for row in rows)
+        self.lexical_index.add((position, text, metadata)
+                               for _, position, text, metadata in rows)
+
+    def _backfill_lexical(self):
+        with self.transaction():
+            rows = self.conn.execute("SELECT position, text, metadata FROM chunks")
+            while True:
+                batch = rows.fetchmany(10000)
+                if not batch:
+                    return
+                self.lexical_index.add((position, text, json.loads(metadata))
+                                       for position, text, metadata in batch)
+
+    def _select_in(self, sql: str, values: List) -> Iterable[tuple]:
+        """Run ``sql`` with its ``IN ({})`` list filled in batches."""
+        for start in range(0, len(values), MAX_PARAMS):
+            batch = values[start:start + MAX_PARAMS]
+            yield from self.conn.execute(sql.format(",".join("?" * len(batch))), batch)
+
+
+class _Connections:
+    """The docstore's SQLite connection as the calling thread should see it.
+
+    Inside ``transaction()`` that is the one writer connection, so a thread
+    reads its own uncommitted rows. Any other read goes to a read-only
+    connection of the thread's own: with WAL it sees only committed rows,
+    never another thread's open transaction (which may yet roll back), and
+    it does not wait for that transaction to finish.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    @contextmanager
+    def writing(self):
+        """Send this thread's statements to the writer connection."""
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            self._local.depth -= 1
+
+    def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        return self._current().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters) -> sqlite3.Cursor:
+        return self._current().executemany(sql, parameters)
+
+    def close(self):
+        with self._readers_lock:
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+        self.writer.close()
+
+    def _current(self) -> sqlite3.Connection:
+        if getattr(self._local, "depth", 0):
+            return self.writer
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            reader = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            reader.execute("PRAGMA query_only=ON")
+            self._local.reader = reader
+            with self._readers_lock:
+                self._readers.append(reader)
+        return reader
+
+
+def _document(text: str, metadata: str) -> Document:
+    return Document(page_content=text, metadata=json.loads(metadata))
@@ -0,0 +1,237 @@
+from langchain.schema.embeddings import Embeddings
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import hashlib
+import os
+import pickle
+import struct
+import threading
+import unicodedata
+import zlib
+import numpy as np
+from utils.metrics import METRICS, timed
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed store of embedding vectors.
+
+    Vectors live in a memory-mapped float32 matrix (``vectors.f32``) with one
+    row per entry. ``keys.bin`` records which key owns each row, so a row
+    recycled by LRU eviction can never be served under a stale key.
+    ``index.pkl`` maps keys to rows in least-recently-used order as of the
+    last checkpoint; entries stored since are appended to ``index.log`` as
+    fixed-size ``<key><row><crc32 of the vector>`` records and replayed on
+    load. A checkpoint rewrites the index and empties the log every
+    ``CHECKPOINT_RECORDS`` records and on ``flush()``. Vectors of another
+    size than the stored ones (a new model or ``EMBEDDING_DIMENSIONS``)
+    start the cache afresh.
+    """
+
+    KEY_BYTES = 16
+    LOG_RECORD = struct.Struct(f"<{KEY_BYTES}sII")
+    CHECKPOINT_RECORDS = 10000
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rows: "OrderedDict[bytes, int]" = OrderedDict()
+        self._free: List[int] = []
+        self.dim: Optional[int] = None
+        self._vectors = None
+        self._keys = None
+        self._log = None
+        self._log_records = 0
+
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, "index.pkl")
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                state = pickle.load(f)
+            if state["max_entries"] == max_entries:
+                self._open(state["dim"], mode="r+")
+                self._rows = state["rows"]
+                self._replay_log()
+                used = set(self._rows.values())
+                self._free = [r for r in range(max_entries - 1, -1, -1) if r not in used]
+
+    @staticmethod
+    def key(namespace: str, text: str) -> bytes:
+        """Cache key for ``text`` embedded by the model named ``namespace``."""
+        normalized = unicodedata.normalize("NFC", text).strip()
+        digest = hashlib.sha256(f"{namespace}\0{normalized}".encode("utf-8"))
+        return digest.digest()[:EmbeddingCache.KEY_BYTES]
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[List[float]]]:
+        """Look up vectors, returning None for each miss."""
+        results = []
+        with self._lock:
+            for key in keys:
+                row = self._rows.get(key)
+                if row is not None and self._keys[row].tobytes() != key:
+                    # Row was recycled after the index was last persisted
+                    del self._rows[key]
+                    row = None
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    self._rows.move_to_end(key)
+                    results.append(self._vectors[row].tolist())
+        return results
+
+    def put_many(self, keys: List[bytes], vectors: List[List[float]]):
+        """Store vectors, evicting least-recently-used entries when full."""
+        if not keys:
+            return
+        with self._lock:
+            if self._vectors is None or self.dim != len(vectors[0]):
+                # New cache, or a new model or EMBEDDING_DIMENSIONS: entries
+                # of the old size sit under keys that can no longer hit
+                self._vectors = self._keys = None
+                self._open(len(vectors[0]), mode="w+")
+                self._rows.clear()
+                self._free = list(range(self.max_entries - 1, -1, -1))
+                self._checkpoint()
+            records = []
+            for key, vector in zip(keys, vectors):
+                row = self._rows.pop(key, None)
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        _, row = self._rows.popitem(last=False)
+                self._vectors[row] = vector
+                self._keys[row] = np.frombuffer(key, dtype=np.uint8)
+                self._rows[key] = row
+                records.append(self.LOG_RECORD.pack(key, row,
+                                                    zlib.crc32(self._vectors[row].tobytes())))
+            if self._log is None:
+                self._log = open(os.path.join(self.path, "index.log"), "ab")
+            self._log.write(b"".join(records))
+            self._log.flush()
+            self._log_records += len(records)
+            if self._log_records >= self.CHECKPOINT_RECORDS:
+                self._checkpoint()
+
+    def flush(self):
+        """Checkpoint the index now, e.g. before shutting down."""
+        with self._lock:
+            if self._vectors is not None and self._log_records:
+                self._checkpoint()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _open(self, dim: int, mode: str):
+        self.dim = dim
+        self._vectors = np.memmap(os.path.join(self.path, "vectors.f32"),
+                                  dtype=np.float32, mode=mode,
+                                  shape=(self.max_entries, dim))
+        self._keys = np.memmap(os.path.join(self.path, "keys.bin"),
+                               dtype=np.uint8, mode=mode,
+                               shape=(self.max_entries, self.KEY_BYTES))
+
+    def _checkpoint(self):
+        # Rows must be on disk before the index that points at them
+        self._vectors.flush()
+        self._keys.flush()
+        index_path = os.path.join(self.path, "index.pkl")
+        with open(index_path + ".tmp", "wb") as f:
+            pickle.dump({"dim": self.dim, "max_entries": self.max_entries,
+                         "rows": self._rows}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(index_path + ".tmp", index_path)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        open(os.path.join(self.path, "index.log"), "wb").close()
+        self._log_records = 0
+
+    def _replay_log(self):
+        """Re-apply entries stored after the checkpoint.
+
+        A record counts only if ``keys.bin`` still names its key and the
+        row's vector matches its checksum, so rows that never reached disk
+        (or were recycled later) are dropped; a torn last record is ignored.
+        """
+        log_path = os.path.join(self.path, "index.log")
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, "rb") as f:
+            data = f.read()
+        whole = len(data) - len(data) % self.LOG_RECORD.size
+        if not whole:
+            return
+        for key, row, crc in self.LOG_RECORD.iter_unpack(data[:whole]):
+            self._rows.pop(key, None)
+            if (row < self.max_entries and self._keys[row].tobytes() == key
+                    and zlib.crc32(self._vectors[row].tobytes()) == crc):
+                self._rows[key] = row
+        # Keys whose row a later record took over
+        stale = [key for key, row in self._rows.items() if self._keys[row].tobytes() != key]
+        for key in stale:
+            del self._rows[key]
+        self._log_records = whole // self.LOG_RECORD.size
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only calls the provider for unseen texts."""
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache,
+                 namespace: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.namespace = namespace
+
+    @timed("embedding")
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        fresh = self.underlying.embed_documents(list(missing.values())) if missing else []
+        return self._fill(keys, vectors, missing, fresh)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    @timed("embedding")
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        fresh = (await self.underlying.aembed_documents(list(missing.values()))
+                 if missing else [])
+        return self._fill(keys, vectors, missing, fresh)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def _lookup(self, texts: List[str]):
+        """Cache keys of ``texts``, their cached vectors (None for misses) and
+        ``{key: text}`` of the distinct texts to embed."""
+        keys = [EmbeddingCache.key(self.namespace, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once
+        missing: Dict[bytes, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        METRICS.inc("embedding_cache_hits", sum(v is not None for v in vectors))
+        METRICS.inc("embedding_cache_misses", len(missing))
+        return keys, vectors, missing
+
+    def _fill(self, keys: List[bytes], vectors: List[Optional[List[float]]],
+              missing: Dict[bytes, str], fresh: List[List[float]]) -> List[List[float]]:
+        """Cache the ``fresh`` vectors of ``missing`` and fill them in."""
+        if not missing:
+            return vectors
+        computed = dict(zip(missing.keys(), fresh))
+        self.cache.put_many(list(computed.keys()), fresh)
+        return [v if v is not None else computed[k] for k, v in zip(keys, vectors)]
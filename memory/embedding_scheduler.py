@@ -0,0 +1,214 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from langchain.schema.embeddings import Embeddings
+from config import Config
+from utils import tokens
+from utils.clients import embedding_model_id
+from utils.metrics import METRICS, cost, span
+
+EmbedBatch = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+# Statuses worth retrying: rate limits and transient server errors
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket refilled continuously at ``per_minute`` units a minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: float):
+        # Waiters queue on the lock, so a large request can't be starved
+        async with self.lock:
+            amount = min(amount, self.capacity)
+            while True:
+                now = time.monotonic()
+                self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+
+class EmbeddingScheduler(Embeddings):
+    """Embeds texts in token-bounded batches with several requests in flight.
+
+    Requests run on a private event loop thread, so the rate budgets and
+    the HTTP connection pool are shared by every caller. Requests-per-minute
+    and tokens-per-minute budgets are enforced client-side. A 429 or a
+    transient error pauses all workers for the server's ``retry-after`` (or
+    an exponential back-off with jitter) before the batch is retried.
+
+    ``embed_batch`` sends one batch and defaults to the OpenAI embeddings
+    endpoint; pass another coroutine function to use a different provider.
+    """
+
+    def __init__(self, embed_batch: Optional[EmbedBatch] = None,
+                 concurrency: int = Config.EMBEDDING_CONCURRENCY,
+                 requests_per_minute: int = Config.EMBEDDING_RPM,
+                 tokens_per_minute: int = Config.EMBEDDING_TPM,
+                 batch_tokens: int = Config.EMBEDDING_BATCH_TOKENS,
+                 batch_inputs: int = Config.EMBEDDING_BATCH_INPUTS,
+                 max_retries: int = Config.EMBEDDING_MAX_RETRIES):
+        self.embed_batch = embed_batch or self._openai_batch
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.batch_tokens = batch_tokens
+        self.batch_inputs = batch_inputs
+        self.max_retries = max_retries
+        self._loop = None
+        self._client = None
+        self._loop_lock = threading.Lock()
+        self._paused_until = 0.0
+        self._stats = {"requests": 0, "texts": 0, "tokens": 0, "retries": 0,
+                       "rate_limited": 0, "seconds": 0.0}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return asyncio.run_coroutine_threadsafe(self._embed(texts), self._event_loop()).result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._embed(texts), self._event_loop())
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict:
+        """Request counts and throughput since creation."""
+        stats = dict(self._stats)
+        seconds = max(stats["seconds"], 1e-9)
+        stats["texts_per_second"] = stats["texts"] / seconds
+        stats["tokens_per_second"] = stats["tokens"] / seconds
+        return stats
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        started = time.monotonic()
+        texts, counts = _truncate(texts)
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch: List[int]):
+            async with semaphore:
+                result = await self._send([texts[i] for i in batch],
+                                          sum(counts[i] for i in batch))
+            for i, vector in zip(batch, result):
+                vectors[i] = vector
+
+        await asyncio.gather(*(run(batch) for batch in
+                               token_batches(counts, self.batch_tokens, self.batch_inputs)))
+        self._stats["seconds"] += time.monotonic() - started
+        return vectors
+
+    async def _send(self, texts: List[str], n_tokens: int) -> List[List[float]]:
+        """Send one batch within the rate budgets, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            while time.monotonic() < self._paused_until:
+                await asyncio.sleep(self._paused_until - time.monotonic())
+            await self._requests.acquire(1)
+            await self._tokens.acquire(n_tokens)
+            try:
+                with span("embedding.request"):
+                    vectors = await self.embed_batch(texts)
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                self._stats["retries"] += 1
+                if getattr(e, "status_code", None) == 429:
+                    self._stats["rate_limited"] += 1
+                # Every worker backs off, not just the one that was refused
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                continue
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(texts)
+            self._stats["tokens"] += n_tokens
+            model = embedding_model_id()
+            METRICS.inc("tokens", n_tokens, kind="embedding", model=model)
+            METRICS.inc("cost_usd", cost(model, n_tokens), model=model)
+            return vectors
+
+    async def _openai_batch(self, texts: List[str]) -> List[List[float]]:
+        if self._client is None:
+            from utils.clients import async_openai_client
+            self._client = async_openai_client()
+        kwargs = {"dimensions": Config.EMBEDDING_DIMENSIONS} if Config.EMBEDDING_DIMENSIONS else {}
+        response = await self._client.embeddings.create(
+            input=texts, model=Config.EMBEDDING_MODEL, **kwargs
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="embedding-scheduler",
+                                 daemon=True).start()
+                # Limiters hold an asyncio.Lock, so build them for this loop
+                self._requests = RateLimiter(self.requests_per_minute)
+                self._tokens = RateLimiter(self.tokens_per_minute)
+                self._loop = loop
+            return self._loop
+
+
+def token_batches(counts: List[int], max_tokens: int, max_inputs: int) -> List[List[int]]:
+    """Group consecutive text indexes into batches within both limits."""
+    batches, batch, batch_tokens = [], [], 0
+    for i, count in enumerate(counts):
+        if batch and (batch_tokens + count > max_tokens or len(batch) >= max_inputs):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += count
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _truncate(texts: List[str]):
+    """Clip texts to the model's input limit; returns texts and token counts."""
+    clipped, counts = [], []
+    for text, ids in zip(texts, tokens.encode_batch(texts)):
+        if len(ids) > Config.EMBEDDING_MAX_INPUT_TOKENS:
+            ids = ids[:Config.EMBEDDING_MAX_INPUT_TOKENS]
+            text = tokens.encoding().decode(ids)
+        clipped.append(text)
+        counts.append(len(ids))
+    return clipped, counts
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying ``error``, or None if it is permanent."""
+    import httpx
+    import openai
+
+    status = getattr(error, "status_code", None)
+    if status is None:
+        if not isinstance(error, (openai.APIConnectionError, httpx.TransportError,
+                                  ConnectionError, asyncio.TimeoutError)):
+            return None
+    elif status not in RETRY_STATUSES:
+        return None
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return float(response.headers["retry-after"])
+        except (KeyError, ValueError):
+            pass
+    backoff = min(Config.EMBEDDING_BACKOFF_MAX, Config.EMBEDDING_BACKOFF_BASE * 2 ** attempt)
+    return backoff * random.uniform(0.5, 1.0)
@@ -0,0 +1,128 @@
+import math
+import re
+from typing import Optional
+import faiss
+from config import Config
+from memory.raw_vectors import RawVectors
+
+# Scalar-quantizer codes per encoding; SQ8 trains a min/max per dimension
+ENCODINGS = {"float32": None, "float16": "SQfp16", "int8": "SQ8"}
+
+
+def resolve_spec(index_type: str, n: int, dim: int,
+                 train_threshold: Optional[int] = None,
+                 encoding: Optional[str] = None) -> str:
+    """FAISS factory string for ``index_type`` at a corpus of ``n`` vectors.
+
+    ``index_type`` is ``"auto"``, ``"Flat"``, ``"IVF{nlist}"``,
+    ``"HNSW{M}"``, ``"IVFPQ"`` or any raw ``faiss.index_factory`` string.
+    ``encoding`` (default ``Config.VECTOR_ENCODING``) swaps float32 vector
+    storage for ``"float16"`` or per-dimension scaled ``"int8"`` codes.
+    Types that need training stay untrained (Flat, or float16 codes when
+    compressing) until the corpus reaches ``train_threshold`` (default
+    ``Config.INDEX_TRAIN_THRESHOLD``).
+    """
+    if train_threshold is None:
+        train_threshold = Config.INDEX_TRAIN_THRESHOLD
+    encoding = encoding or Config.VECTOR_ENCODING
+    if index_type == "auto":
+        index_type = "IVF" if n >= train_threshold else "Flat"
+    if re.fullmatch(r"IVF\d*", index_type):
+        spec = f"IVF{index_type[3:] or _nlist(n)},Flat"
+    elif index_type == "IVFPQ":
+        spec = f"IVF{_nlist(n)},PQ{_pq_subquantizers(dim)}"
+    else:
+        spec = index_type
+    encoded = _encode(spec, encoding)
+    if n < train_threshold and needs_training(encoded, dim):
+        if needs_training(spec, dim):
+            spec = "Flat"
+        return _encode(spec, "float32" if encoding == "float32" else "float16")
+    return encoded
+
+
+def needs_training(spec: str, dim: int) -> bool:
+    return not faiss.index_factory(dim, spec).is_trained
+
+
+def is_lossy(spec: str) -> bool:
+    """Whether the index stores approximate codes rather than float32 vectors."""
+    return "SQ" in spec or "PQ" in spec
+
+
+def build_index(spec: str, vectors: RawVectors) -> faiss.Index:
+    """Create an empty index, training it on a sample of ``vectors`` if needed."""
+    index = faiss.index_factory(vectors.dim, spec)
+    if not index.is_trained:
+        index.train(vectors.sample(Config.INDEX_TRAIN_SAMPLE))
+    apply_search_params(index)
+    return index
+
+
+def empty_like(index: faiss.Index) -> faiss.Index:
+    """An empty index with the same type and training as ``index``."""
+    if isinstance(faiss.downcast_index(index), faiss.IndexFlat):
+        return faiss.IndexFlat(index.d, index.metric_type)
+    # Trained state (centroids, codebooks) is kept; stored codes are dropped
+    empty = faiss.clone_index(index)
+    empty.reset()
+    apply_search_params(empty)
+    return empty
+
+
+def apply_search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None):
+    """Set query-time knobs on whichever of them the index supports."""
+    params = faiss.ParameterSpace()
+    if _ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe or Config.IVF_NPROBE)
+    if _hnsw(index) is not None:
+        params.set_index_parameter(index, "efSearch", ef_search or Config.HNSW_EF_SEARCH)
+
+
+def search_parameters(index: faiss.Index, selector) -> faiss.SearchParameters:
+    """Per-query parameters restricting ``index`` to ``selector``."""
+    ivf = _ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = _hnsw(index)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def _encode(spec: str, encoding: str) -> str:
+    """Replace float32 storage in ``spec`` with the scalar-quantized ``encoding``."""
+    code = ENCODINGS[encoding]
+    if code is None:
+        return spec
+    if spec == "Flat":
+        return code
+    if spec.endswith(",Flat"):
+        return spec[:-len("Flat")] + code
+    if re.fullmatch(r"HNSW\d+", spec):
+        return f"{spec}_{code}"
+    # PQ and hand-written factory strings already choose their storage
+    return spec
+
+
+def _nlist(n: int) -> int:
+    """Number of IVF lists: about 4*sqrt(n), rounded to a power of two."""
+    return 2 ** max(4, round(math.log2(4 * math.sqrt(max(n, 1)))))
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Largest divisor of ``dim`` up to 64, so each code is at most 64 bytes."""
+    return max(m for m in range(1, min(dim, 64) + 1) if dim % m == 0)
+
+
+def _ivf(index: faiss.Index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def _hnsw(index: faiss.Index):
+    index = faiss.downcast_index(index)
+    return getattr(index, "hnsw", None)
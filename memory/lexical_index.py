@@ -0,0 +1,205 @@
+import itertools
+import re
+import sqlite3
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from memory.metadata_index import MAX_PARAMS
+
+# Word characters only, so identifiers like ERR_CONN_42 stay one term
+TERM = re.compile(r"\w+")
+
+
+def terms(text: str) -> List[str]:
+    return TERM.findall(text.lower())
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk texts, kept next to the vector index.
+
+    Postings live in the ``postings`` table of the docstore's SQLite
+    database, one row per term and insert batch. A row holds the positions
+    (delta-encoded), term frequencies and chunk lengths of that batch as
+    byte-shuffled, zlib-compressed uint32 columns. Adding chunks only
+    appends rows, in the same transaction as the chunks themselves. Deleted
+    positions stay in the postings until the next purge rewrites them.
+    ``lexical_docs`` holds each indexed position's length for the corpus
+    statistics.
+
+    Values of ``keys`` in a chunk's metadata (e.g. its filename) are
+    indexed along with its text.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, conn: sqlite3.Connection, keys: Iterable[str]):
+        self.conn = conn
+        self.keys = list(keys)
+        # Stores written before lexical search existed need a backfill
+        self.created = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'postings'"
+        ).fetchone() is None
+        conn.execute(_POSTINGS_TABLE.format("postings"))
+        conn.execute("CREATE TABLE IF NOT EXISTS lexical_docs (position INTEGER, length INTEGER)")
+        conn.execute("CREATE INDEX IF NOT EXISTS lexical_docs_position ON lexical_docs (position)")
+        self._corpus: Optional[Tuple[int, int]] = None
+
+    def add(self, rows: Iterable[Tuple[int, str, Dict]]):
+        """Index ``(position, text, metadata)`` rows; call inside a transaction.
+
+        Positions already indexed are skipped, so replaying an insert is harmless.
+        """
+        rows = sorted(rows, key=lambda row: row[0])
+        indexed = set()
+        for start in range(0, len(rows), MAX_PARAMS):
+            batch = [row[0] for row in rows[start:start + MAX_PARAMS]]
+            indexed.update(p for (p,) in self.conn.execute(
+                f"SELECT position FROM lexical_docs WHERE position IN "
+                f"({','.join('?' * len(batch))})", batch))
+        docs = []
+        postings: Dict[str, List[Tuple[int, int, int]]] = defaultdict(list)
+        for position, text, metadata in rows:
+            if position in indexed:
+                continue
+            indexed.add(position)
+            fields = [str(metadata[key]) for key in self.keys if key in metadata]
+            counts = Counter(terms(" ".join([text, *fields])))
+            length = sum(counts.values())
+            docs.append((position, length))
+            for term, tf in counts.items():
+                postings[term].append((position, tf, length))
+        if not docs:
+            return
+        self.conn.executemany("INSERT INTO lexical_docs (position, length) VALUES (?, ?)", docs)
+        self.conn.executemany(
+            "INSERT INTO postings (term, first, data) VALUES (?, ?, ?)",
+            [(term, entries[0][0], _encode(np.array(entries, dtype=np.int64).T))
+             for term, entries in postings.items()]
+        )
+        if self._corpus is not None:
+            count, total = self._corpus
+            self._corpus = (count + len(docs), total + sum(length for _, length in docs))
+
+    def remove(self, positions: List[int]):
+        """Drop positions from the corpus statistics; call inside a transaction."""
+        removed, removed_length = 0, 0
+        for start in range(0, len(positions), MAX_PARAMS):
+            batch = positions[start:start + MAX_PARAMS]
+            marks = ",".join("?" * len(batch))
+            count, total = self.conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM lexical_docs "
+                f"WHERE position IN ({marks})", batch).fetchone()
+            self.conn.execute(f"DELETE FROM lexical_docs WHERE position IN ({marks})", batch)
+            removed += count
+            removed_length += total
+        if self._corpus is not None:
+            self._corpus = (self._corpus[0] - removed, self._corpus[1] - removed_length)
+
+    def search(self, query: str, k: int, candidates: Optional[np.ndarray] = None,
+               exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 top-k ``(scores, positions)``, best first.
+
+        ``candidates`` restricts the result to those positions and
+        ``exclude`` drops positions (tombstones) still in the postings.
+        """
+        count, total = self.corpus()
+        scores, positions = [], []
+        for term in set(terms(query)):
+            found, tf, length = self._postings(term)
+            if not len(found) or not count:
+                continue
+            df = min(len(found), count)
+            idf = np.log(1 + (count - df + 0.5) / (df + 0.5))
+            if candidates is not None:
+                keep = np.isin(found, candidates)
+                found, tf, length = found[keep], tf[keep], length[keep]
+            norm = self.K1 * (1 - self.B + self.B * length / (total / count))
+            scores.append(idf * tf * (self.K1 + 1) / (tf + norm))
+            positions.append(found)
+        if not positions:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        positions, inverse = np.unique(np.concatenate(positions), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(scores))
+        if exclude is not None and len(exclude):
+            live = ~np.isin(positions, exclude)
+            scores, positions = scores[live], positions[live]
+        order = np.argsort(-scores, kind="stable")[:k]
+        return scores[order].astype(np.float32), positions[order]
+
+    def corpus(self) -> Tuple[int, int]:
+        """Indexed chunk count and total length, in terms."""
+        if self._corpus is None:
+            self._corpus = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM lexical_docs"
+            ).fetchone()
+        return self._corpus
+
+    def merge(self, max_rows: int):
+        """Rewrite terms spread over more than ``max_rows`` rows as one row each.
+
+        Call inside a transaction.
+        """
+        fragmented = [term for (term,) in self.conn.execute(
+            "SELECT term FROM postings GROUP BY term HAVING COUNT(*) > ?", (max_rows,))]
+        for term in fragmented:
+            columns = self._postings(term)
+            self.conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+            self.conn.execute("INSERT INTO postings (term, first, data) VALUES (?, ?, ?)",
+                              (term, int(columns[0][0]), _encode(np.stack(columns))))
+
+    def purge(self, dead: List[int]):
+        """Drop the ``dead`` positions and shift the rest down past them.
+
+        Mirrors the docstore's tombstone purge and leaves one row per term;
+        call inside a transaction, before the tombstones are cleared.
+        """
+        dead = np.array(sorted(dead), dtype=np.int64)
+        self.conn.execute("DROP TABLE IF EXISTS postings_new")
+        self.conn.execute(_POSTINGS_TABLE.format("postings_new"))
+        rows = self.conn.execute("SELECT term, data FROM postings ORDER BY term, first")
+        for term, blocks in itertools.groupby(rows, key=lambda row: row[0]):
+            found, tf, length = np.concatenate([_decode(data) for _, data in blocks], axis=1)
+            keep = ~np.isin(found, dead)
+            if not keep.any():
+                continue
+            found = found[keep] - np.searchsorted(dead, found[keep])
+            self.conn.execute("INSERT INTO postings_new (term, first, data) VALUES (?, ?, ?)",
+                              (term, int(found[0]),
+                               _encode(np.stack([found, tf[keep], length[keep]]))))
+        self.conn.execute("DROP TABLE postings")
+        self.conn.execute("ALTER TABLE postings_new RENAME TO postings")
+        self.conn.execute(
+            "UPDATE lexical_docs SET position = position - "
+            "(SELECT COUNT(*) FROM tombstones t WHERE t.position < lexical_docs.position)"
+        )
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Positions, term frequencies and lengths of every chunk containing ``term``."""
+        blocks = [_decode(data) for (data,) in self.conn.execute(
+            "SELECT data FROM postings WHERE term = ? ORDER BY first", (term,))]
+        if not blocks:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        return tuple(np.concatenate(blocks, axis=1))
+
+
+_POSTINGS_TABLE = ("CREATE TABLE IF NOT EXISTS {} "
+                   "(term TEXT, first INTEGER, data BLOB, PRIMARY KEY (term, first))")
+
+
+def _encode(columns: np.ndarray) -> bytes:
+    """Compress ``[positions, tfs, lengths]`` (positions ascending)."""
+    columns = columns.astype(np.int64)
+    columns[0] = np.diff(columns[0], prepend=0)
+    # Byte-shuffle the uint32 values: small deltas leave long zero runs
+    shuffled = np.ascontiguousarray(columns, dtype="<u4").view(np.uint8).reshape(-1, 4).T
+    return zlib.compress(shuffled.tobytes())
+
+
+def _decode(data: bytes) -> np.ndarray:
+    shuffled = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(4, -1)
+    columns = np.ascontiguousarray(shuffled.T).view("<u4").reshape(3, -1).astype(np.int64)
+    columns[0] = np.cumsum(columns[0])
+    return columns
@@ -0,0 +1,56 @@
+import json
+import os
+import sqlite3
+from typing import Callable, ContextManager, Dict, List, Tuple
+from memory.metadata_index import MAX_PARAMS
+
+
+class FileManifest:
+    """What folder sync has ingested: size, mtime, content hash and chunk IDs per file.
+
+    Rows live in the ``files`` table of the docstore's SQLite database,
+    keyed by absolute path, and are written in the docstore's transactions.
+    """
+
+    def __init__(self, conn: sqlite3.Connection,
+                 transaction: Callable[[], ContextManager]):
+        self.conn = conn
+        self.transaction = transaction
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS files "
+            "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT, chunk_ids TEXT)"
+        )
+
+    def under(self, root: str) -> Dict[str, Dict]:
+        """Entries for every file below the directory ``root``."""
+        prefix = os.path.join(root, "")
+        # Range scan on the primary key: paths starting with prefix sort below prefix + max
+        rows = self.conn.execute(
+            "SELECT path, size, mtime_ns, hash, chunk_ids FROM files WHERE path >= ? AND path < ?",
+            (prefix, prefix + "\U0010ffff")
+        )
+        return {path: {"size": size, "mtime_ns": mtime_ns, "hash": digest,
+                       "chunk_ids": json.loads(chunk_ids)}
+                for path, size, mtime_ns, digest, chunk_ids in rows}
+
+    def put(self, rows: List[Tuple[str, int, int, str, List[str]]]):
+        """Record ``(path, size, mtime_ns, hash, chunk_ids)`` rows."""
+        if not rows:
+            return
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, chunk_ids) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(path, size, mtime_ns, digest, json.dumps(chunk_ids))
+                 for path, size, mtime_ns, digest, chunk_ids in rows]
+            )
+
+    def remove(self, paths: List[str]):
+        if not paths:
+            return
+        with self.transaction():
+            for start in range(0, len(paths), MAX_PARAMS):
+                batch = paths[start:start + MAX_PARAMS]
+                self.conn.execute(
+                    f"DELETE FROM files WHERE path IN ({','.join('?' * len(batch))})", batch
+                )
@@ -0,0 +1,111 @@
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+RANGE_OPERATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+# SQLite parameters per statement, below SQLITE_MAX_VARIABLE_NUMBER on old builds
+MAX_PARAMS = 900
+
+
+class MetadataIndex:
+    """Inverted index from metadata values to chunk IDs.
+
+    Rows ``(key, value, id)`` live in the ``meta`` table of the docstore's
+    SQLite database, indexed on ``(key, value)``, so lookups on the
+    configured keys cost O(matches) without loading anything up front.
+    Filters map a key to a value (equality), ``{"$in": [...]}`` or a range
+    such as ``{"$gte": 3, "$lt": 10}``.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, keys: Iterable[str]):
+        self.conn = conn
+        self.keys = set(keys)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT, value, id TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS meta_key_value ON meta (key, value)")
+        conn.execute("CREATE INDEX IF NOT EXISTS meta_id ON meta (id)")
+
+    def add(self, rows: Iterable[Tuple[str, Dict]]):
+        """Index ``(doc_id, metadata)`` pairs; call inside a transaction."""
+        self.conn.executemany(
+            "INSERT INTO meta (key, value, id) VALUES (?, ?, ?)",
+            [(key, metadata[key], doc_id)
+             for doc_id, metadata in rows
+             for key in self.keys.intersection(metadata)
+             if _scalar(metadata[key])]
+        )
+
+    def remove(self, ids: List[str]):
+        for start in range(0, len(ids), MAX_PARAMS):
+            batch = ids[start:start + MAX_PARAMS]
+            self.conn.execute(
+                f"DELETE FROM meta WHERE id IN ({','.join('?' * len(batch))})", batch
+            )
+
+    def lookup(self, filter_dict: Dict) -> Optional[Set[str]]:
+        """IDs matching every indexed key of ``filter_dict``.
+
+        Returns None when no key of the filter is indexed, meaning the caller
+        has to scan; unindexed keys are left for the caller to check.
+        """
+        clauses, params = [], []
+        for key in sorted(self.keys.intersection(filter_dict)):
+            clause, values = _clause(filter_dict[key])
+            clauses.append(f"SELECT id FROM meta WHERE key = ? AND {clause}")
+            params.extend([key, *values])
+        if not clauses:
+            return None
+        return {row[0] for row in self.conn.execute(" INTERSECT ".join(clauses), params)}
+
+
+def _clause(condition) -> Tuple[str, List]:
+    """SQL predicate on ``meta.value`` for one filter condition."""
+    if not isinstance(condition, dict):
+        return "value = ?", [condition]
+    parts, params = [], []
+    if "$in" in condition:
+        values = list(condition["$in"])
+        parts.append(f"value IN ({','.join('?' * len(values))})")
+        params.extend(values)
+    bounds = {op: condition[op] for op in RANGE_OPERATORS if op in condition}
+    if bounds:
+        # SQLite orders numbers before text; keep ranges within one kind
+        kind = _kind(next(iter(bounds.values())))
+        parts.append("typeof(value) IN ('integer', 'real')" if kind == "number"
+                     else "typeof(value) = 'text'")
+        for op, bound in bounds.items():
+            parts.append(f"value {RANGE_OPERATORS[op]} ?")
+            params.append(bound)
+    return " AND ".join(parts) or "1", params
+
+
+def matches(metadata: Dict, filter_dict: Dict) -> bool:
+    """Check one chunk's metadata against a filter, without an index."""
+    for key, condition in filter_dict.items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        if "$in" in condition and value not in condition["$in"]:
+            return False
+        for op in RANGE_OPERATORS.keys() & condition.keys():
+            bound = condition[op]
+            if value is None or _kind(value) != _kind(bound):
+                return False
+            if ((op == "$gt" and not value > bound)
+                    or (op == "$gte" and not value >= bound)
+                    or (op == "$lt" and not value < bound)
+                    or (op == "$lte" and not value <= bound)):
+                return False
+    return True
+
+
+def _kind(value) -> str:
+    """Ordering class of a value; ranges only compare values of one kind."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "number"
+    return type(value).__name__
+
+
+def _scalar(value) -> bool:
+    return isinstance(value, (str, int, float))
@@ -0,0 +1,42 @@
+"""Rebuild the persisted vector store into another ANN index type.
+
+Vectors are read back from the store itself, so nothing is re-embedded:
+
+    python -m memory.migrate --index-type HNSW32
+
+Set AURORA_INDEX_TYPE to the same value so later growth keeps that type.
+With AURORA_SHARD_KEY set, every shard is rebuilt.
+"""
+import argparse
+from config import Config
+from memory.sharded_store import ShardedMemory
+from memory.vector_store import VectorMemory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--index-type",
+        required=True,
+        help='"Flat", "IVF{nlist}", "HNSW{M}", "IVFPQ", "auto" or a faiss factory string'
+    )
+    args = parser.parse_args()
+
+    if Config.SHARD_KEY:
+        memory = ShardedMemory()
+        memory.rebuild_index(args.index_type)
+        stats = memory.get_collection_stats()
+        print(f"Rebuilt {stats['count']} chunks in {len(stats['shards'])} shards "
+              f"as {args.index_type}")
+        memory.close()
+        return
+
+    memory = VectorMemory()
+    before = memory.index_spec
+    memory.rebuild_index(args.index_type)
+    print(f"Rebuilt {memory.get_collection_stats()['count']} chunks: "
+          f"{before} -> {memory.index_spec}")
+
+
+if __name__ == "__main__":
+    main()
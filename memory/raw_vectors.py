@@ -0,0 +1,143 @@
+import os
+from typing import Iterator, List, Optional, Tuple
+import faiss
+import numpy as np
+
+
+class RawVectors:
+    """Full-precision copy of every indexed vector, addressed by index position.
+
+    Rows committed by a snapshot are memory-mapped from a raw float32 file;
+    rows added since then stay in memory until the next snapshot appends
+    them. Approximate indexes are trained and rebuilt from these rows, so
+    changing index type never needs a re-embedding pass.
+    """
+
+    BATCH_ROWS = 65536
+
+    def __init__(self, dim: int, path: Optional[str] = None, rows: int = 0):
+        self.dim = dim
+        self.path = path
+        self._base = self._map(path, rows)
+        self._tail: List[np.ndarray] = []
+        self._tail_rows = 0
+
+    def __len__(self) -> int:
+        return len(self._base) + self._tail_rows
+
+    def append(self, vectors: np.ndarray):
+        self._tail.append(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        self._tail_rows += len(self._tail[-1])
+
+    def take(self, positions: np.ndarray) -> np.ndarray:
+        """Rows at ``positions``, in the given order."""
+        positions = np.asarray(positions, dtype=np.int64)
+        out = np.empty((len(positions), self.dim), dtype=np.float32)
+        in_base = positions < len(self._base)
+        out[in_base] = self._base[positions[in_base]]
+        if not in_base.all():
+            tail = self._consolidate_tail()
+            out[~in_base] = tail[positions[~in_base] - len(self._base)]
+        return out
+
+    @property
+    def persisted_rows(self) -> int:
+        """Rows already durable in the vector file."""
+        return len(self._base)
+
+    def search(self, query: np.ndarray, k: int, positions: Optional[np.ndarray] = None,
+               exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact L2 top-k over every row, or only over ``positions``.
+
+        A scan of every row skips the sorted positions ``exclude``. Returns
+        ``(distances, positions)`` for the single query row.
+        """
+        if positions is None:
+            blocks = [(np.arange(len(self._base)), self._base),
+                      (np.arange(len(self._base), len(self)), self._consolidate_tail())]
+        else:
+            positions = np.asarray(positions, dtype=np.int64)
+            blocks = [(positions[start:start + self.BATCH_ROWS], None)
+                      for start in range(0, len(positions), self.BATCH_ROWS)]
+        best_d = np.empty(0, dtype=np.float32)
+        best_p = np.empty(0, dtype=np.int64)
+        for block_positions, rows in blocks:
+            if len(block_positions) == 0:
+                continue
+            if rows is None:
+                rows = self.take(block_positions)
+            skip = None
+            if positions is None and exclude is not None and len(exclude):
+                # Full blocks hold consecutive positions
+                first = block_positions[0]
+                bounds = np.searchsorted(exclude, [first, first + len(rows)])
+                skip = exclude[bounds[0]:bounds[1]] - first
+            if skip is None or len(skip) == 0:
+                d, i = faiss.knn(query, rows, min(k, len(rows)))
+                d, i = d[0], i[0]
+            else:
+                d = faiss.pairwise_distances(query, rows)[0]
+                d[skip] = np.inf
+                n = min(k, len(rows) - len(skip))
+                i = np.argpartition(d, n - 1)[:n] if 0 < n < len(d) else np.arange(n)
+                d = d[i]
+            best_d = np.concatenate([best_d, d])
+            best_p = np.concatenate([best_p, block_positions[i]])
+            order = np.argsort(best_d)[:k]
+            best_d, best_p = best_d[order], best_p[order]
+        return best_d, best_p
+
+    def batches(self, keep: Optional[np.ndarray] = None) -> Iterator[np.ndarray]:
+        """Stream rows (optionally only positions ``keep``) in bounded batches."""
+        if keep is None:
+            keep = np.arange(len(self), dtype=np.int64)
+        for start in range(0, len(keep), self.BATCH_ROWS):
+            yield self.take(keep[start:start + self.BATCH_ROWS])
+
+    def sample(self, n: int, seed: int = 0) -> np.ndarray:
+        """Up to ``n`` distinct rows chosen uniformly, e.g. for index training."""
+        if n >= len(self):
+            return self.take(np.arange(len(self)))
+        rng = np.random.default_rng(seed)
+        return self.take(np.sort(rng.choice(len(self), size=n, replace=False)))
+
+    def persist(self, path: str, keep: Optional[np.ndarray] = None) -> int:
+        """Make every row (or only ``keep``) durable in ``path``; returns the row count.
+
+        Persisting to the current file only appends the in-memory rows, so
+        the prefix referenced by older snapshots stays valid.
+        """
+        if path == self.path and keep is None:
+            rows = len(self)
+            if self._tail_rows:
+                with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                    f.seek(len(self._base) * self.dim * 4)
+                    f.write(self._consolidate_tail().tobytes())
+                    f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+        else:
+            rows = len(self) if keep is None else len(keep)
+            with open(path, "wb") as f:
+                for batch in self.batches(keep):
+                    f.write(batch.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.path = path
+        self._base = self._map(path, rows)
+        self._tail = []
+        self._tail_rows = 0
+        return rows
+
+    def nbytes_in_memory(self) -> int:
+        return sum(chunk.nbytes for chunk in self._tail)
+
+    def _consolidate_tail(self) -> np.ndarray:
+        if len(self._tail) > 1:
+            self._tail = [np.concatenate(self._tail)]
+        return self._tail[0] if self._tail else np.empty((0, self.dim), dtype=np.float32)
+
+    def _map(self, path: Optional[str], rows: int) -> np.ndarray:
+        if not path or rows == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(path, dtype=np.float32, mode="r", shape=(rows, self.dim))
@@ -0,0 +1,56 @@
+import json
+import sqlite3
+from typing import Dict, List, Tuple
+from memory.metadata_index import MAX_PARAMS
+
+
+class ShardCatalog:
+    """Shards of a sharded memory and the shard holding each chunk.
+
+    Rows live in the ``shards`` (name and partition value) and
+    ``shard_chunks`` (chunk ID and shard name) tables of the root
+    docstore's SQLite database, so a lookup or delete by chunk ID goes
+    straight to one shard and a shard's size is known without opening it.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        conn.execute("CREATE TABLE IF NOT EXISTS shards (name TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS shard_chunks (id TEXT PRIMARY KEY, shard TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS shard_chunks_shard ON shard_chunks (shard)")
+
+    def shards(self) -> Dict[str, object]:
+        """``{name: partition value}`` of every shard."""
+        return {name: json.loads(value)
+                for name, value in self.conn.execute("SELECT name, value FROM shards")}
+
+    def add_shard(self, name: str, value):
+        """Register a shard and its key value; call inside a transaction."""
+        self.conn.execute("INSERT OR IGNORE INTO shards (name, value) VALUES (?, ?)",
+                          (name, json.dumps(value)))
+
+    def locate(self, ids: List[str]) -> Dict[str, str]:
+        """``{id: shard}`` of the chunk IDs the catalog knows."""
+        found = {}
+        for start in range(0, len(ids), MAX_PARAMS):
+            batch = ids[start:start + MAX_PARAMS]
+            found.update(self.conn.execute(
+                f"SELECT id, shard FROM shard_chunks WHERE id IN ({','.join('?' * len(batch))})",
+                batch))
+        return found
+
+    def assign(self, rows: List[Tuple[str, str]]):
+        """Record ``(id, shard)`` rows; call inside a transaction."""
+        self.conn.executemany("INSERT OR REPLACE INTO shard_chunks (id, shard) VALUES (?, ?)",
+                              rows)
+
+    def remove(self, ids: List[str]):
+        for start in range(0, len(ids), MAX_PARAMS):
+            batch = ids[start:start + MAX_PARAMS]
+            self.conn.execute(
+                f"DELETE FROM shard_chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+            )
+
+    def count(self, shard: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM shard_chunks WHERE shard = ?",
+                                 (shard,)).fetchone()[0]
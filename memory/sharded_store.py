@@ -0,0 +1,550 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from langchain.schema import Document
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from config import Config
+from memory.docstore import SQLiteDocstore
+from memory.metadata_index import matches
+from memory.vector_store import (VectorMemory, _PendingWrite, _fuse, _mmr, _search_mode,
+                                 _unit, chunk_id)
+from utils.locks import ReadWriteLock
+from utils.metrics import span, timed
+
+# Per shard: {chunk ID: document} to store there
+Groups = Dict[str, Dict[str, Document]]
+
+
+class ShardedMemory:
+    """Long-term memory partitioned into independent stores by one metadata key.
+
+    Every value of ``Config.SHARD_KEY`` (say ``type``) gets its own
+    ``VectorMemory`` under ``shards/``, with its own index, snapshot and
+    append log: a write only touches the shard it lands in, and a
+    compaction only rewrites that shard. With ``Config.SHARD_TIME_FORMAT``,
+    chunks without the key are stamped with the current time bucket, giving
+    e.g. one shard per month.
+
+    Searches embed the query once and fan out to the shards on a thread
+    pool (FAISS and NumPy release the GIL), then merge the per-shard top-k
+    rankings: by distance for dense search, by BM25 score for lexical
+    search (BM25 statistics are per shard, so this ordering is approximate)
+    and by reciprocal-rank fusion of both merged rankings for hybrid. Only
+    the final top k texts are fetched. A filter on the shard key only
+    searches the shards whose value passes it.
+
+    Shards open on first use. While more than ``Config.SHARD_MAX_LOADED``
+    are open, a background thread compacts and closes the least recently
+    used of those left unused for ``Config.SHARD_IDLE_SECONDS``; they
+    reopen from disk when needed. Shards a search keeps using stay open,
+    so a fan-out over many shards never reopens them. The root docstore holds the shard catalog, the file manifest,
+    summaries and cached answers. A single store found at the path is split
+    into shards on first open, without re-embedding; going back to one
+    store means re-ingesting.
+
+    Same interface as ``VectorMemory``.
+    """
+
+    SHARDS = "shards"
+
+    # One embedding cache and scheduler, built lazily and shared by every shard
+    embedding_cache = VectorMemory.embedding_cache
+    embedding_scheduler = VectorMemory.embedding_scheduler
+    embeddings = VectorMemory.embeddings
+
+    def __init__(self, path: Optional[str] = None, key: Optional[str] = None,
+                 embeddings=None):
+        """Open the sharded store at ``path`` (default ``Config.CHROMA_DB_PATH``),
+        partitioned by ``key`` (default ``Config.SHARD_KEY``)."""
+        self.path = path or Config.CHROMA_DB_PATH
+        self.key = key or Config.SHARD_KEY
+        if not self.key:
+            raise ValueError("ShardedMemory needs a metadata key; set AURORA_SHARD_KEY")
+        if embeddings is not None:
+            self.embeddings = embeddings
+        os.makedirs(os.path.join(self.path, self.SHARDS), exist_ok=True)
+        self.docstore = SQLiteDocstore(os.path.join(self.path, VectorMemory.DOCSTORE),
+                                       Config.INDEXED_METADATA_KEYS,
+                                       Config.LEXICAL_METADATA_KEYS)
+        self._values = self.docstore.shards.shards()
+        self._loaded: "OrderedDict[str, VectorMemory]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        # Read side while shards are in use, write side to unload them
+        self._lock = ReadWriteLock()
+        self._open_lock = threading.Lock()
+        self._search_params: Optional[Tuple] = None
+        self._executor = None
+        if Config.SHARD_SEARCH_THREADS > 1:
+            self._executor = ThreadPoolExecutor(max_workers=Config.SHARD_SEARCH_THREADS,
+                                                thread_name_prefix="shard-search")
+        # Chunks in the root docstore belong to a single store written before sharding
+        if self.docstore.count():
+            self._import_unsharded()
+        self._closed = threading.Event()
+        if Config.SHARD_MAX_LOADED:
+            threading.Thread(target=self._unload_idle_loop, name="shard-unloader",
+                             daemon=True).start()
+
+    def add_documents(self, documents: List[Document]) -> List[str]:
+        """Add documents to their shards, skipping chunks already stored.
+
+        Returns the chunk ID of every document, stored now or before.
+        """
+        return self.store_documents(documents)[0]
+
+    async def aadd_documents(self, documents: List[Document]) -> List[str]:
+        """``add_documents`` with async embedding calls."""
+        return (await self.astore_documents(documents))[0]
+
+    @timed("memory.add")
+    def store_documents(self, documents: List[Document]) -> Tuple[List[str], List[str]]:
+        """``add_documents``, also returning the IDs of the chunks stored now."""
+        ids, groups = self._route(documents)
+        new = self._new_documents(groups)
+        if new:
+            texts = [doc.page_content for docs in new.values() for doc in docs.values()]
+            self._write(new, self.embeddings.embed_documents(texts))
+        return ids, [doc_id for docs in new.values() for doc_id in docs]
+
+    @timed("memory.add")
+    async def astore_documents(self, documents: List[Document]) -> Tuple[List[str], List[str]]:
+        """``store_documents`` with async embedding calls."""
+        ids, groups = self._route(documents)
+        new = await asyncio.to_thread(self._new_documents, groups)
+        if new:
+            texts = [doc.page_content for docs in new.values() for doc in docs.values()]
+            vectors = await self.embeddings.aembed_documents(texts)
+            await asyncio.to_thread(self._write, new, vectors)
+        return ids, [doc_id for docs in new.values() for doc_id in docs]
+
+    def add_text(self, text: str, metadata: Dict) -> str:
+        """Add a single text with metadata."""
+        return self.add_documents([Document(page_content=text, metadata=metadata)])[0]
+
+    def upsert_documents(self, documents: List[Document]) -> List[str]:
+        """Add documents, replacing stored chunks that have the same ID."""
+        self.delete([chunk_id(doc.page_content, doc.metadata) for doc in documents])
+        return self.add_documents(documents)
+
+    def search(self, query: str, k: int = Config.TOP_K_RESULTS,
+               filter_dict: Optional[Dict] = None,
+               mode: Optional[str] = None) -> List[Document]:
+        """Search the shards the filter allows; see ``VectorMemory.search``."""
+        return [doc for doc, _ in self.search_with_score(query, k=k, filter_dict=filter_dict,
+                                                         mode=mode)]
+
+    async def asearch(self, query: str, k: int = Config.TOP_K_RESULTS,
+                      filter_dict: Optional[Dict] = None,
+                      mode: Optional[str] = None) -> List[Document]:
+        """``search`` with an async embedding call."""
+        return [doc for doc, _ in await self.asearch_with_score(query, k=k,
+                                                                filter_dict=filter_dict,
+                                                                mode=mode)]
+
+    @timed("memory.search")
+    def search_with_score(self, query: str, k: int = Config.TOP_K_RESULTS,
+                          filter_dict: Optional[Dict] = None,
+                          mode: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """Search with scores, as ``VectorMemory.search_with_score``."""
+        mode = _search_mode(mode)
+        targets = self._targets(filter_dict)
+        vector = None
+        if mode != "lexical" and targets:
+            vector = self.embeddings.embed_query(query)
+        return self._search(targets, query, vector, k, filter_dict, mode)
+
+    @timed("memory.search")
+    async def asearch_with_score(self, query: str, k: int = Config.TOP_K_RESULTS,
+                                 filter_dict: Optional[Dict] = None,
+                                 mode: Optional[str] = None) -> List[Tuple[Document, float]]:
+        mode = _search_mode(mode)
+        targets = self._targets(filter_dict)
+        vector = None
+        if mode != "lexical" and targets:
+            vector = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self._search, targets, query, vector, k, filter_dict,
+                                       mode)
+
+    @timed("memory.search_mmr")
+    def search_mmr(self, query: str, k: int = Config.TOP_K_RESULTS,
+                   fetch_k: int = Config.MMR_FETCH_K, lambda_mult: float = Config.MMR_LAMBDA,
+                   filter_dict: Optional[Dict] = None,
+                   mode: Optional[str] = None) -> List[Document]:
+        """Relevant but mutually diverse documents, as ``VectorMemory.search_mmr``;
+        each shard contributes up to ``fetch_k`` candidates."""
+        mode = _search_mode(mode)
+        targets = self._targets(filter_dict)
+        if not targets:
+            return []
+        return self._search_mmr(targets, query, self.embeddings.embed_query(query), k, fetch_k,
+                                lambda_mult, filter_dict, mode)
+
+    @timed("memory.search_mmr")
+    async def asearch_mmr(self, query: str, k: int = Config.TOP_K_RESULTS,
+                          fetch_k: int = Config.MMR_FETCH_K,
+                          lambda_mult: float = Config.MMR_LAMBDA,
+                          filter_dict: Optional[Dict] = None,
+                          mode: Optional[str] = None) -> List[Document]:
+        mode = _search_mode(mode)
+        targets = self._targets(filter_dict)
+        if not targets:
+            return []
+        vector = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self._search_mmr, targets, query, vector, k, fetch_k,
+                                       lambda_mult, filter_dict, mode)
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        """Fetch a stored chunk by ID."""
+        name = self.docstore.shards.locate([doc_id]).get(doc_id)
+        if name is None:
+            return None
+        with self._using():
+            return self._shard(name).get(doc_id)
+
+    @timed("memory.delete")
+    def delete(self, ids: List[str]) -> int:
+        """Delete chunks by ID, returning how many were stored."""
+        ids = list(dict.fromkeys(ids))
+        groups: Dict[str, List[str]] = {}
+        for doc_id, name in self.docstore.shards.locate(ids).items():
+            groups.setdefault(name, []).append(doc_id)
+        with self._using():
+            deleted = sum(self._shard(name).delete(group) for name, group in groups.items())
+        with self.docstore.transaction():
+            self.docstore.shards.remove(ids)
+            self.docstore.answer_cache.invalidate(ids)
+        return deleted
+
+    def delete_by_metadata(self, filter_dict: Dict) -> int:
+        """Delete documents matching metadata filter."""
+        local = self._local_filter(filter_dict) or {}
+        with self._using():
+            ids = [doc_id for name in self._targets(filter_dict)
+                   for doc_id in self._shard(name).docstore.match(local)]
+        return self.delete(ids)
+
+    def get_collection_stats(self) -> Dict:
+        """Get statistics about the collection and each shard."""
+        with self._using():
+            with self._open_lock:
+                loaded = dict(self._loaded)
+            stats = {name: shard.get_collection_stats() for name, shard in loaded.items()}
+        shards = {}
+        for name, value in sorted(self._values.items()):
+            shards[name] = {
+                "value": value,
+                "loaded": name in stats,
+                "count": (stats[name]["count"] if name in stats
+                          else self.docstore.shards.count(name)),
+                "index_type": stats[name]["index_type"] if name in stats else None
+            }
+        return {
+            "count": sum(shard["count"] for shard in shards.values()),
+            "name": "aurora_faiss_memory",
+            "shard_key": self.key,
+            "shards": shards,
+            "loaded_shards": len(stats),
+            "wal_vectors": sum(s["wal_vectors"] for s in stats.values()),
+            "tombstones": sum(s["tombstones"] for s in stats.values()),
+            "index_type": ", ".join(sorted({s["index_type"] for s in stats.values()})) or None,
+            "embedding_cache": self.embedding_cache.stats(),
+            "answer_cache": self.docstore.answer_cache.stats(),
+            "embedding_requests": self.embedding_scheduler.stats()
+        }
+
+    @timed("memory.compact")
+    def compact(self):
+        """Compact every open shard; closed ones were compacted when unloaded."""
+        with self._using():
+            with self._open_lock:
+                loaded = list(self._loaded.values())
+            for shard in loaded:
+                shard.compact()
+
+    @timed("memory.rebuild")
+    def rebuild_index(self, index_type: Optional[str] = None):
+        """Rebuild each shard's index in turn, as ``VectorMemory.rebuild_index``."""
+        for name in list(self._values):
+            with self._open_lock:
+                was_open = name in self._loaded
+            with self._using():
+                self._shard(name).rebuild_index(index_type)
+            if not was_open:
+                self.unload([name])
+
+    def set_search_params(self, nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None):
+        """Tune IVF ``nprobe`` / HNSW ``efSearch`` of open and later opened shards."""
+        self._search_params = (nprobe, ef_search)
+        with self._using():
+            with self._open_lock:
+                loaded = list(self._loaded.values())
+            for shard in loaded:
+                shard.set_search_params(nprobe, ef_search)
+
+    def unload(self, names: Optional[List[str]] = None):
+        """Compact and close shards (default: every open one) to free their memory."""
+        with self._lock.write():
+            for name in list(names if names is not None else self._loaded):
+                self._unload(name)
+
+    def close(self):
+        self._closed.set()
+        self.unload()
+        if self._executor is not None:
+            self._executor.shutdown()
+        self.docstore.close()
+        if "embedding_cache" in self.__dict__:
+            self.embedding_cache.flush()
+
+    def _route(self, documents: List[Document]) -> Tuple[List[str], Groups]:
+        """Chunk IDs of ``documents``, and the documents grouped by shard.
+
+        Known chunks go back to the shard holding them, new ones to the
+        shard of their key's value.
+        """
+        documents = [self._stamped(doc) for doc in documents]
+        ids = [chunk_id(doc.page_content, doc.metadata) for doc in documents]
+        located = self.docstore.shards.locate(ids)
+        groups: Groups = {}
+        for doc_id, doc in zip(ids, documents):
+            name = located.get(doc_id) or self._shard_name(doc.metadata.get(self.key))
+            groups.setdefault(name, {}).setdefault(doc_id, doc)
+        return ids, groups
+
+    def _stamped(self, doc: Document) -> Document:
+        """``doc``, given the current time bucket when it lacks the shard key."""
+        if Config.SHARD_TIME_FORMAT is None or self.key in doc.metadata:
+            return doc
+        return Document(page_content=doc.page_content,
+                        metadata={**doc.metadata,
+                                  self.key: time.strftime(Config.SHARD_TIME_FORMAT)})
+
+    def _shard_name(self, value) -> str:
+        """Directory name of the shard for a key value, registering new shards."""
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(value))[:40]
+        digest = hashlib.sha256(json.dumps(value).encode("utf-8")).hexdigest()[:8]
+        name = f"{slug}-{digest}"
+        if name not in self._values:
+            with self.docstore.transaction():
+                self.docstore.shards.add_shard(name, value)
+            self._values[name] = value
+        return name
+
+    def _new_documents(self, groups: Groups) -> Groups:
+        """The part of ``groups`` not yet stored in its shard."""
+        new: Groups = {}
+        with self._using():
+            for name, docs in groups.items():
+                existing = self._shard(name).docstore.existing(list(docs))
+                fresh = {doc_id: doc for doc_id, doc in docs.items() if doc_id not in existing}
+                if fresh:
+                    new[name] = fresh
+        return new
+
+    def _write(self, new: Groups, vectors: List[List[float]]):
+        """Store embedded chunks (``vectors`` in ``new``'s order), one commit per shard."""
+        rows = iter(vectors)
+        with self._using():
+            for name, docs in new.items():
+                ids = list(docs)
+                write = _PendingWrite(ids, [doc.page_content for doc in docs.values()],
+                                      [next(rows) for _ in ids],
+                                      [doc.metadata for doc in docs.values()])
+                # Cataloged first, so a chunk is never stored where lookups can't find it
+                with self.docstore.transaction():
+                    self.docstore.shards.assign([(doc_id, name) for doc_id in ids])
+                try:
+                    self._shard(name)._write(write)
+                except BaseException:
+                    with self.docstore.transaction():
+                        self.docstore.shards.remove(ids)
+                    raise
+
+    def _search(self, targets: List[str], query: str, vector: Optional[List[float]], k: int,
+                filter_dict: Optional[Dict], mode: str) -> List[Tuple[Document, float]]:
+        """Fan a search out to ``targets``, merge their rankings and fetch the top k."""
+        if not targets:
+            return []
+        local = self._local_filter(filter_dict)
+        # Hybrid merges each ranking across shards, then fuses, as a single store would
+        modes = ("dense", "lexical") if mode == "hybrid" else (mode,)
+        fetch = max(k, Config.HYBRID_CANDIDATES) if mode == "hybrid" else k
+        with self._using(), self._reading(targets) as shards:
+            ranked = self._fan_out(shards, lambda shard: [
+                shard._search_positions(query, vector, fetch, local, m) for m in modes])
+            rankings = [_merge(fetch, [found[i] for found in ranked], descending=m != "dense")
+                        for i, m in enumerate(modes)]
+            if mode == "hybrid":
+                scores, keys = _fuse(k, *[keys for _, keys in rankings])
+            else:
+                scores, keys = rankings[0]
+            return _resolve(shards, scores[:k], keys[:k])
+
+    def _search_mmr(self, targets: List[str], query: str, vector: List[float], k: int,
+                    fetch_k: int, lambda_mult: float, filter_dict: Optional[Dict],
+                    mode: str) -> List[Document]:
+        local = self._local_filter(filter_dict)
+
+        def candidates(shard: VectorMemory) -> Tuple[np.ndarray, np.ndarray]:
+            _, positions = shard._search_positions(query, vector, fetch_k, local, mode)
+            return positions, shard.raw.take(positions)
+
+        with self._using(), self._reading(targets) as shards:
+            found = self._fan_out(shards, candidates)
+            keys = np.concatenate([positions * len(shards) + i
+                                   for i, (positions, _) in enumerate(found)])
+            if not len(keys):
+                return []
+            vectors = _unit(np.concatenate([vectors for _, vectors in found]))
+            query_vector = _unit(np.array([vector], dtype=np.float32))[0]
+            picked = keys[_mmr(query_vector, vectors, k, lambda_mult)]
+            return [doc for doc, _ in _resolve(shards, np.zeros(len(picked)), picked)]
+
+    def _fan_out(self, shards: List[Tuple[str, VectorMemory]],
+                 task: Callable[[VectorMemory], object]) -> List:
+        """``task(shard)`` for each shard, in parallel when there are several."""
+        def run(item):
+            name, shard = item
+            with span("memory.shard", shard=name):
+                return task(shard)
+
+        if self._executor is None or len(shards) == 1:
+            return [run(shard) for shard in shards]
+        return list(self._executor.map(run, shards))
+
+    @contextmanager
+    def _reading(self, names: List[str]) -> Iterator[List[Tuple[str, VectorMemory]]]:
+        """The named shards, read-locked for the block so index positions stay
+        valid between ranking and fetching; call while holding ``_using``."""
+        # Always locked in name order, so two searches can't wait on each other
+        shards = [(name, self._shard(name)) for name in sorted(names)]
+        with ExitStack() as stack:
+            for _, shard in shards:
+                stack.enter_context(shard._lock.read())
+            yield shards
+
+    def _targets(self, filter_dict: Optional[Dict]) -> List[str]:
+        """Shards that can hold matches: those whose value passes the filter's key condition."""
+        if not filter_dict or self.key not in filter_dict:
+            return list(self._values)
+        condition = {self.key: filter_dict[self.key]}
+        return [name for name, value in self._values.items()
+                if matches({self.key: value}, condition)]
+
+    def _local_filter(self, filter_dict: Optional[Dict]) -> Optional[Dict]:
+        """The filter within a target shard, where every chunk passes the key condition."""
+        if not filter_dict:
+            return None
+        return {key: value for key, value in filter_dict.items() if key != self.key} or None
+
+    def _shard(self, name: str) -> VectorMemory:
+        """An open shard; call while holding ``_using``."""
+        with self._open_lock:
+            shard = self._loaded.get(name)
+            if shard is None:
+                shard = VectorMemory(os.path.join(self.path, self.SHARDS, name),
+                                     embeddings=self.embeddings)
+                if self._search_params is not None:
+                    shard.set_search_params(*self._search_params)
+                self._loaded[name] = shard
+            self._loaded.move_to_end(name)
+            self._last_used[name] = time.monotonic()
+            return shard
+
+    def _using(self):
+        """Keep open shards open for the block."""
+        return self._lock.read()
+
+    def _unload_idle_loop(self):
+        while not self._closed.wait(max(Config.SHARD_IDLE_SECONDS / 4, 0.01)):
+            self._unload_idle()
+
+    def _unload_idle(self):
+        """Unload the least recently used shards beyond ``Config.SHARD_MAX_LOADED``
+        that have been idle for ``Config.SHARD_IDLE_SECONDS``."""
+        cutoff = time.monotonic() - Config.SHARD_IDLE_SECONDS
+        with self._open_lock:
+            surplus = len(self._loaded) - Config.SHARD_MAX_LOADED
+            idle = [name for name in self._loaded if self._last_used[name] <= cutoff]
+        idle = idle[:max(surplus, 0)]
+        if not idle:
+            return
+        # Compact first, blocking only writes to these shards, not searches
+        with self._using():
+            for name in idle:
+                with self._open_lock:
+                    shard = self._loaded.get(name)
+                if shard is not None:
+                    shard.compact()
+        with self._lock.write():
+            for name in idle:
+                # A shard used meanwhile stays open
+                if self._last_used.get(name, cutoff) <= cutoff:
+                    self._unload(name)
+
+    def _unload(self, name: str):
+        """Compact and close a shard; call while holding the write side of ``_lock``."""
+        with self._open_lock:
+            shard = self._loaded.pop(name, None)
+            self._last_used.pop(name, None)
+        if shard is not None:
+            shard.compact()
+            shard.close()
+
+    def _import_unsharded(self):
+        """Split the single store at ``path`` into shards, reusing its vectors.
+
+        The store is emptied afterwards; an import cut short resumes on the
+        next open, skipping chunks already moved.
+        """
+        store = VectorMemory(self.path, embeddings=self.embeddings)
+        positions = store.docstore.live_positions()
+        for start in range(0, len(positions), Config.INGEST_BATCH_CHUNKS):
+            docs = store.docstore.by_positions(positions[start:start + Config.INGEST_BATCH_CHUNKS])
+            kept = sorted(docs)
+            ids, groups = self._route([docs[p] for p in kept])
+            vectors = dict(zip(ids, store.raw.take(np.array(kept, dtype=np.int64))))
+            new = self._new_documents(groups)
+            if new:
+                self._write(new, [vectors[doc_id] for group in new.values() for doc_id in group])
+        store.delete(list(store.docstore.match({})))
+        store.compact()
+        store.close()
+
+
+def _merge(k: int, results: List[Tuple[np.ndarray, np.ndarray]],
+           descending: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k of per-shard ``(scores, positions)`` rankings, best first.
+
+    Positions become keys ``position * shards + shard index``, unique
+    across shards.
+    """
+    scores = np.concatenate([scores for scores, _ in results])
+    keys = np.concatenate([positions * len(results) + i
+                           for i, (_, positions) in enumerate(results)])
+    order = np.argsort(-scores if descending else scores, kind="stable")[:k]
+    return scores[order], keys[order]
+
+
+@timed("memory.fetch")
+def _resolve(shards: List[Tuple[str, VectorMemory]], scores: np.ndarray,
+             keys: np.ndarray) -> List[Tuple[Document, float]]:
+    """Fetch the documents behind merged keys, in rank order."""
+    owners, positions = keys % len(shards), keys // len(shards)
+    docs = {}
+    for owner in np.unique(owners).tolist():
+        found = shards[owner][1].docstore.by_positions(positions[owners == owner].tolist())
+        docs.update({(owner, position): doc for position, doc in found.items()})
+    return [(docs[(owner, position)], float(score))
+            for score, owner, position in zip(scores.tolist(), owners.tolist(),
+                                              positions.tolist())
+            if (owner, position) in docs]
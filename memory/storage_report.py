@@ -0,0 +1,80 @@
+"""Memory footprint and recall@k of the configured vector storage.
+
+Compares the live index (with and without full-precision re-scoring)
+against an exact float32 search over the stored vectors:
+
+    python -m memory.storage_report --k 10 --queries 200
+"""
+import argparse
+import json
+from typing import Dict
+import faiss
+import numpy as np
+from memory.vector_store import VectorMemory
+
+
+def storage_report(memory: VectorMemory, k: int = 10, n_queries: int = 200,
+                   seed: int = 0) -> Dict:
+    """Measure index size and recall@k; queries are sampled stored vectors."""
+    live = np.array(memory.docstore.live_positions(), dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    queries = memory.raw.take(rng.choice(live, size=min(n_queries, len(live)), replace=False))
+    exact = _exact_knn(memory, live, queries, k)
+
+    def recall(rescore: bool) -> float:
+        hits = 0
+        for query, truth in zip(queries, exact):
+            _, found = memory._ann_search(query[None, :], k, rescore=rescore)
+            hits += len(set(found.tolist()) & set(truth.tolist()))
+        return hits / max(exact.size, 1)
+
+    if memory.index is None:
+        # Flat has no index of its own; it searches the raw vectors
+        vectors = len(memory.raw)
+        index_bytes = vectors * memory.raw.dim * 4
+    else:
+        vectors = memory.index.ntotal
+        index_bytes = faiss.serialize_index(memory.index).nbytes
+    float32_bytes = vectors * memory.raw.dim * 4
+    return {
+        "index_type": memory.index_spec,
+        "vectors": int(vectors),
+        "dim": memory.raw.dim,
+        "index_bytes": int(index_bytes),
+        "bytes_per_vector": index_bytes / max(vectors, 1),
+        "compression_ratio": float32_bytes / max(index_bytes, 1),
+        "raw_bytes_in_memory": memory.raw.nbytes_in_memory(),
+        f"recall@{k}": recall(rescore=False),
+        f"recall@{k}_rescored": recall(rescore=True)
+    }
+
+
+def _exact_knn(memory: VectorMemory, live: np.ndarray, queries: np.ndarray,
+               k: int) -> np.ndarray:
+    """Exact top-k positions, streaming the raw vectors in batches."""
+    best_d = np.full((len(queries), 0), np.inf, dtype=np.float32)
+    best_i = np.empty((len(queries), 0), dtype=np.int64)
+    offset = 0
+    for batch in memory.raw.batches(live):
+        flat = faiss.IndexFlatL2(memory.raw.dim)
+        flat.add(batch)
+        d, i = flat.search(queries, min(k, len(batch)))
+        best_d = np.hstack([best_d, d])
+        best_i = np.hstack([best_i, live[offset + i]])
+        order = np.argsort(best_d, axis=1)[:, :k]
+        best_d = np.take_along_axis(best_d, order, axis=1)
+        best_i = np.take_along_axis(best_i, order, axis=1)
+        offset += len(batch)
+    return best_i
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(storage_report(VectorMemory(), args.k, args.queries), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import hashlib
+import sqlite3
+from typing import Callable, ContextManager, Dict, List
+from memory.metadata_index import MAX_PARAMS
+
+
+class SummaryCache:
+    """LLM summaries keyed by a hash of everything that produced them.
+
+    Rows live in the ``summaries`` table of the docstore's SQLite database,
+    so map, reduce and whole-document summaries survive restarts and are
+    shared by every caller that summarizes the same content.
+    """
+
+    def __init__(self, conn: sqlite3.Connection,
+                 transaction: Callable[[], ContextManager]):
+        self.conn = conn
+        self.transaction = transaction
+        conn.execute("CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT)")
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Cached summaries of whichever ``keys`` have one."""
+        found = {}
+        for start in range(0, len(keys), MAX_PARAMS):
+            batch = keys[start:start + MAX_PARAMS]
+            found.update(self.conn.execute(
+                f"SELECT key, summary FROM summaries WHERE key IN ({','.join('?' * len(batch))})",
+                batch))
+        return found
+
+    def put_many(self, summaries: Dict[str, str]):
+        if not summaries:
+            return
+        with self.transaction():
+            self.conn.executemany("INSERT OR REPLACE INTO summaries (key, summary) VALUES (?, ?)",
+                                  list(summaries.items()))
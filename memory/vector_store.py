@@ -1,77 +1,830 @@
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
 from langchain.schema import Document
-from typing import List, Dict, Optional
-import pickle
+from typing import List, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
 import os
+import threading
+import time
+import faiss
+import numpy as np
 from config import Config
+from memory.wal import WriteAheadLog
+from memory.embedding_cache import CachedEmbeddings, EmbeddingCache
+from memory.docstore import SQLiteDocstore
+from memory.raw_vectors import RawVectors
+from memory.index_factory import (apply_search_params, build_index, empty_like,
+                                  is_lossy, needs_training, resolve_spec,
+                                  search_parameters)
+from memory.embedding_scheduler import EmbeddingScheduler
+from utils.clients import embedding_model_id, lazy_property
+from utils.locks import ReadWriteLock
+from utils.metrics import timed
+
+SEARCH_MODES = ("hybrid", "dense", "lexical")
+
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(text: str, metadata: Dict) -> str:
+    """Deterministic ID of a chunk: its source plus its content hash."""
+    source = str(metadata.get("source", ""))
+    return hashlib.sha256(
+        f"{source}\0{content_hash(text)}".encode("utf-8")
+    ).hexdigest()[:32]
+
 
 class VectorMemory:
-    """Manages the vector database for AURORA's long-term memory."""
+    """Manages the vector database for AURORA's long-term memory.
 
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
-            model=Config.EMBEDDING_MODEL,
-            openai_api_key=Config.OPENAI_API_KEY
-        )
+    On disk the store is ``docstore.sqlite`` (chunk texts, metadata, index
+    positions, tombstones and the current snapshot's state), a raw float32
+    vector file, the snapshot's ``<name>.faiss`` index (absent for Flat,
+    which searches the raw vectors directly) and a ``<name>.wal`` append log
+    of the vectors added since that snapshot.
+
+    The loaded index is never modified, so it is memory-mapped where FAISS
+    allows it; rows added after the snapshot are searched exactly until the
+    next compaction folds them in. Opening the store reads no vectors or
+    texts, and a search only fetches the texts of the chunks it returns.
+
+    Chunks are keyed by ``chunk_id``. Deleting a chunk drops it from the
+    docstore and tombstones its index position; tombstoned vectors are
+    physically removed when the next snapshot is written.
+
+    Alongside the vectors, the docstore keeps a BM25 index of the same
+    positions, so searches can be dense, lexical (no embedding call) or a
+    reciprocal-rank fusion of both.
+
+    Searches run concurrently under the read side of a reader-writer lock;
+    writes take the write side. Chunks added by several threads while a
+    write is in progress are committed together by the next writer, in one
+    log record and one transaction. Embedding calls never hold the lock.
+    The ``a``-prefixed coroutines embed with the async client and run the
+    index work on a worker thread.
+    """
+
+    LEGACY_SNAPSHOT = "index"
+    DOCSTORE = "docstore.sqlite"
+
+    def __init__(self, path: Optional[str] = None,
+                 embeddings: Optional[CachedEmbeddings] = None):
+        """Open the store at ``path`` (default ``Config.CHROMA_DB_PATH``).
+
+        ``embeddings`` lets several stores share one cache and scheduler.
+        """
+        self.path = path or Config.CHROMA_DB_PATH
+        if embeddings is not None:
+            self.embeddings = embeddings
+        self.wal = None
+        self._lock = ReadWriteLock()
+        self._pending: List[_PendingWrite] = []
+        self._pending_lock = threading.Lock()
+        self._open_docstore()
 
         # Try to load existing vectorstore
-        if os.path.exists(Config.CHROMA_DB_PATH):
-            try:
-                self.vectorstore = FAISS.load_local(
-                    Config.CHROMA_DB_PATH,
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-            except:
-                self.vectorstore = FAISS.from_texts(
-                    ["Initial document"],
-                    self.embeddings
-                )
-        else:
+        loaded = False
+        try:
+            state = self.docstore.state()
+            legacy = None if state else self._legacy_snapshot()
+            if state:
+                self._load(state)
+                loaded = True
+            elif legacy is not None:
+                self._import_legacy(legacy)
+                loaded = True
+        except Exception as e:
+            # Never save over a store we failed to read
+            self._quarantine(e)
+
+        if not loaded:
             # Create new vectorstore
-            self.vectorstore = FAISS.from_texts(
-                ["Initial document"],
-                self.embeddings
+            self._bootstrap()
+
+        if Config.EMBEDDING_DIMENSIONS and self.raw.dim != Config.EMBEDDING_DIMENSIONS:
+            raise ValueError(
+                f"Store at {self.path} holds {self.raw.dim}-dimensional vectors but "
+                f"EMBEDDING_DIMENSIONS is {Config.EMBEDDING_DIMENSIONS}; "
+                "use a new CHROMA_DB_PATH or re-ingest"
             )
+        self._tombstones = self.docstore.tombstones()
+        self._excluded = None
+        self.wal = WriteAheadLog(self._wal_path(self.snapshot))
+        self._replay_wal()
+
+    @lazy_property
+    def embedding_cache(self) -> EmbeddingCache:
+        return EmbeddingCache(Config.EMBEDDING_CACHE_PATH, Config.EMBEDDING_CACHE_MAX_ENTRIES)
+
+    @lazy_property
+    def embedding_scheduler(self) -> EmbeddingScheduler:
+        if Config.EMBEDDING_PROVIDER == "fake":
+            from utils.fake_providers import HashingEmbedder
+            # Local and free: no rate budgets to respect
+            return EmbeddingScheduler(HashingEmbedder(_dimension(), Config.FAKE_EMBEDDING_LATENCY),
+                                      requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)
+        return EmbeddingScheduler()
+
+    @lazy_property
+    def embeddings(self) -> CachedEmbeddings:
+        """Cached embeddings; misses go through the batching scheduler."""
+        return CachedEmbeddings(
+            self.embedding_scheduler,
+            self.embedding_cache,
+            namespace=f"{embedding_model_id()}:{Config.EMBEDDING_DIMENSIONS or 'full'}"
+        )
 
     def add_documents(self, documents: List[Document]) -> List[str]:
-        """Add documents to the vector store."""
-        self.vectorstore.add_documents(documents)
-        self._save()
-        return [str(i) for i in range(len(documents))]
+        """Add documents to the vector store, skipping chunks already stored.
+
+        Returns the chunk ID of every document, stored now or before.
+        """
+        return self.store_documents(documents)[0]
+
+    async def aadd_documents(self, documents: List[Document]) -> List[str]:
+        """``add_documents`` with async embedding calls."""
+        return (await self.astore_documents(documents))[0]
+
+    @timed("memory.add")
+    def store_documents(self, documents: List[Document]) -> Tuple[List[str], List[str]]:
+        """``add_documents``, also returning the IDs of the chunks stored now
+        (each once), so a caller can tell new chunks from duplicates."""
+        ids, new = self._new_documents(documents)
+        if new:
+            texts = [doc.page_content for doc in new.values()]
+            self._write(_PendingWrite(list(new), texts, self.embeddings.embed_documents(texts),
+                                      [doc.metadata for doc in new.values()]))
+        return ids, list(new)
+
+    @timed("memory.add")
+    async def astore_documents(self, documents: List[Document]) -> Tuple[List[str], List[str]]:
+        """``store_documents`` with async embedding calls."""
+        ids, new = self._new_documents(documents)
+        if new:
+            texts = [doc.page_content for doc in new.values()]
+            vectors = await self.embeddings.aembed_documents(texts)
+            await asyncio.to_thread(self._write, _PendingWrite(
+                list(new), texts, vectors, [doc.metadata for doc in new.values()]))
+        return ids, list(new)
 
     def add_text(self, text: str, metadata: Dict) -> str:
         """Add a single text with metadata."""
-        doc = Document(page_content=text, metadata=metadata)
-        self.vectorstore.add_documents([doc])
-        self._save()
-        return "added"
+        return self.add_documents([Document(page_content=text, metadata=metadata)])[0]
+
+    def upsert_documents(self, documents: List[Document]) -> List[str]:
+        """Add documents, replacing stored chunks that have the same ID."""
+        self.delete([chunk_id(doc.page_content, doc.metadata) for doc in documents])
+        return self.add_documents(documents)
 
     def search(self, query: str, k: int = Config.TOP_K_RESULTS,
-               filter_dict: Optional[Dict] = None) -> List[Document]:
-        """Semantic search over stored documents."""
-        results = self.vectorstore.similarity_search(query, k=k)
-        return results
+               filter_dict: Optional[Dict] = None,
+               mode: Optional[str] = None) -> List[Document]:
+        """Search stored documents.
+
+        ``filter_dict`` restricts results by metadata: a value for equality,
+        ``{"$in": [...]}`` for membership or ``$gt``/``$gte``/``$lt``/``$lte``
+        bounds for ranges. ``mode`` is ``"hybrid"``, ``"dense"`` or
+        ``"lexical"`` and defaults to ``Config.SEARCH_MODE``; lexical search
+        makes no embedding call, so it works offline.
+        """
+        return [doc for doc, _ in self.search_with_score(query, k=k, filter_dict=filter_dict,
+                                                         mode=mode)]
+
+    async def asearch(self, query: str, k: int = Config.TOP_K_RESULTS,
+                      filter_dict: Optional[Dict] = None,
+                      mode: Optional[str] = None) -> List[Document]:
+        """``search`` with an async embedding call."""
+        return [doc for doc, _ in await self.asearch_with_score(query, k=k,
+                                                                filter_dict=filter_dict,
+                                                                mode=mode)]
+
+    @timed("memory.search")
+    def search_with_score(self, query: str, k: int = Config.TOP_K_RESULTS,
+                          filter_dict: Optional[Dict] = None,
+                          mode: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """Search with scores: L2 distances for dense search (lower is closer),
+        BM25 for lexical and reciprocal-rank fusion for hybrid (higher is better).
+        """
+        mode = _search_mode(mode)
+        vector = None
+        if mode != "lexical" and self._live_count():
+            vector = self.embeddings.embed_query(query)
+        return self._search_locked(query, vector, k, filter_dict, mode)
+
+    @timed("memory.search")
+    async def asearch_with_score(self, query: str, k: int = Config.TOP_K_RESULTS,
+                                 filter_dict: Optional[Dict] = None,
+                                 mode: Optional[str] = None) -> List[Tuple[Document, float]]:
+        mode = _search_mode(mode)
+        vector = None
+        if mode != "lexical" and self._live_count():
+            vector = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self._search_locked, query, vector, k, filter_dict, mode)
+
+    @timed("memory.search_mmr")
+    def search_mmr(self, query: str, k: int = Config.TOP_K_RESULTS,
+                   fetch_k: int = Config.MMR_FETCH_K, lambda_mult: float = Config.MMR_LAMBDA,
+                   filter_dict: Optional[Dict] = None,
+                   mode: Optional[str] = None) -> List[Document]:
+        """Relevant but mutually diverse documents, most useful first.
+
+        ``fetch_k`` candidates are retrieved as in ``search`` and re-ranked by
+        maximal marginal relevance over their stored vectors: each pick
+        maximises ``lambda_mult`` times its similarity to the query minus the
+        rest times its similarity to the closest document already picked.
+        Candidates nearly identical to a pick (``Config.MMR_DUPLICATE_SIMILARITY``)
+        are dropped.
+        """
+        mode = _search_mode(mode)
+        if not self._live_count():
+            return []
+        return self._mmr_locked(query, self.embeddings.embed_query(query), k, fetch_k,
+                                lambda_mult, filter_dict, mode)
+
+    @timed("memory.search_mmr")
+    async def asearch_mmr(self, query: str, k: int = Config.TOP_K_RESULTS,
+                          fetch_k: int = Config.MMR_FETCH_K,
+                          lambda_mult: float = Config.MMR_LAMBDA,
+                          filter_dict: Optional[Dict] = None,
+                          mode: Optional[str] = None) -> List[Document]:
+        mode = _search_mode(mode)
+        if not self._live_count():
+            return []
+        vector = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self._mmr_locked, query, vector, k, fetch_k,
+                                       lambda_mult, filter_dict, mode)
+
+    def _search_locked(self, query: str, vector: Optional[List[float]], k: int,
+                       filter_dict: Optional[Dict], mode: str) -> List[Tuple[Document, float]]:
+        with self._lock.read():
+            scores, positions = self._search_positions(query, vector, k, filter_dict, mode)
+            return self._resolve(scores, positions, k)
+
+    def _mmr_locked(self, query: str, vector: List[float], k: int, fetch_k: int,
+                    lambda_mult: float, filter_dict: Optional[Dict],
+                    mode: str) -> List[Document]:
+        with self._lock.read():
+            _, positions = self._search_positions(query, vector, fetch_k, filter_dict, mode)
+            if not len(positions):
+                return []
+            vectors = _unit(self.raw.take(positions))
+            query_vector = _unit(np.array([vector], dtype=np.float32))[0]
+            picked = positions[_mmr(query_vector, vectors, k, lambda_mult)].tolist()
+            docs = self.docstore.by_positions(picked)
+        return [docs[position] for position in picked if position in docs]
+
+    def _search_positions(self, query: str, vector: Optional[List[float]], k: int,
+                          filter_dict: Optional[Dict],
+                          mode: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k ``(scores, positions)`` of a search, best first.
+
+        ``vector`` is the query's embedding, unused by lexical search.
+        """
+        empty = (np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64))
+        if not self._live_count():
+            return empty
+        candidates = None
+        if filter_dict:
+            candidates = np.array(sorted(self.docstore.match(filter_dict).values()),
+                                  dtype=np.int64)
+            if not len(candidates):
+                return empty
+        if mode == "lexical":
+            scores, positions = self._lexical_search(query, k, candidates)
+        elif mode == "dense":
+            scores, positions = self._dense_search(vector, k, candidates)
+        else:
+            # Each ranking goes deeper than k so fusion can promote across them
+            fetch = max(k, Config.HYBRID_CANDIDATES)
+            lexical = self._lexical_search(query, fetch, candidates)[1]
+            dense = self._dense_search(vector, fetch, candidates)[1]
+            scores, positions = _fuse(k, dense, lexical)
+        return scores, positions
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        """Fetch a stored chunk by ID."""
+        return self.docstore.get(doc_id)
 
-    def search_with_score(self, query: str, k: int = Config.TOP_K_RESULTS):
-        """Search with relevance scores."""
-        results = self.vectorstore.similarity_search_with_score(query, k=k)
-        return results
+    @timed("memory.delete")
+    def delete(self, ids: List[str]) -> int:
+        """Delete chunks by ID, returning how many were stored."""
+        with self._lock.write():
+            positions = self.docstore.delete(list(dict.fromkeys(ids)))
+            self._tombstones.update(positions)
+            self._excluded = None
+            if positions and len(self._tombstones) >= Config.TOMBSTONE_COMPACT_RATIO * len(self.raw):
+                self._save()
+        return len(positions)
 
-    def delete_by_metadata(self, filter_dict: Dict):
+    def delete_by_metadata(self, filter_dict: Dict) -> int:
         """Delete documents matching metadata filter."""
-        # FAISS doesn't support deletion easily
-        pass
+        return self.delete(list(self.docstore.match(filter_dict)))
 
     def get_collection_stats(self) -> Dict:
         """Get statistics about the collection."""
+        with self._lock.read():
+            return self._stats()
+
+    def _stats(self) -> Dict:
         return {
-            "count": self.vectorstore.index.ntotal,
-            "name": "aurora_faiss_memory"
+            "count": self._live_count(),
+            "name": "aurora_faiss_memory",
+            "wal_vectors": self.wal.vectors,
+            "tombstones": len(self._tombstones),
+            "index_type": self.index_spec,
+            "index_mmap": self._index_mapped,
+            "embedding_cache": self.embedding_cache.stats(),
+            "answer_cache": self.docstore.answer_cache.stats(),
+            "embedding_requests": self.embedding_scheduler.stats()
         }
 
+    @timed("memory.compact")
+    def compact(self):
+        """Fold the append log and tombstones into a fresh snapshot."""
+        with self._lock.write():
+            if self.wal.records or self._tombstones:
+                self._save()
+
+    @timed("memory.rebuild")
+    def rebuild_index(self, index_type: Optional[str] = None):
+        """Rebuild the ANN index from the stored vectors, without re-embedding.
+
+        ``index_type`` defaults to ``Config.INDEX_TYPE``; an explicit type is
+        honoured even below ``Config.INDEX_TRAIN_THRESHOLD``.
+        """
+        with self._lock.write():
+            spec = resolve_spec(index_type or Config.INDEX_TYPE, self._live_count(),
+                                self.raw.dim,
+                                train_threshold=0 if index_type not in (None, "auto") else None)
+            self._rebuild_index(spec)
+            self._save()
+
+    def set_search_params(self, nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None):
+        """Tune IVF ``nprobe`` / HNSW ``efSearch`` at runtime."""
+        with self._lock.write():
+            if self.index is not None:
+                apply_search_params(self.index, nprobe, ef_search)
+
+    def close(self):
+        """Release the index, vectors and files; reopen the path to use the store again.
+
+        Vectors added since the snapshot stay in the append log.
+        """
+        with self._lock.write():
+            self.wal.close()
+            self.docstore.close()
+            self.index = None
+            self.raw = None
+        if "embedding_cache" in self.__dict__:  # built by this store, not shared into it
+            self.embedding_cache.flush()
+
+    @timed("memory.faiss")
+    def _dense_search(self, vector: List[float], k: int,
+                      candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        query = np.array([vector], dtype=np.float32)
+        if candidates is not None:
+            return self._search_subset(query, k, candidates)
+        return self._ann_search(query, k)
+
+    @timed("memory.bm25")
+    def _lexical_search(self, query: str, k: int,
+                        candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.docstore.lexical_index.search(
+            query, k, candidates, exclude=self._exclusion()[0])
+
+    def _search_subset(self, query: np.ndarray, k: int,
+                       positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Score only the candidate positions that passed a metadata filter."""
+        if self.index is None or len(positions) <= Config.FILTER_EXACT_SCAN_LIMIT:
+            # Small subsets: exact distances over just their vectors
+            return self.raw.search(query, k, positions)
+        indexed = positions[positions < self.index.ntotal]
+        return _merge(k,
+                      self._index_search(query, k, faiss.IDSelectorBatch(indexed)),
+                      self.raw.search(query, k, positions[positions >= self.index.ntotal]))
+
+    def _ann_search(self, query: np.ndarray, k: int,
+                    rescore: Optional[bool] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k live positions over the index plus the rows added since."""
+        excluded, selector = self._exclusion()
+        if self.index is None:
+            return self.raw.search(query, k, exclude=excluded)
+        delta = np.arange(self.index.ntotal, len(self.raw), dtype=np.int64)
+        if len(excluded):
+            delta = np.setdiff1d(delta, excluded, assume_unique=True)
+        return _merge(k,
+                      self._index_search(query, k, selector, rescore=rescore),
+                      self.raw.search(query, k, delta))
+
+    def _exclusion(self):
+        """Tombstoned positions, sorted, and a faiss selector of every other
+        position (None without tombstones); built once per set of tombstones."""
+        if self._excluded is None:
+            excluded = np.array(sorted(self._tombstones), dtype=np.int64)
+            selector = None
+            if len(excluded):
+                # IDSelectorNot only points at the batch selector; keep both alive
+                batch = faiss.IDSelectorBatch(excluded)
+                selector = faiss.IDSelectorNot(batch)
+                selector.referenced_objects = [batch]
+            self._excluded = excluded, selector
+        return self._excluded
+
+    def _index_search(self, query: np.ndarray, k: int, selector=None,
+                      rescore: Optional[bool] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the snapshot's index.
+
+        Lossy (SQ/PQ) indexes fetch ``Config.RESCORE_FACTOR`` times as many
+        candidates and re-rank them at full precision from the raw vectors.
+        """
+        if rescore is None:
+            rescore = is_lossy(self.index_spec)
+        fetch = min(k * Config.RESCORE_FACTOR if rescore else k, self.index.ntotal)
+        if fetch <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        params = None if selector is None else search_parameters(self.index, selector)
+        scores, positions = self.index.search(query, fetch, params=params)
+        found = positions[0] >= 0
+        scores, positions = scores[0][found], positions[0][found]
+        if rescore:
+            scores = ((self.raw.take(positions) - query) ** 2).sum(axis=1)
+            order = np.argsort(scores)[:k]
+            scores, positions = scores[order], positions[order]
+        return scores, positions
+
+    @timed("memory.fetch")
+    def _resolve(self, scores, positions, k: int) -> List[Tuple[Document, float]]:
+        """Fetch the documents at the top ``k`` positions, in rank order."""
+        docs = self.docstore.by_positions(positions[:k].tolist())
+        return [(docs[position], float(score))
+                for score, position in zip(scores[:k], positions[:k].tolist())
+                if position in docs]
+
+    def _new_documents(self, documents: List[Document]) -> Tuple[List[str], Dict[str, Document]]:
+        """Chunk IDs of ``documents``, and the first document of each ID not yet stored."""
+        ids = [chunk_id(doc.page_content, doc.metadata) for doc in documents]
+        existing = self.docstore.existing(ids)
+        new = {}
+        for doc_id, doc in zip(ids, documents):
+            if doc_id not in existing and doc_id not in new:
+                new[doc_id] = doc
+        return ids, new
+
+    @timed("memory.write")
+    def _write(self, write: "_PendingWrite"):
+        """Commit embedded chunks, along with any other threads queued meanwhile."""
+        with self._pending_lock:
+            self._pending.append(write)
+        with self._lock.write():
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            # An empty batch means an earlier writer already committed ours
+            if batch:
+                try:
+                    self._append_batch(batch)
+                except BaseException as e:
+                    for pending in batch:
+                        pending.error = e
+        if write.error is not None:
+            raise write.error
+
+    def _append_batch(self, batch: List["_PendingWrite"]):
+        """Append queued writes, skipping IDs stored since they were embedded."""
+        existing = self.docstore.existing([doc_id for w in batch for doc_id in w.ids])
+        ids, texts, vectors, metadatas = [], [], [], []
+        for pending in batch:
+            for row in zip(pending.ids, pending.texts, pending.vectors, pending.metadatas):
+                if row[0] not in existing:
+                    existing.add(row[0])
+                    for column, value in zip((ids, texts, vectors, metadatas), row):
+                        column.append(value)
+        if ids:
+            self._append(ids, texts, vectors, metadatas)
+
+    def _append(self, ids: List[str], texts: List[str],
+                embeddings: List[List[float]], metadatas: List[Dict]):
+        """Log new vectors, apply them and compact past the threshold."""
+        vectors = np.array(embeddings, dtype=np.float32)
+        start = len(self.raw)
+        self.wal.append("add", (ids, texts, metadatas, vectors), vectors=len(ids))
+        self.raw.append(vectors)
+        self.docstore.insert(_rows(ids, start, texts, metadatas))
+        if self._should_retrain():
+            self._rebuild_index(resolve_spec(Config.INDEX_TYPE, self._live_count(),
+                                             self.raw.dim))
+            self._save()
+        elif self.wal.vectors >= Config.WAL_COMPACT_THRESHOLD:
+            self._save()
+
+    def _live_count(self) -> int:
+        # Every raw row is either a stored chunk or a tombstone
+        return len(self.raw) - len(self._tombstones)
+
+    def _should_retrain(self) -> bool:
+        """Whether growth calls for a (re)trained index.
+
+        An untrained index (Flat, float16 codes, HNSW) moves to the configured
+        type as soon as that differs, e.g. once the training threshold is
+        crossed; under ``"auto"`` the index is retrained each time the corpus
+        has grown fourfold since it was last trained.
+        """
+        dim = self.raw.dim
+        spec = resolve_spec(Config.INDEX_TYPE, self._live_count(), dim)
+        if spec == self.index_spec:
+            return False
+        if not needs_training(self.index_spec, dim):
+            return True
+        if not needs_training(spec, dim):
+            # Never fall back from a trained index to an untrained one
+            return False
+        return (Config.INDEX_TYPE == "auto"
+                and self._live_count() >= 4 * max(self._trained_size, 1))
+
+    def _rebuild_index(self, spec: str):
+        """Replace the index; Flat needs none, it searches the raw vectors."""
+        if spec == "Flat":
+            self.index = None
+        else:
+            self.index = build_index(spec, self.raw)
+            for batch in self.raw.batches():
+                self.index.add(batch)
+        self._index_mapped = False
+        self.index_spec = spec
+        self._trained_size = self._live_count()
+
+    def _writable_index(self) -> faiss.Index:
+        """The snapshot's index, re-read into memory if it is memory-mapped."""
+        if not self._index_mapped:
+            return self.index
+        index = faiss.read_index(os.path.join(self.path, self.snapshot + ".faiss"))
+        apply_search_params(index)
+        return index
+
+    def _load(self, state: Dict):
+        self.snapshot = state["snapshot"]
+        self.index_spec = state["index_spec"]
+        self._trained_size = state["trained_size"]
+        self.raw = RawVectors(state["dim"], os.path.join(self.path, state["vectors"]),
+                              state["rows"])
+        self.index = None
+        self._index_mapped = False
+        if self.index_spec != "Flat":
+            index_path = os.path.join(self.path, self.snapshot + ".faiss")
+            try:
+                self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+                self._index_mapped = True
+            except RuntimeError:
+                # Not every index type can be memory-mapped
+                self.index = faiss.read_index(index_path)
+            apply_search_params(self.index)
+
+    def _bootstrap(self):
+        """Create an empty store; the dimension is known without embedding anything."""
+        self.snapshot = None
+        self.raw = RawVectors(_dimension())
+        self._tombstones = set()
+        self._excluded = None
+        self._rebuild_index("Flat")
+        self._save()
+
+    def _import_legacy(self, snapshot: str):
+        """Convert a pickled FAISS store written by earlier versions."""
+        from langchain_community.vectorstores import FAISS
+
+        store = FAISS.load_local(self.path, self.embeddings, index_name=snapshot)
+        meta_path = os.path.join(self.path, snapshot + ".json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.raw = RawVectors(store.index.d, os.path.join(self.path, meta["vectors"]),
+                                  meta["rows"])
+            self.index_spec = meta["index_spec"]
+            self._trained_size = meta["trained_size"]
+        else:
+            self.raw = RawVectors(store.index.d)
+            self.raw.append(store.index.reconstruct_n(0, store.index.ntotal))
+            self.index_spec = "Flat"
+            self._trained_size = 0
+
+        docs = store.docstore._dict
+        position_ids = dict(store.index_to_docstore_id)
+        wal = WriteAheadLog(self._wal_path(snapshot))
+        for op, payload in wal.replay():
+            if op == "add":
+                texts, embeddings, metadatas, ids = payload
+                start = len(self.raw)
+                self.raw.append(np.array(embeddings, dtype=np.float32))
+                for offset, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                    docs[doc_id] = Document(page_content=text, metadata=metadata)
+                    position_ids[start + offset] = doc_id
+            elif op == "delete":
+                for doc_id in payload[0]:
+                    docs.pop(doc_id, None)
+        wal.close()
+
+        # An ID re-added after a delete only lives at its latest position;
+        # the placeholder chunk old stores were seeded with is dropped
+        latest = {doc_id: position for position, doc_id in sorted(position_ids.items())
+                  if doc_id in docs and not _placeholder(docs[doc_id])}
+        live = set(latest.values())
+        # Both are idempotent, so an import cut short simply runs again
+        self.docstore.insert([(doc_id, position, docs[doc_id].page_content,
+                               docs[doc_id].metadata)
+                              for doc_id, position in latest.items()])
+        self.docstore.add_tombstones([p for p in range(len(self.raw)) if p not in live])
+
+        self.snapshot = None
+        self.index = None if self.index_spec == "Flat" else store.index
+        self._index_mapped = False
+        self._tombstones = self.docstore.tombstones()
+        self._excluded = None
+        self._save()
+
+    def _replay_wal(self):
+        """Re-apply vectors logged after the current snapshot."""
+        for op, payload in self.wal.replay():
+            if op == "add":
+                ids, texts, metadatas, vectors = payload
+                start = len(self.raw)
+                self.raw.append(vectors)
+                self.docstore.insert_missing(_rows(ids, start, texts, metadatas))
+                self.wal.vectors += len(ids)
+
+    @timed("memory.save")
     def _save(self):
-        """Save vectorstore to disk."""
-        os.makedirs(Config.CHROMA_DB_PATH, exist_ok=True)
-        self.vectorstore.save_local(Config.CHROMA_DB_PATH)
+        """Write a new snapshot and atomically make it current."""
+        snapshot = f"snapshot-{time.time_ns()}"
+        purge = bool(self._tombstones)
+        if purge:
+            keep = np.setdiff1d(np.arange(len(self.raw), dtype=np.int64),
+                                np.fromiter(self._tombstones, dtype=np.int64))
+            self.raw.persist(os.path.join(self.path, f"vectors-{time.time_ns()}.f32"), keep)
+            if self.index is not None:
+                index = empty_like(self._writable_index())
+                for batch in self.raw.batches():
+                    index.add(batch)
+                self.index = index
+        else:
+            self.raw.persist(self.raw.path
+                             or os.path.join(self.path, f"vectors-{time.time_ns()}.f32"))
+            if self.index is not None and self.index.ntotal < len(self.raw):
+                index = self._writable_index()
+                for batch in self.raw.batches(np.arange(index.ntotal, len(self.raw))):
+                    index.add(batch)
+                self.index = index
+        if self.index is not None:
+            index_path = os.path.join(self.path, snapshot + ".faiss")
+            faiss.write_index(self.index, index_path)
+            _fsync(index_path)
+
+        # Committing the state is the switch: a crash before it leaves the
+        # previous snapshot, its vectors and its log untouched.
+        with self.docstore.transaction():
+            if purge:
+                self.docstore.purge_tombstones()
+            else:
+                self.docstore.lexical_index.merge(Config.LEXICAL_MAX_ROWS)
+            self.docstore.set_state({
+                "snapshot": snapshot,
+                "index_spec": self.index_spec,
+                "trained_size": self._trained_size,
+                "dim": self.raw.dim,
+                "vectors": os.path.basename(self.raw.path),
+                "rows": len(self.raw)
+            })
+        self.snapshot = snapshot
+        self._index_mapped = False
+        self._tombstones = set()
+        self._excluded = None
+
+        if self.wal is not None:
+            self.wal.close()
+        self.wal = WriteAheadLog(self._wal_path(snapshot))
+        self._remove_stale_files()
+
+    def _remove_stale_files(self):
+        """Delete files of older snapshots and of the pickled store layout."""
+        current = {os.path.basename(self.raw.path),
+                   self.snapshot + ".faiss", self.snapshot + ".wal"}
+        legacy = ("CURRENT", self.LEGACY_SNAPSHOT + ".")
+        for name in os.listdir(self.path):
+            if name not in current and name.startswith(("snapshot-", "vectors-") + legacy):
+                os.remove(os.path.join(self.path, name))
+
+    def _legacy_snapshot(self) -> Optional[str]:
+        """Name of a pickled FAISS snapshot from earlier versions, if any."""
+        pointer = os.path.join(self.path, "CURRENT")
+        if os.path.exists(pointer):
+            with open(pointer) as f:
+                return f.read().strip()
+        if os.path.exists(os.path.join(self.path, self.LEGACY_SNAPSHOT + ".faiss")):
+            return self.LEGACY_SNAPSHOT
+        return None
+
+    def _wal_path(self, snapshot: str) -> str:
+        return os.path.join(self.path, snapshot + ".wal")
+
+    def _open_docstore(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.docstore = SQLiteDocstore(os.path.join(self.path, self.DOCSTORE),
+                                       Config.INDEXED_METADATA_KEYS,
+                                       Config.LEXICAL_METADATA_KEYS)
+
+    def _quarantine(self, error: Exception):
+        """Move an unreadable store aside so a fresh one can't overwrite it."""
+        self.docstore.close()
+        broken = f"{self.path.rstrip(os.sep)}.corrupt-{int(time.time())}"
+        os.replace(self.path, broken)
+        print(f"Could not load vector store ({error}); moved it to {broken}")
+        self._open_docstore()
+
+
+class _PendingWrite:
+    """Embedded chunks waiting for the write lock."""
+
+    def __init__(self, ids: List[str], texts: List[str], vectors: List[List[float]],
+                 metadatas: List[Dict]):
+        self.ids = ids
+        self.texts = texts
+        self.vectors = vectors
+        self.metadatas = metadatas
+        self.error: Optional[BaseException] = None
+
+
+def _dimension() -> int:
+    """Size of the configured embeddings, known without embedding anything."""
+    dim = Config.EMBEDDING_DIMENSIONS or Config.EMBEDDING_MODEL_DIMENSIONS.get(
+        Config.EMBEDDING_MODEL)
+    if dim is None:
+        raise ValueError(
+            f"Unknown dimension for {Config.EMBEDDING_MODEL}; set EMBEDDING_DIMENSIONS"
+        )
+    return dim
+
+
+def _search_mode(mode: Optional[str]) -> str:
+    mode = mode or Config.SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}; use one of {SEARCH_MODES}")
+    return mode
+
+
+def _placeholder(doc: Document) -> bool:
+    return doc.page_content == "Initial document" and not doc.metadata
+
+
+def _rows(ids: List[str], start: int, texts: List[str],
+          metadatas: List[Dict]) -> List[Tuple[str, int, str, Dict]]:
+    """Docstore rows for chunks stored at consecutive positions from ``start``."""
+    return [(doc_id, start + offset, text, metadata)
+            for offset, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas))]
+
+
+def _merge(k: int, *results: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Combine ``(scores, positions)`` results into one top-k by distance."""
+    scores = np.concatenate([r[0] for r in results])
+    positions = np.concatenate([r[1] for r in results])
+    order = np.argsort(scores, kind="stable")[:k]
+    return scores[order], positions[order]
+
+
+def _fuse(k: int, *rankings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Reciprocal-rank fusion of position rankings into one top-k, best first."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking.tolist()):
+            fused[position] = fused.get(position, 0.0) + 1.0 / (Config.RRF_K + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return (np.array([score for _, score in best], dtype=np.float32),
+            np.array([position for position, _ in best], dtype=np.int64))
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _mmr(query: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """Indices of up to ``k`` unit ``vectors`` in maximal-marginal-relevance order."""
+    relevance = vectors @ query
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    picked = []
+    while len(picked) < k and available.any():
+        score = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy,
+                         -np.inf)
+        pick = int(np.argmax(score))
+        picked.append(pick)
+        similarity = vectors @ vectors[pick]
+        redundancy = np.maximum(redundancy, similarity)
+        available[pick] = False
+        available &= similarity < Config.MMR_DUPLICATE_SIMILARITY
+    return picked
+
+
+def _fsync(path: str):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
@@ -0,0 +1,66 @@
+import os
+import pickle
+import struct
+import zlib
+from typing import Iterator, Tuple
+
+
+class WriteAheadLog:
+    """Append-only log of the changes made since the last index snapshot.
+
+    Each record is framed as ``<length><crc32><pickled payload>`` so a torn
+    write at the tail (crash mid-append) is detected and dropped on replay
+    instead of corrupting the store.
+    """
+
+    HEADER = struct.Struct("<II")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self.vectors = 0
+        self._file = None
+
+    def append(self, op: str, payload: Tuple, vectors: int = 0):
+        """Durably append one record to the log."""
+        data = pickle.dumps((op, payload), protocol=pickle.HIGHEST_PROTOCOL)
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(self.HEADER.pack(len(data), zlib.crc32(data)))
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records += 1
+        self.vectors += vectors
+
+    def replay(self) -> Iterator[Tuple[str, Tuple]]:
+        """Yield ``(op, payload)`` records, truncating any torn tail."""
+        if not os.path.exists(self.path):
+            return
+        good_offset = 0
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(self.HEADER.size)
+                if len(header) < self.HEADER.size:
+                    break
+                length, crc = self.HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != crc:
+                    break
+                good_offset = f.tell()
+                self.records += 1
+                yield pickle.loads(data)
+        if good_offset < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_offset)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Close and delete the log file."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,11 @@
+import pytest
+from utils import tokens
+from utils.fake_providers import BytePairEncoding
+
+
+@pytest.fixture(autouse=True)
+def offline_tokenizer(monkeypatch):
+    """Two UTF-8 bytes to a token, so counts are predictable and no BPE
+    file is downloaded."""
+    encoding = BytePairEncoding()
+    monkeypatch.setattr(tokens, "encoding", lambda: encoding)
@@ -0,0 +1,45 @@
+import threading
+import pytest
+from memory.docstore import SQLiteDocstore
+
+
+@pytest.fixture
+def docstore(tmp_path):
+    store = SQLiteDocstore(str(tmp_path / "docstore.sqlite"), ["type"])
+    yield store
+    store.close()
+
+
+def read_on_another_thread(docstore):
+    seen = {}
+
+    def read():
+        seen["existing"] = docstore.existing(["a"])
+        seen["get"] = docstore.get("a")
+        seen["match"] = docstore.match({"type": "note"})
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    thread.join()
+    return seen
+
+
+def test_other_threads_never_see_uncommitted_rows(docstore):
+    with pytest.raises(RuntimeError):
+        with docstore.transaction():
+            docstore._insert([("a", 0, "text", {"type": "note"})])
+            assert docstore.existing(["a"]) == {"a"}
+            assert read_on_another_thread(docstore) == {"existing": set(), "get": None,
+                                                         "match": {}}
+            raise RuntimeError("roll back")
+
+    assert docstore.existing(["a"]) == set()
+
+
+def test_other_threads_see_committed_rows(docstore):
+    docstore.insert([("a", 0, "text", {"type": "note"})])
+
+    seen = read_on_another_thread(docstore)
+    assert seen["existing"] == {"a"}
+    assert seen["get"].page_content == "text"
+    assert seen["match"] == {"a": 0}
@@ -0,0 +1,56 @@
+import numpy as np
+from memory.embedding_cache import EmbeddingCache
+
+
+def vectors(n, dim, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32).tolist()
+
+
+def test_entries_survive_reopen(tmp_path):
+    keys = [EmbeddingCache.key("model:8", f"text {i}") for i in range(5)]
+    stored = vectors(5, 8)
+    EmbeddingCache(str(tmp_path), 10).put_many(keys, stored)
+
+    assert np.allclose(EmbeddingCache(str(tmp_path), 10).get_many(keys), stored)
+
+
+def test_reopen_at_a_new_dimension_starts_afresh(tmp_path):
+    old_keys = [EmbeddingCache.key("model:8", f"text {i}") for i in range(5)]
+    EmbeddingCache(str(tmp_path), 10).put_many(old_keys, vectors(5, 8))
+
+    cache = EmbeddingCache(str(tmp_path), 10)
+    new_keys = [EmbeddingCache.key("model:4", f"text {i}") for i in range(3)]
+    assert cache.get_many(new_keys) == [None] * 3
+    stored = vectors(3, 4, seed=1)
+    cache.put_many(new_keys, stored)
+
+    assert cache.dim == 4
+    assert np.allclose(cache.get_many(new_keys), stored)
+    reopened = EmbeddingCache(str(tmp_path), 10)
+    assert reopened.dim == 4
+    assert np.allclose(reopened.get_many(new_keys), stored)
+    assert reopened.get_many(old_keys) == [None] * 5
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts += texts
+        return [[float(len(text)), 1.0] for text in texts]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+def test_sync_and_async_embed_only_distinct_misses(tmp_path):
+    import asyncio
+    from memory.embedding_cache import CachedEmbeddings
+
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, EmbeddingCache(str(tmp_path), 10), "model")
+
+    assert embeddings.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert asyncio.run(embeddings.aembed_documents(["bb", "ccc"])) == [[2.0, 1.0], [3.0, 1.0]]
+    assert underlying.texts == ["a", "bb", "ccc"]
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import openai
+import pytest
+from config import Config
+from memory.embedding_scheduler import EmbeddingScheduler, token_batches
+
+
+def vector(text):
+    return [float(len(text)), 1.0]
+
+
+class Recorder:
+    """``embed_batch`` recording each batch and the requests in flight."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return [vector(text) for text in texts]
+
+
+class StubEmbeddingServer:
+    """Local ``/v1/embeddings`` endpoint answering with scripted statuses.
+
+    Each request takes the next ``(status, headers)`` of ``script``; once it
+    runs out, requests succeed.
+    """
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((time.monotonic(), body["input"]))
+                status, headers = stub.script.pop(0) if stub.script else (200, {})
+                if status == 200:
+                    payload = {"object": "list", "model": body["model"],
+                               "data": [{"object": "embedding", "index": i,
+                                         "embedding": vector(text)}
+                                        for i, text in enumerate(body["input"])],
+                               "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+                else:
+                    payload = {"error": {"message": "stub error", "type": "stub",
+                                         "code": None, "param": None}}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in {"Content-Type": "application/json", **headers}.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    servers = []
+
+    def start(script=()):
+        server = StubEmbeddingServer(script)
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+        monkeypatch.setattr(Config, "OPENAI_API_KEY", "sk-test")
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def scheduler(embed_batch=None, **kwargs):
+    kwargs.setdefault("requests_per_minute", 10 ** 6)
+    kwargs.setdefault("tokens_per_minute", 10 ** 9)
+    return EmbeddingScheduler(embed_batch, **kwargs)
+
+
+def test_token_batches_respect_both_limits():
+    assert token_batches([4, 4, 4, 9, 1, 1, 1], max_tokens=8, max_inputs=2) == [
+        [0, 1], [2], [3], [4, 5], [6]]
+    # A text over the token limit still goes out, alone
+    assert token_batches([20, 1], max_tokens=8, max_inputs=10) == [[0], [1]]
+
+
+def test_batches_are_token_bounded_and_results_keep_input_order():
+    texts = ["ab" * n for n in (3, 5, 2, 4, 1, 6, 2)]  # 3, 5, 2, ... tokens
+    recorder = Recorder()
+    vectors = scheduler(recorder, batch_tokens=8, batch_inputs=3).embed_documents(texts)
+
+    assert vectors == [vector(text) for text in texts]
+    for batch in recorder.batches:
+        assert len(batch) <= 3
+        assert sum(len(text) // 2 for text in batch) <= 8
+    assert sorted(t for batch in recorder.batches for t in batch) == sorted(texts)
+
+
+def test_concurrency_limit():
+    recorder = Recorder(delay=0.05)
+    embedder = scheduler(recorder, concurrency=3, batch_inputs=1)
+    embedder.embed_documents([f"text {i}" for i in range(12)])
+
+    assert len(recorder.batches) == 12
+    assert recorder.max_in_flight == 3
+
+
+def test_stats_count_requests_texts_and_tokens():
+    embedder = scheduler(Recorder(), batch_inputs=2)
+    embedder.embed_documents(["abcd", "ab", "abcdef"])  # 2 + 1 + 3 tokens
+    embedder.embed_query("ab")
+
+    stats = embedder.stats()
+    assert (stats["requests"], stats["texts"], stats["tokens"]) == (3, 4, 7)
+    assert (stats["retries"], stats["rate_limited"]) == (0, 0)
+    assert stats["seconds"] > 0
+    assert stats["texts_per_second"] == pytest.approx(4 / stats["seconds"])
+
+
+def test_openai_batches_reach_the_server(stub_server):
+    server = stub_server()
+    texts = ["first text", "second", "third one"]
+
+    assert scheduler(batch_inputs=2).embed_documents(texts) == [vector(t) for t in texts]
+    assert sorted(inputs for _, inputs in server.requests) == [texts[:2], texts[2:]]
+
+
+def test_429_waits_for_retry_after(stub_server):
+    server = stub_server([(429, {"Retry-After": "0.3"})])
+    embedder = scheduler()
+
+    assert embedder.embed_documents(["hello"]) == [vector("hello")]
+    (refused, _), (retried, _) = server.requests
+    assert retried - refused >= 0.3
+    stats = embedder.stats()
+    assert (stats["requests"], stats["retries"], stats["rate_limited"]) == (1, 1, 1)
+
+
+def test_429_pauses_every_worker():
+    started = time.monotonic()
+    calls = []
+
+    async def embed_batch(texts):
+        calls.append((time.monotonic() - started, texts[0]))
+        if len(calls) == 1:
+            request = httpx.Request("POST", "http://127.0.0.1/v1/embeddings")
+            response = httpx.Response(429, headers={"retry-after": "0.3"}, request=request)
+            raise openai.RateLimitError("rate limited", response=response, body=None)
+        await asyncio.sleep(0.05)
+        return [vector(text) for text in texts]
+
+    embedder = scheduler(embed_batch, concurrency=2, batch_inputs=1)
+    assert embedder.embed_documents(["a", "b", "c", "d"]) == [vector(t) for t in "abcd"]
+
+    # "b" was already in flight; everything sent after the refusal waits it out
+    assert [text for _, text in calls[:2]] == ["a", "b"]
+    assert all(at >= 0.3 for at, _ in calls[2:])
+    assert embedder.stats()["rate_limited"] == 1
+
+
+def test_transient_errors_back_off_exponentially(stub_server, monkeypatch):
+    monkeypatch.setattr(Config, "EMBEDDING_BACKOFF_BASE", 0.05)
+    server = stub_server([(503, {}), (503, {})])
+    embedder = scheduler()
+
+    embedder.embed_documents(["hello"])
+    times = [at for at, _ in server.requests]
+    assert len(times) == 3
+    # Jitter keeps each wait within half to all of base * 2 ** attempt
+    assert times[1] - times[0] >= 0.025
+    assert times[2] - times[1] >= 0.05
+    stats = embedder.stats()
+    assert (stats["retries"], stats["rate_limited"]) == (2, 0)
+
+
+def test_permanent_errors_and_exhausted_retries_raise(stub_server):
+    stub_server([(400, {})])
+    embedder = scheduler()
+    with pytest.raises(openai.BadRequestError):
+        embedder.embed_documents(["hello"])
+    assert embedder.stats()["retries"] == 0
+
+    stub_server([(429, {"Retry-After": "0"})] * 3)
+    embedder = scheduler(max_retries=2)
+    with pytest.raises(openai.RateLimitError):
+        embedder.embed_documents(["hello"])
+    assert embedder.stats()["retries"] == 2
@@ -0,0 +1,37 @@
+import os
+import pytest
+from agents.router import _rule
+from config import Config
+
+
+@pytest.fixture
+def ingest_dir(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    root.mkdir()
+    (root / "notes.txt").write_text("notes")
+    (tmp_path / "secret.txt").write_text("secret")
+    monkeypatch.setattr(Config, "CHAT_INGEST_DIR", str(root))
+    return root
+
+
+def test_ingest_reads_files_inside_the_ingest_dir(ingest_dir):
+    expected = ("ingest", os.path.realpath(ingest_dir / "notes.txt"))
+    assert _rule("ingest notes.txt") == expected
+    assert _rule(f"please ingest the file '{ingest_dir / 'notes.txt'}'") == expected
+
+
+@pytest.mark.parametrize("path", ["../secret.txt", "{tmp}/secret.txt", "/etc/hostname.txt",
+                                  "missing.txt"])
+def test_ingest_refuses_files_outside_the_ingest_dir(ingest_dir, path):
+    assert _rule(f"ingest {path.format(tmp=ingest_dir.parent)}") is None
+
+
+def test_ingest_through_a_symlink_out_is_refused(ingest_dir):
+    (ingest_dir / "link.txt").symlink_to(ingest_dir.parent / "secret.txt")
+    assert _rule("ingest link.txt") is None
+
+
+def test_ingest_is_off_without_an_ingest_dir(ingest_dir, monkeypatch):
+    monkeypatch.setattr(Config, "CHAT_INGEST_DIR", None)
+    assert _rule("ingest notes.txt") is None
+    assert _rule("How many documents are in my knowledge base?") == ("stats", None)
@@ -2,8 +2,10 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import uuid
 import streamlit as st
 from main import AURORA
+from utils.metrics import METRICS
 
 # Page config
 st.set_page_config(
@@ -45,6 +47,9 @@ def get_aurora():
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 if 'aurora' not in st.session_state:
     st.session_state.aurora = get_aurora()
 
@@ -60,6 +65,7 @@ page = st.sidebar.radio("Go to:", [
     "💬 Chat",
     "📖 Reading Companion",
     "📚 Knowledge Base",
+    "⚡ Performance",
     "📧 Email Manager (Coming Soon)",
     "💻 Code Assistant (Coming Soon)"
 ])
@@ -83,14 +89,39 @@ if page == "💬 Chat":
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = aurora.chat(prompt)
-                st.markdown(response)
+            steps = st.empty()
+            answer = st.empty()
+            response = ""
+            for event in aurora.stream_chat(prompt, st.session_state.session_id):
+                if event["type"] == "tool_start":
+                    steps.caption(f"🔧 {event['tool']}: {event['input']}")
+                    response = ""
+                elif event["type"] == "token":
+                    response += event["text"]
+                    answer.markdown(response + "▌")
+                elif event["type"] == "final":
+                    steps.empty()
+                    response = event["text"]
+                    answer.markdown(response)
 
         st.session_state.messages.append({"role": "assistant", "content": response})
 
+    history = aurora.conversation_stats(st.session_state.session_id)
+    st.caption(f"History in prompt: {history['history_tokens']} / {history['budget_tokens']} "
+               f"tokens · {history['turns']} turns, {history['archived_turns']} summarized")
+
+    with st.expander("⚡ Routing"):
+        st.caption("Simple messages skip the agent's planning calls.")
+        st.table([
+            {"Route": route, "Messages": values["count"],
+             "Mean latency (s)": round(values["mean_seconds"], 2),
+             "Mean LLM calls": round(values["mean_llm_calls"], 2)}
+            for route, values in aurora.route_stats().items()
+        ])
+
     # Clear chat button
     if st.button("🗑️ Clear Chat History"):
+        aurora.clear_conversation(st.session_state.session_id)
         st.session_state.messages = []
         st.rerun()
 
@@ -110,10 +141,8 @@ elif page == "📖 Reading Companion":
     )
 
     if uploaded_file is not None:
-        # Save file temporarily
-        temp_path = f"temp_{uploaded_file.name}"
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        # Processed in memory: parsed once, shared by all three actions
+        name, data = uploaded_file.name, uploaded_file.getbuffer()
 
         st.success(f"✅ Loaded: {uploaded_file.name}")
 
@@ -125,26 +154,23 @@ elif page == "📖 Reading Companion":
         with col1:
             if st.button("📥 Ingest & Store", use_container_width=True):
                 with st.spinner("Reading and storing document..."):
-                    result = aurora.ingest_document(temp_path)
+                    result = aurora.ingest_document(name, data)
                     st.success(result)
                     st.info("💡 Document is now searchable in your knowledge base!")
-                os.remove(temp_path)
 
         with col2:
             if st.button("📝 Summarize", use_container_width=True):
                 with st.spinner("Generating summary..."):
-                    summary = aurora.summarize_document(temp_path)
+                    summary = aurora.summarize_document(name, data)
                     st.markdown("### 📋 Summary")
                     st.markdown(summary)
-                os.remove(temp_path)
 
         with col3:
             if st.button("💡 Extract Insights", use_container_width=True):
                 with st.spinner("Extracting key insights..."):
-                    insights = aurora.reading_companion.extract_insights(temp_path)
+                    insights = aurora.extract_insights(name, data)
                     st.markdown("### 🔍 Key Insights")
                     st.markdown(insights)
-                os.remove(temp_path)
 
     st.markdown("---")
 
@@ -201,7 +227,7 @@ elif page == "📚 Knowledge Base":
     # Search interface
     st.markdown("### 🔍 Search Your Knowledge")
 
-    col1, col2 = st.columns([3, 1])
+    col1, col2, col3 = st.columns([3, 1, 1])
     with col1:
         search_query = st.text_input(
             "Search query:",
@@ -209,11 +235,34 @@ elif page == "📚 Knowledge Base":
         )
     with col2:
         num_results = st.number_input("Results", min_value=1, max_value=20, value=5)
+    with col3:
+        search_mode = st.selectbox(
+            "Mode", ["hybrid", "dense", "lexical"],
+            help="Lexical matches exact words and IDs without calling the embedding API"
+        )
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        filter_types = st.multiselect("Type", ["pdf", "text", "summary", "manual_entry"])
+    with col2:
+        filter_category = st.text_input("Category", placeholder="Any")
+    with col3:
+        filter_source = st.text_input("Source", placeholder="Any")
+
+    filter_dict = {}
+    if filter_types:
+        filter_dict["type"] = {"$in": filter_types}
+    if filter_category:
+        filter_dict["category"] = filter_category
+    if filter_source:
+        filter_dict["source"] = filter_source
 
     if st.button("🔍 Search Knowledge Base", use_container_width=True):
         if search_query:
             with st.spinner("Searching..."):
-                results = aurora.memory.search(search_query, k=num_results)
+                results = aurora.memory.search(search_query, k=num_results,
+                                               filter_dict=filter_dict or None,
+                                               mode=search_mode)
 
                 if results:
                     st.success(f"✅ Found {len(results)} results")
@@ -263,7 +312,62 @@ elif page == "📚 Knowledge Base":
         st.button("🗑️ Clear Database (Coming Soon)", use_container_width=True, disabled=True)
 
 # ============================================================================
-# PAGE 4: Email Manager (Placeholder)
+# PAGE 4: Performance
+# ============================================================================
+elif page == "⚡ Performance":
+    st.subheader("⚡ Performance")
+    st.markdown("Timings of each stage since startup; a stage's time includes the stages it calls.")
+
+    counters = METRICS.counters()
+    totals = {}
+    for row in counters:
+        totals[(row["name"], row.get("kind"))] = totals.get((row["name"], row.get("kind")), 0) + row["value"]
+    hits = totals.get(("embedding_cache_hits", None), 0)
+    misses = totals.get(("embedding_cache_misses", None), 0)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("LLM calls", int(totals.get(("llm_calls", None), 0)))
+    col2.metric("LLM tokens", int(totals.get(("tokens", "prompt"), 0)
+                                  + totals.get(("tokens", "completion"), 0)))
+    col3.metric("Embedding tokens", int(totals.get(("tokens", "embedding"), 0)))
+    col4.metric("Cost (USD)", f"${totals.get(('cost_usd', None), 0):.4f}")
+    if hits + misses:
+        st.caption(f"Embedding cache hit rate: {hits / (hits + misses):.0%}")
+
+    timings = METRICS.timings()
+    if timings:
+        st.markdown("### ⏱️ Stages")
+        st.dataframe([
+            {"Stage": row["stage"],
+             "Detail": ", ".join(f"{k}={v}" for k, v in row.items()
+                                 if k not in ("stage", "count", "seconds", "mean", "p50", "p95")),
+             "Calls": row["count"],
+             "p50 (ms)": round(row["p50"] * 1000, 1),
+             "p95 (ms)": round(row["p95"] * 1000, 1),
+             "Total (s)": round(row["seconds"], 2)}
+            for row in timings
+        ], use_container_width=True)
+    else:
+        st.info("No timings yet. Chat, search or ingest something first.")
+
+    if counters:
+        with st.expander("🔢 Counters"):
+            st.dataframe(counters, use_container_width=True)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("📥 Prometheus", aurora.metrics("prometheus"),
+                           file_name="aurora_metrics.prom", use_container_width=True)
+    with col2:
+        st.download_button("📥 JSON lines", aurora.metrics("json"),
+                           file_name="aurora_metrics.jsonl", use_container_width=True)
+    with col3:
+        if st.button("🔄 Reset", use_container_width=True):
+            METRICS.reset()
+            st.rerun()
+
+# ============================================================================
+# PAGE 5: Email Manager (Placeholder)
 # ============================================================================
 elif page == "📧 Email Manager (Coming Soon)":
     st.subheader("📧 Email & Communication Manager")
@@ -303,7 +407,7 @@ elif page == "📧 Email Manager (Coming Soon)":
     """, language="python")
 
 # ============================================================================
-# PAGE 5: Code Assistant (Placeholder)
+# PAGE 6: Code Assistant (Placeholder)
 # ============================================================================
 elif page == "💻 Code Assistant (Coming Soon)":
     st.subheader("💻 Code Research Assistant")
@@ -0,0 +1,94 @@
+from langchain.schema import Document
+from typing import List, Optional, Tuple
+import numpy as np
+from utils import tokens
+
+# Break points from most to least preferred; a chunk ends right after one
+SEPARATORS = [["\n\n"], [". ", "! ", "? ", ".\n", "!\n", "?\n"], ["\n"], [" "]]
+
+
+class TokenChunker:
+    """Single-pass splitter that sizes chunks in tiktoken tokens.
+
+    The text is encoded once; chunk ends are snapped back to the nearest
+    paragraph, sentence, line or word break in the last half of the window,
+    and overlap is taken by stepping back ``overlap_tokens`` tokens. Only the final
+    chunk strings are sliced out of the text.
+    """
+
+    def __init__(self, chunk_tokens: int, overlap_tokens: int):
+        # Ends snap back by up to half a chunk, so more overlap could stall
+        if overlap_tokens >= chunk_tokens // 2:
+            raise ValueError("overlap_tokens must be under half of chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def split_spans(self, text: str,
+                    ids: Optional[List[int]] = None) -> List[Tuple[int, int, int]]:
+        """``(start, end, n_tokens)`` character spans of the chunks of ``text``.
+
+        ``ids`` are the text's tokens, when already encoded.
+        """
+        if ids is None:
+            ids = tokens.encode(text)
+        starts = tokens.token_offsets(text, ids)
+        n = len(ids)
+        spans = []
+        i = 0
+        while i < n:
+            j = min(i + self.chunk_tokens, n)
+            if j < n:
+                cut = _boundary(text, int(starts[i + self.chunk_tokens // 2]), int(starts[j]))
+                if cut is not None:
+                    j = max(int(np.searchsorted(starts, cut)), i + 1)
+            start, end = _strip(text, int(starts[i]), int(starts[j]))
+            if start < end:
+                spans.append((start, end, j - i))
+            if j >= n:
+                break
+            i = max(j - self.overlap_tokens, i + 1)
+            # Start the overlap at a word, not inside one
+            at = int(starts[i])
+            if not (text[at].isspace() or text[at - 1].isspace()):
+                space = text.find(" ", at, int(starts[j]))
+                if space >= 0:
+                    i = min(int(np.searchsorted(starts, space)), j)
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end, _ in self.split_spans(text)]
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """Chunk documents, recording each chunk's character span and token count."""
+        chunks = []
+        encoded = tokens.encode_batch([doc.page_content for doc in documents])
+        for doc, ids in zip(documents, encoded):
+            text = doc.page_content
+            for start, end, n_tokens in self.split_spans(text, ids):
+                chunks.append(Document(
+                    page_content=text[start:end],
+                    metadata={**doc.metadata, "start_index": start,
+                              "end_index": end, "tokens": n_tokens}
+                ))
+        return chunks
+
+
+def _boundary(text: str, lo: int, hi: int):
+    """Position just after the best break in ``text[lo:hi]``, if any."""
+    for group in SEPARATORS:
+        best = -1
+        for sep in group:
+            found = text.rfind(sep, lo, hi)
+            if found >= 0:
+                best = max(best, found + len(sep))
+        if best > lo:
+            return best
+    return None
+
+
+def _strip(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
@@ -0,0 +1,121 @@
+import threading
+from functools import lru_cache
+from config import Config
+
+
+class lazy_property:
+    """Attribute built on first access and cached on the instance.
+
+    Unlike ``functools.cached_property`` the value is built once even when
+    threads (e.g. Streamlit sessions sharing one AURORA) race for it.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self.lock = threading.RLock()
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        with self.lock:
+            if self.name not in obj.__dict__:
+                obj.__dict__[self.name] = self.func(obj)
+        return obj.__dict__[self.name]
+
+
+@lru_cache(maxsize=None)
+def http_client():
+    """One connection pool shared by every OpenAI client."""
+    import httpx
+
+    return httpx.Client(
+        limits=httpx.Limits(max_connections=Config.HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=Config.HTTP_MAX_CONNECTIONS),
+        timeout=Config.HTTP_TIMEOUT
+    )
+
+
+@lru_cache(maxsize=None)
+def async_http_client():
+    """One async connection pool shared by every chat model's async client.
+
+    Async pools belong to the event loop that first uses them, so the chat
+    models' async calls must all run on one loop; the embedding scheduler,
+    on a loop of its own, keeps a separate pool.
+    """
+    return _async_pool()
+
+
+@lru_cache(maxsize=None)
+def chat_model(temperature: float, streaming: bool = False):
+    """Chat model for ``temperature``, shared by every caller asking for it.
+
+    A streaming model reports each token to the callbacks of the run. The
+    async calls of every chat model share ``async_http_client``, so drive
+    them from a single long-lived event loop.
+    """
+    import utils.llm_calls  # noqa: F401 (times and counts every LLM call)
+
+    if Config.LLM_PROVIDER == "fake":
+        from utils.fake_providers import CannedChatModel
+        return CannedChatModel(streaming=streaming,
+                               first_token_latency=Config.FAKE_LLM_FIRST_TOKEN_LATENCY,
+                               token_latency=Config.FAKE_LLM_TOKEN_LATENCY)
+
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=Config.MODEL_NAME,
+        temperature=temperature,
+        streaming=streaming,
+        openai_api_key=Config.OPENAI_API_KEY,
+        http_client=http_client(),
+        # ainvoke needs an async pool; the sync one above would fail there
+        async_client=async_openai_client(max_retries=2,
+                                         http_client=async_http_client()).chat.completions
+    )
+
+
+def model_id() -> str:
+    """The chat model's name in cache keys; a fake provider's outputs are
+    never served for the real model."""
+    if Config.LLM_PROVIDER == "openai":
+        return Config.MODEL_NAME
+    return f"{Config.LLM_PROVIDER}:{Config.MODEL_NAME}"
+
+
+def embedding_model_id() -> str:
+    """The embedding model's name in cache keys and metrics."""
+    if Config.EMBEDDING_PROVIDER == "openai":
+        return Config.EMBEDDING_MODEL
+    return f"{Config.EMBEDDING_PROVIDER}:{Config.EMBEDDING_MODEL}"
+
+
+def async_openai_client(max_retries: int = 0, http_client=None):
+    """A new async OpenAI client on ``http_client``, or on a pool of its own
+    for a caller with its own event loop.
+
+    Retries are left to the caller by default (see ``EmbeddingScheduler``).
+    """
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=Config.OPENAI_API_KEY,
+        max_retries=max_retries,
+        http_client=http_client or _async_pool()
+    )
+
+
+def _async_pool():
+    import httpx
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=Config.HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=Config.HTTP_MAX_CONNECTIONS),
+        timeout=Config.HTTP_TIMEOUT
+    )
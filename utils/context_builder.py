@@ -0,0 +1,90 @@
+from langchain.schema import Document
+from typing import Dict, List, Optional, Set, Tuple
+import re
+from utils import tokens
+
+WORD = re.compile(r"\w+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+# Tokens of the blank line joining two blocks
+SEPARATOR_TOKENS = 1
+
+
+def build_context(query: str, docs: List[Document], budget: int) -> Tuple[str, List[Document]]:
+    """Pack ``docs``, most useful first, into at most ``budget`` tokens of context.
+
+    Text a chunk shares with an already packed neighbour from the same page
+    (chunk overlap) is cut. Whole chunks are taken while they fit; one that
+    doesn't is trimmed to the sentences sharing most words with the query.
+    Returns the context and the documents it draws on.
+    """
+    query_words = set(WORD.findall(query.lower()))
+    covered: Dict[tuple, List[Tuple[int, int]]] = {}
+    sentences: Set[str] = set()
+    blocks, used = [], []
+    remaining = budget
+    for doc in docs:
+        text = _uncovered(doc, covered)
+        if not text:
+            continue
+        header = f"Source: {doc.metadata.get('filename', 'Unknown')}\n"
+        cost = tokens.count_tokens(header + text) + SEPARATOR_TOKENS
+        if cost > remaining:
+            text = _relevant_sentences(text, query_words,
+                                       remaining - tokens.count_tokens(header) - SEPARATOR_TOKENS,
+                                       sentences)
+            if not text:
+                continue
+            cost = tokens.count_tokens(header + text) + SEPARATOR_TOKENS
+        elif "start_index" in doc.metadata:
+            # Only a chunk packed whole covers its span for its neighbours
+            covered.setdefault(_page(doc), []).append(
+                (doc.metadata["start_index"], doc.metadata["end_index"]))
+        blocks.append(header + text)
+        used.append(doc)
+        remaining -= cost
+    return "\n\n".join(blocks), used
+
+
+def _uncovered(doc: Document, covered: Dict[tuple, List[Tuple[int, int]]]) -> Optional[str]:
+    """The chunk's text minus a head or tail already packed from an overlapping chunk."""
+    start, end = doc.metadata.get("start_index"), doc.metadata.get("end_index")
+    if start is None or end is None:
+        return doc.page_content
+    keep_start, keep_end = start, end
+    for span_start, span_end in covered.get(_page(doc), []):
+        if span_start <= keep_start < span_end:
+            keep_start = span_end
+        if span_start < keep_end <= span_end:
+            keep_end = span_start
+    if keep_start >= keep_end:
+        return None
+    return doc.page_content[keep_start - start:keep_end - start].strip()
+
+
+def _page(doc: Document) -> tuple:
+    return doc.metadata.get("source"), doc.metadata.get("page")
+
+
+def _relevant_sentences(text: str, query_words: Set[str], budget: int,
+                        seen: Set[str]) -> str:
+    """Sentences of ``text`` that share words with the query, best first while
+    they fit in ``budget`` tokens, kept in their original order.
+
+    Sentences in ``seen`` (already packed from an overlapping chunk) are
+    skipped and the kept ones are added to it.
+    """
+    if budget <= 0:
+        return ""
+    sentences = [s for s in SENTENCE_END.split(text) if s.strip() and s not in seen]
+    overlap = [len(query_words.intersection(WORD.findall(s.lower()))) for s in sentences]
+    kept = []
+    for index in sorted(range(len(sentences)), key=lambda i: -overlap[i]):
+        if not overlap[index]:
+            break
+        cost = tokens.count_tokens(sentences[index]) + 1
+        if cost <= budget:
+            kept.append(index)
+            budget -= cost
+    seen.update(sentences[i] for i in kept)
+    return " ".join(sentences[i] for i in sorted(kept))
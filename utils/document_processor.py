@@ -1,40 +1,100 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from typing import List
+from langchain_community.document_loaders import TextLoader
+from typing import Iterator, List, Optional
+import io
 import os
 from config import Config
+from utils.chunker import TokenChunker
+from utils.metrics import span
+
+class ParsedDocument:
+    """A file parsed and chunked once, shared by ingestion and summarization.
+
+    ``digest`` is the SHA-256 of the file's bytes.
+    """
+
+    def __init__(self, source: str, digest: str, chunks: List[Document]):
+        self.source = source
+        self.digest = digest
+        self.chunks = chunks
+
 
 class DocumentProcessor:
     """Handles document loading and chunking."""
+
+    # File extension -> loader method
+    LOADERS = {".pdf": "load_pdf", ".txt": "load_text"}
     
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=Config.CHUNK_SIZE,
-            chunk_overlap=Config.CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self.text_splitter = TokenChunker(Config.CHUNK_TOKENS, Config.CHUNK_OVERLAP_TOKENS)
+    
+    def load(self, file_path: str) -> List[Document]:
+        """Load and chunk any supported file, picked by extension."""
+        loader = self.LOADERS.get(os.path.splitext(file_path)[1].lower())
+        if loader is None:
+            raise ValueError(f"Unsupported file type: {file_path}")
+        return getattr(self, loader)(file_path)
+    
+    def load_bytes(self, name: str, data: bytes) -> List[Document]:
+        """Load and chunk an in-memory file; ``name`` picks the type and is its source."""
+        extension = os.path.splitext(name)[1].lower()
+        if extension == ".pdf":
+            return list(self.iter_pdf(name, data))
+        if extension == ".txt":
+            return self.process_text(str(data, "utf-8", errors="replace"), {
+                "source": name,
+                "type": "text",
+                "filename": os.path.basename(name)
+            })
+        raise ValueError(f"Unsupported file type: {name}")
     
     def load_pdf(self, file_path: str) -> List[Document]:
         """Load and chunk a PDF file."""
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
-        
-        # Add metadata
-        for doc in documents:
-            doc.metadata.update({
-                "source": file_path,
-                "type": "pdf",
-                "filename": os.path.basename(file_path)
-            })
-        
-        return self.text_splitter.split_documents(documents)
+        return list(self.iter_pdf(file_path))
+    
+    def iter_pdf(self, file_path: str, data: Optional[bytes] = None) -> Iterator[Document]:
+        """Chunk a PDF lazily, one page at a time.
+
+        ``data`` is the file's content when it is not on disk.
+        """
+        import pypdf
+
+        metadata = {
+            "source": file_path,
+            "type": "pdf",
+            "filename": os.path.basename(file_path)
+        }
+        start = 0
+        while True:
+            # pypdf caches every object it resolves, so re-open the reader
+            # periodically to keep memory flat on very long documents
+            with (open(file_path, "rb") if data is None else io.BytesIO(data)) as f:
+                with span("document.parse"):
+                    reader = pypdf.PdfReader(f)
+                    total = len(reader.pages)
+                end = min(start + Config.PDF_PAGES_PER_READER, total)
+                for number in range(start, end):
+                    # Spans close before yielding, so the consumer's time isn't counted
+                    with span("document.parse"):
+                        page = Document(page_content=reader.pages[number].extract_text(),
+                                        metadata={**metadata, "page": number})
+                    with span("document.split"):
+                        chunks = self.text_splitter.split_documents([page])
+                    yield from chunks
+            if end >= total:
+                return
+            start = end
+    
+    def iter_chunks(self, file_path: str) -> Iterator[Document]:
+        """Chunks of any supported file; PDFs are streamed page by page."""
+        if os.path.splitext(file_path)[1].lower() == ".pdf":
+            return self.iter_pdf(file_path)
+        return iter(self.load(file_path))
     
     def load_text(self, file_path: str) -> List[Document]:
         """Load and chunk a text file."""
-        loader = TextLoader(file_path)
-        documents = loader.load()
+        with span("document.parse"):
+            documents = TextLoader(file_path).load()
         
         for doc in documents:
             doc.metadata.update({
@@ -43,9 +103,22 @@ class DocumentProcessor:
                 "filename": os.path.basename(file_path)
             })
         
-        return self.text_splitter.split_documents(documents)
+        with span("document.split"):
+            return self.text_splitter.split_documents(documents)
     
     def process_text(self, text: str, metadata: dict) -> List[Document]:
         """Process raw text into chunks."""
         doc = Document(page_content=text, metadata=metadata)
-        return self.text_splitter.split_documents([doc])
+        with span("document.split"):
+            return self.text_splitter.split_documents([doc])
+
+
+_processor = None
+
+
+def parse_file(file_path: str) -> List[Document]:
+    """Process-pool entry point: load and chunk one file."""
+    global _processor
+    if _processor is None:
+        _processor = DocumentProcessor()
+    return _processor.load(file_path)
@@ -0,0 +1,161 @@
+"""Deterministic local stand-ins for the OpenAI embedding and chat APIs.
+
+Selected with ``AURORA_EMBEDDING_PROVIDER=fake`` and
+``AURORA_LLM_PROVIDER=fake`` for offline runs and benchmarks: no network,
+the same output on every run, and optional simulated latency. With both
+selected and tiktoken's BPE file out of reach, ``BytePairEncoding`` stands
+in for the tokenizer too.
+"""
+import asyncio
+import re
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterator, List, Optional
+import numpy as np
+from langchain_core.callbacks import (AsyncCallbackManagerForLLMRun,
+                                      CallbackManagerForLLMRun)
+from langchain_core.language_models.chat_models import (BaseChatModel, agenerate_from_stream,
+                                                        generate_from_stream)
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+WORD = re.compile(r"\w+")
+PIECE = re.compile(r"\S+\s*")
+
+DEFAULT_REPLY = "This is a canned reply from AURORA's offline chat model."
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder, usable as ``EmbeddingScheduler``'s ``embed_batch``.
+
+    Each lowercased word adds +-1 to a bucket picked by its CRC32 and the
+    vector is L2-normalized, so texts sharing words land close together
+    and search quality is meaningful. Every request waits ``latency``
+    seconds, like a network round trip.
+    """
+
+    def __init__(self, dim: int, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+
+    async def __call__(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.embed(texts).tolist()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = [_feature(word, self.dim) for word in WORD.findall(text.lower())]
+            if features:
+                buckets, signs = zip(*features)
+                np.add.at(vectors[row], list(buckets), signs)
+        norms = np.linalg.norm(vectors, axis=1)
+        # A text without words (or whose words cancel out) still needs a unit vector
+        vectors[norms == 0, 0] = 1.0
+        norms[norms == 0] = 1.0
+        return vectors / norms[:, None]
+
+
+@lru_cache(maxsize=1 << 20)
+def _feature(word: str, dim: int):
+    h = zlib.crc32(word.encode("utf-8"))
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+class BytePairEncoding:
+    """Tokenizer with the part of tiktoken's ``Encoding`` interface AURORA uses.
+
+    Every two bytes of UTF-8 are one token, and an odd last byte one of its
+    own: about two characters a token where cl100k_base averages four on
+    English. Counts and chunk sizes are close enough for offline runs, not
+    for the OpenAI API's limits.
+    """
+
+    name = "byte-pair"
+    n_vocab = 256 + 65536  # single bytes, then every pair
+
+    def encode_ordinary(self, text: str) -> List[int]:
+        data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.int64)
+        even = len(data) - len(data) % 2
+        ids = 256 + (data[0:even:2] << 8) + data[1:even:2]
+        return ids.tolist() + data[even:].tolist()
+
+    def encode_ordinary_batch(self, texts: List[str], num_threads: int = 1) -> List[List[int]]:
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, ids: List[int]) -> str:
+        return b"".join(map(self.decode_single_token_bytes, ids)).decode("utf-8", "replace")
+
+    def decode_single_token_bytes(self, token: int) -> bytes:
+        if not 0 <= token < self.n_vocab:
+            raise KeyError(token)
+        if token < 256:
+            return bytes([token])
+        return (token - 256).to_bytes(2, "big")
+
+
+class CannedChatModel(BaseChatModel):
+    """Chat model replying with ``responses`` in turn.
+
+    A reply takes ``first_token_latency`` plus ``token_latency`` per word,
+    and with ``streaming`` its words reach the callbacks one at a time, as
+    the OpenAI model's tokens would. Replies never call tools, so an agent
+    answers after one call.
+    """
+
+    responses: List[str] = [DEFAULT_REPLY]
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    streaming: bool = False
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "canned-chat-model"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+        text = self._reply()
+        time.sleep(self.first_token_latency + self.token_latency * len(PIECE.findall(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            return await agenerate_from_stream(self._astream(messages, stop, run_manager,
+                                                             **kwargs))
+        text = self._reply()
+        await asyncio.sleep(self.first_token_latency
+                            + self.token_latency * len(PIECE.findall(text)))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for piece in PIECE.findall(self._reply()):
+            time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(piece)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for piece in PIECE.findall(self._reply()):
+            await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(piece)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    def _reply(self) -> str:
+        reply = self.responses[self.calls % len(self.responses)]
+        self.calls += 1
+        return reply
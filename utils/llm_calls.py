@@ -0,0 +1,111 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+from config import Config
+from utils import tokens
+from utils.metrics import METRICS, cost, current_stage
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts the LLM calls started while it is active."""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized: Any, prompts: Any, **kwargs: Any):
+        # Chat models report here too, having no on_chat_model_start of ours
+        with self._lock:
+            self.calls += 1
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """Times every LLM and tool call and counts LLM tokens and cost.
+
+    Each call is labelled with the span it was made from (``caller``), so
+    agent planning, answer synthesis and summarization show apart. Token
+    counts come from the API's usage report; streamed calls, which have
+    none, are counted with tiktoken.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[float, str, str, int]] = {}
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized: Dict, prompts: Any, *, run_id: UUID, **kwargs: Any):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or params.get("_type", "unknown")
+        prompt_tokens = sum(tokens.count_tokens(prompt) for prompt in prompts)
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), current_stage.get() or "direct",
+                                  model, prompt_tokens)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        run = self._pop(run_id)
+        if run is None:
+            return
+        started, caller, model, prompt_tokens = run
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        completion_tokens = usage.get("completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = sum(tokens.count_tokens(generation.text)
+                                    for generations in response.generations
+                                    for generation in generations)
+        prompt_tokens = usage.get("prompt_tokens", prompt_tokens)
+        METRICS.observe("llm", time.perf_counter() - started, caller=caller)
+        METRICS.inc("llm_calls", caller=caller)
+        METRICS.inc("tokens", prompt_tokens, kind="prompt", model=model)
+        METRICS.inc("tokens", completion_tokens, kind="completion", model=model)
+        METRICS.inc("cost_usd", cost(model, prompt_tokens, completion_tokens), model=model)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        run = self._pop(run_id)
+        if run is not None:
+            METRICS.inc("errors", stage="llm")
+
+    def on_tool_start(self, serialized: Dict, input_str: str, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), serialized.get("name", "tool"), "", 0)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        run = self._pop(run_id)
+        if run is not None:
+            METRICS.observe("tool", time.perf_counter() - run[0], tool=run[1])
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        run = self._pop(run_id)
+        if run is not None:
+            METRICS.inc("errors", stage="tool", tool=run[1])
+
+    def _pop(self, run_id: UUID) -> Optional[Tuple[float, str, str, int]]:
+        with self._lock:
+            return self._runs.pop(run_id, None)
+
+
+_counter: ContextVar[Optional[LLMCallCounter]] = ContextVar("aurora_llm_calls", default=None)
+register_configure_hook(_counter, inheritable=True)
+
+# Set in every context, so every LangChain run reports to the metrics registry
+_metrics: ContextVar[Optional[MetricsCallback]] = ContextVar(
+    "aurora_llm_metrics", default=MetricsCallback() if Config.METRICS_ENABLED else None)
+register_configure_hook(_metrics, inheritable=True)
+
+
+@contextmanager
+def count_llm_calls() -> Iterator[LLMCallCounter]:
+    """Count every LLM call made in this context, however deep in the call
+    stack and whatever callbacks the caller passed."""
+    counter = LLMCallCounter()
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
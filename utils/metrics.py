@@ -0,0 +1,157 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from config import Config
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Name of the innermost open span, so LLM and tool calls know who made them
+current_stage: ContextVar[Optional[str]] = ContextVar("aurora_stage", default=None)
+
+
+class Metrics:
+    """In-process registry of stage timings and counters.
+
+    Timings keep a count, a sum and the last ``Config.METRICS_SAMPLES``
+    samples per stage and label set, enough for recent p50/p95 at a fixed
+    memory cost. Everything is exportable as Prometheus text or JSON lines.
+    """
+
+    def __init__(self, samples: int = Config.METRICS_SAMPLES):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._timings: Dict[Labels, List] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, stage: str, seconds: float, **labels: str):
+        key = _labels(stage=stage, **labels)
+        with self._lock:
+            timing = self._timings.get(key)
+            if timing is None:
+                timing = self._timings[key] = [0, 0.0, deque(maxlen=self.samples)]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2].append(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, _labels(**labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def timings(self) -> List[Dict]:
+        """Count, total, mean, p50 and p95 seconds of every stage, slowest total first."""
+        with self._lock:
+            rows = [(dict(key), count, total, np.array(recent))
+                    for key, (count, total, recent) in self._timings.items()]
+        out = []
+        for labels, count, total, recent in rows:
+            p50, p95 = np.percentile(recent, [50, 95]).tolist()
+            out.append({**labels, "count": count, "seconds": total,
+                        "mean": total / count, "p50": p50, "p95": p95})
+        return sorted(out, key=lambda row: -row["seconds"])
+
+    def counters(self) -> List[Dict]:
+        with self._lock:
+            items = list(self._counters.items())
+        return [{"name": name, **dict(labels), "value": value}
+                for (name, labels), value in sorted(items)]
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition: one summary for stage timings, one
+        counter per name."""
+        lines = ["# TYPE aurora_stage_seconds summary"]
+        for row in self.timings():
+            labels = {k: v for k, v in row.items()
+                      if k not in ("count", "seconds", "mean", "p50", "p95")}
+            for quantile in ("0.5", "0.95"):
+                value = row["p50"] if quantile == "0.5" else row["p95"]
+                lines.append(f"aurora_stage_seconds{_format({**labels, 'quantile': quantile})} "
+                             f"{value}")
+            lines.append(f"aurora_stage_seconds_sum{_format(labels)} {row['seconds']}")
+            lines.append(f"aurora_stage_seconds_count{_format(labels)} {row['count']}")
+        typed = set()
+        for row in self.counters():
+            name = f"aurora_{row.pop('name')}_total"
+            value = row.pop("value")
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format(row)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def json_lines(self) -> str:
+        """One JSON object per timing series and per counter."""
+        now = time.time()
+        rows = [{"type": "timing", "time": now, **row} for row in self.timings()]
+        rows += [{"type": "counter", "time": now, **row} for row in self.counters()]
+        return "".join(json.dumps(row) + "\n" for row in rows)
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def span(stage: str, **labels: str) -> Iterator[None]:
+    """Time the block as ``stage``; an exception also counts an error."""
+    if not Config.METRICS_ENABLED:
+        yield
+        return
+    token = current_stage.set(stage)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        METRICS.inc("errors", stage=stage)
+        raise
+    finally:
+        METRICS.observe(stage, time.perf_counter() - started, **labels)
+        current_stage.reset(token)
+
+
+def timed(stage: str):
+    """Decorator running a function or coroutine function inside ``span(stage)``."""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with span(stage):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def cost(model: str, prompt_tokens: int, completion_tokens: int = 0) -> float:
+    """USD for a call, from ``Config.MODEL_COST_PER_1K``; 0 for unknown models."""
+    prompt_price, completion_price = Config.MODEL_COST_PER_1K.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+def _labels(**labels: str) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format(labels: Dict) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
@@ -0,0 +1,59 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class EventQueue(BaseCallbackHandler):
+    """Callback handler that turns LLM tokens and tool calls into events."""
+
+    def __init__(self):
+        self.events: "queue.Queue[Dict]" = queue.Queue()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        # Tool-call deltas arrive as empty tokens
+        if token:
+            self.events.put({"type": "token", "text": token})
+
+    def on_tool_start(self, serialized: Dict, input_str: str, **kwargs: Any):
+        self.events.put({"type": "tool_start", "tool": serialized.get("name"),
+                         "input": input_str})
+
+    def on_tool_end(self, output: Any, **kwargs: Any):
+        self.events.put({"type": "tool_end", "tool": kwargs.get("name"), "output": str(output)})
+
+
+def stream_events(run: Callable[[List[BaseCallbackHandler]], str]) -> Iterator[Dict]:
+    """Call ``run(callbacks)`` on a worker thread, yielding its events live.
+
+    The last event is ``{"type": "final", "text": <run's result>,
+    "first_token_seconds": ..., "seconds": ...}``; an exception in ``run``
+    is raised here instead.
+    """
+    handler = EventQueue()
+    done = object()
+    outcome = {}
+
+    def work():
+        try:
+            outcome["text"] = run([handler])
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            handler.events.put(done)
+
+    started = time.monotonic()
+    first_token = None
+    threading.Thread(target=work, name="chat-stream", daemon=True).start()
+    while True:
+        event = handler.events.get()
+        if event is done:
+            break
+        if event["type"] == "token" and first_token is None:
+            first_token = time.monotonic() - started
+        yield event
+    if "error" in outcome:
+        raise outcome["error"]
+    yield {"type": "final", "text": outcome["text"], "first_token_seconds": first_token,
+           "seconds": time.monotonic() - started}
@@ -0,0 +1,70 @@
+from functools import lru_cache
+from typing import List
+import numpy as np
+from config import Config
+
+
+@lru_cache(maxsize=None)
+def encoding():
+    """The tiktoken encoding shared by the chat and embedding models.
+
+    tiktoken downloads its BPE file on first use. When it cannot, and both
+    providers are fake (an offline benchmark), a local stand-in is used.
+    """
+    import tiktoken
+
+    try:
+        return tiktoken.get_encoding(Config.TOKEN_ENCODING)
+    except Exception:
+        if Config.LLM_PROVIDER != "fake" or Config.EMBEDDING_PROVIDER != "fake":
+            raise
+        from utils.fake_providers import BytePairEncoding
+        return BytePairEncoding()
+
+
+def encode(text: str) -> List[int]:
+    # Special-token markers in documents are plain text, not control tokens
+    return encoding().encode_ordinary(text)
+
+
+def encode_batch(texts: List[str]) -> List[List[int]]:
+    """Encode many texts on tiktoken's thread pool."""
+    return encoding().encode_ordinary_batch(texts, num_threads=Config.TOKENIZER_THREADS)
+
+
+def count_tokens(text: str) -> int:
+    return len(encode(text))
+
+
+def token_offsets(text: str, ids: List[int]) -> np.ndarray:
+    """Character offset where each token of ``text`` starts, plus ``len(text)``.
+
+    Computed from per-token byte lengths without decoding any token; a
+    token that starts inside a multi-byte character maps to that character.
+    """
+    byte_starts = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(_byte_lengths()[np.asarray(ids, dtype=np.int64)], out=byte_starts[1:])
+    data = text.encode("utf-8")
+    if len(data) == len(text):
+        return byte_starts
+    # Character index of every byte: count the UTF-8 lead bytes up to it
+    raw = np.frombuffer(data, dtype=np.uint8)
+    char_of_byte = np.cumsum((raw & 0xC0) != 0x80) - 1
+    offsets = np.empty(len(ids) + 1, dtype=np.int64)
+    offsets[:-1] = char_of_byte[byte_starts[:-1]]
+    offsets[-1] = len(text)
+    return offsets
+
+
+@lru_cache(maxsize=None)
+def _byte_lengths() -> np.ndarray:
+    """Byte length of every token id in the vocabulary."""
+    enc = encoding()
+    lengths = np.zeros(enc.n_vocab, dtype=np.int64)
+    for token in range(enc.n_vocab):
+        try:
+            lengths[token] = len(enc.decode_single_token_bytes(token))
+        except KeyError:
+            # Unused ids between the ordinary and special tokens
+            pass
+    return lengths